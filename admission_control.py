@@ -0,0 +1,246 @@
+"""
+Admission Control
+Bounds how many requests of each endpoint class a tenant may run at once,
+so one tenant pulling a year of exports cannot occupy every worker and
+database connection.
+
+Endpoint classes (ENDPOINT_CLASSES; everything else is 'interactive'):
+    interactive  pages and small API calls
+    report       report pages and analytics queries
+    export       Excel/PDF/CSV generation
+    import       bulk uploads
+
+Each tenant gets base slots per class scaled by the weight of its plan
+(companies.plan), and each heavy class has a process-wide cap. A request
+without a free slot waits briefly in a queue; when a slot frees up it goes
+to the waiting tenant with the fewest requests in flight for its weight.
+Requests that find the queue full, or are still waiting after the class'
+wait time, get 429 with Retry-After.
+
+Limits are per worker process: with N workers a tenant can run N times the
+slots, and the caps bound each worker.
+
+Settings: ADMISSION_CONTROL_ENABLED, ADMISSION_<CLASS>_SLOTS,
+ADMISSION_<CLASS>_GLOBAL_SLOTS, ADMISSION_<CLASS>_QUEUE,
+ADMISSION_<CLASS>_WAIT_SECONDS, ADMISSION_PLAN_WEIGHTS (e.g. "trial=0.5,basic=1").
+"""
+
+from flask import g, request, jsonify, make_response
+from collections import namedtuple
+import threading
+import itertools
+import math
+import os
+
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+
+ClassLimits = namedtuple('ClassLimits', 'slots global_slots queue wait_seconds')
+
+
+def _class_limits(name, slots, global_slots, queue, wait_seconds):
+    prefix = f'ADMISSION_{name.upper()}_'
+    return ClassLimits(
+        slots=int(os.environ.get(prefix + 'SLOTS', slots)),
+        # 0 = no process-wide cap for the class
+        global_slots=int(os.environ.get(prefix + 'GLOBAL_SLOTS', global_slots)),
+        queue=int(os.environ.get(prefix + 'QUEUE', queue)),
+        wait_seconds=float(os.environ.get(prefix + 'WAIT_SECONDS', wait_seconds)),
+    )
+
+
+# Per-tenant slots at plan weight 1, process-wide cap, waiting requests per tenant, max wait
+CLASS_LIMITS = {
+    'interactive': _class_limits('interactive', 16, 0, 16, 2),
+    'report': _class_limits('report', 3, 8, 4, 5),
+    'export': _class_limits('export', 1, 4, 2, 10),
+    'import': _class_limits('import', 1, 2, 1, 5),
+}
+
+
+def _plan_weights():
+    weights = {'trial': 0.5, 'basic': 1, 'professional': 2, 'enterprise': 4}
+    for item in os.environ.get('ADMISSION_PLAN_WEIGHTS', '').split(','):
+        plan, _, weight = item.partition('=')
+        if weight:
+            weights[plan.strip()] = float(weight)
+    return weights
+
+
+PLAN_WEIGHTS = _plan_weights()
+DEFAULT_PLAN_WEIGHT = 1
+
+# Endpoint -> class for everything that is not 'interactive'
+ENDPOINT_CLASSES = {
+    'fuel_reports': 'report',
+    'fuel_reports_print': 'report',
+    'fuel_exceptions_report': 'report',
+    'service_notifications_print': 'report',
+    'analytics.maintenance_cost_summary': 'report',
+    'analytics.fuel_cost_summary': 'report',
+    'analytics.calculate_kpis': 'report',
+    'analytics.generate_custom_report': 'report',
+    'analytics.run_scheduled_report_now': 'export',
+    'fuel_reports_export': 'export',
+    'analytics.export_to_excel': 'export',
+    'analytics.export_to_pdf': 'export',
+    'analytics.export_audit_log': 'export',
+    'upload_import_data': 'import',
+}
+
+# Analytics data endpoints not listed above count as reports
+REPORT_PREFIXES = ('analytics.get_',)
+
+# Never queued or rejected
+EXEMPT_ENDPOINTS = ('static', 'metrics', 'health_check')
+
+
+class AdmissionRejected(Exception):
+    """No slot became free in time (or the queue was full)"""
+
+    def __init__(self, endpoint_class, retry_after):
+        self.endpoint_class = endpoint_class
+        self.retry_after = retry_after
+        super().__init__(f"Too many concurrent {endpoint_class} requests")
+
+
+class _Waiter:
+    __slots__ = ('tenant', 'weight', 'sequence', 'event', 'admitted')
+
+    def __init__(self, tenant, weight, sequence):
+        self.tenant = tenant
+        self.weight = weight
+        self.sequence = sequence
+        self.event = threading.Event()
+        self.admitted = False
+
+
+class AdmissionController:
+    """Per-(tenant, endpoint class) concurrency slots with a short weighted-fair wait queue"""
+
+    def __init__(self, limits=None):
+        self.limits = limits or CLASS_LIMITS
+        self._lock = threading.Lock()
+        # class -> {tenant: requests in flight}
+        self._in_flight = {name: {} for name in self.limits}
+        # class -> [waiter, ...] in arrival order
+        self._waiters = {name: [] for name in self.limits}
+        self._sequence = itertools.count()
+
+    def init_app(self, app):
+        """Register after TenantMiddleware so the tenant and its plan are known"""
+        if not ADMISSION_CONTROL_ENABLED:
+            return
+        app.before_request(self.admit_request)
+        app.teardown_request(self.release_request)
+
+    # ----- classification -----
+
+    @staticmethod
+    def classify(endpoint):
+        if endpoint in ENDPOINT_CLASSES:
+            return ENDPOINT_CLASSES[endpoint]
+        if endpoint and endpoint.startswith(REPORT_PREFIXES):
+            return 'report'
+        return 'interactive'
+
+    @staticmethod
+    def plan_weight(plan):
+        return PLAN_WEIGHTS.get(plan, DEFAULT_PLAN_WEIGHT)
+
+    def tenant_slots(self, endpoint_class, weight):
+        return max(1, math.floor(self.limits[endpoint_class].slots * weight))
+
+    # ----- slots -----
+
+    def _dispatch(self, endpoint_class):
+        """Admit waiters while slots are free: fewest in flight per weight first, then arrival order"""
+        limits = self.limits[endpoint_class]
+        in_flight = self._in_flight[endpoint_class]
+        waiters = self._waiters[endpoint_class]
+        while waiters:
+            if limits.global_slots and sum(in_flight.values()) >= limits.global_slots:
+                return
+            eligible = [w for w in waiters
+                        if in_flight.get(w.tenant, 0) < self.tenant_slots(endpoint_class, w.weight)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (in_flight.get(w.tenant, 0) / w.weight, w.sequence))
+            waiters.remove(waiter)
+            in_flight[waiter.tenant] = in_flight.get(waiter.tenant, 0) + 1
+            waiter.admitted = True
+            waiter.event.set()
+
+    def acquire(self, tenant, endpoint_class, weight=DEFAULT_PLAN_WEIGHT):
+        """Take a slot, waiting up to the class' wait time; raises AdmissionRejected"""
+        limits = self.limits[endpoint_class]
+        with self._lock:
+            waiters = self._waiters[endpoint_class]
+            waiter = _Waiter(tenant, weight, next(self._sequence))
+            waiters.append(waiter)
+            self._dispatch(endpoint_class)
+            if waiter.admitted:
+                return
+            if sum(1 for w in waiters if w.tenant == tenant) > limits.queue:
+                waiters.remove(waiter)
+                raise AdmissionRejected(endpoint_class, self._retry_after(limits))
+
+        waiter.event.wait(limits.wait_seconds)
+        with self._lock:
+            if waiter.admitted:
+                return
+            self._waiters[endpoint_class].remove(waiter)
+        raise AdmissionRejected(endpoint_class, self._retry_after(limits))
+
+    def release(self, tenant, endpoint_class):
+        with self._lock:
+            in_flight = self._in_flight[endpoint_class]
+            count = in_flight.get(tenant, 0) - 1
+            if count > 0:
+                in_flight[tenant] = count
+            else:
+                in_flight.pop(tenant, None)
+            self._dispatch(endpoint_class)
+
+    @staticmethod
+    def _retry_after(limits):
+        return max(1, math.ceil(limits.wait_seconds))
+
+    def snapshot(self):
+        """{class: {'in_flight': {tenant: n}, 'waiting': n}} for diagnostics"""
+        with self._lock:
+            return {name: {'in_flight': dict(self._in_flight[name]), 'waiting': len(self._waiters[name])}
+                    for name in self.limits}
+
+    # ----- Flask hooks -----
+
+    def admit_request(self):
+        if request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+            return
+        tenant = g.get('tenant_db') or 'default'
+        endpoint_class = self.classify(request.endpoint)
+        try:
+            self.acquire(tenant, endpoint_class, self.plan_weight(g.get('tenant_plan')))
+        except AdmissionRejected as e:
+            return self.render_rejected(e)
+        g.admission_slot = (tenant, endpoint_class)
+
+    def release_request(self, exception=None):
+        slot = g.pop('admission_slot', None)
+        if slot is not None:
+            self.release(*slot)
+
+    @staticmethod
+    def render_rejected(error):
+        message = (f"Too many {error.endpoint_class} requests are running for your company. "
+                   f"Please retry in {error.retry_after} seconds.")
+        if request.is_json or request.accept_mimetypes.best == 'application/json' \
+                or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            response = make_response(jsonify({'error': message, 'retry_after': error.retry_after}), 429)
+        else:
+            response = make_response(message, 429)
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+
+# Global instance
+admission_controller = AdmissionController()
@@ -0,0 +1,308 @@
+"""
+Analytics Dashboard Payload
+Builds every widget of the analytics dashboard in one request: the fuel
+window is read once (sorted by vehicle and date) and the stat cards, fuel
+cost chart and efficiency trends are all derived from that single pass;
+the assignment widgets share one aggregate as well. The remaining queries
+run concurrently through query_fanout. Payloads are cached briefly per
+tenant and role scope (see response_cache).
+"""
+
+from collections import OrderedDict
+import os
+
+from query_fanout import query_fanout
+
+# Seconds a built payload is served fresh for the same tenant / role scope / widgets
+DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 30))
+
+WIDGETS = ('stats', 'fuel_costs', 'utilization', 'efficiency', 'maintenance_schedule')
+
+FUEL_COST_COLORS = [
+    '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
+    '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF6384'
+]
+EFFICIENCY_COLORS = ['#4BC0C0', '#FF6384', '#36A2EB', '#FFCE56', '#9966FF']
+
+# One row per fuel record in the window, ordered for the per-vehicle efficiency pass
+FUEL_WINDOW_QUERY = """
+    SELECT
+        fr.vehicle_id, fr.employee_id, fr.fuel_amount, fr.fuel_cost, fr.odometer_reading,
+        DATE_FORMAT(fr.fuel_date, '%%Y-%%m') as month,
+        fr.fuel_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY) as in_last_30_days,
+        v.make, v.model, v.vehicle_number
+    FROM fuel_records fr
+    JOIN vehicles v ON fr.vehicle_id = v.id
+    WHERE fr.fuel_date >= DATE_SUB(CURDATE(), INTERVAL {window})
+    ORDER BY fr.vehicle_id, fr.fuel_date
+"""
+
+# Per-vehicle assignment counts for both the utilization chart and the top-utilized list
+ASSIGNMENTS_QUERY = """
+    SELECT
+        v.id, v.make, v.model, v.vehicle_number,
+        COUNT(DISTINCT CASE WHEN va.assignment_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                            THEN DATE(va.assignment_date) END) as days_used,
+        COUNT(CASE WHEN va.assignment_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                   THEN va.id END) as total_assignments,
+        COUNT(CASE WHEN va.assignment_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+                   THEN va.id END) as assignment_count
+    FROM vehicles v
+    LEFT JOIN vehicle_assignments va ON v.id = va.vehicle_id
+        AND va.assignment_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+    GROUP BY v.id, v.make, v.model, v.vehicle_number
+"""
+
+VEHICLE_STATUS_QUERY = """
+    SELECT
+        COUNT(*) as total,
+        SUM(CASE WHEN status = 'in_use' THEN 1 ELSE 0 END) as in_use,
+        SUM(CASE WHEN status = 'available' THEN 1 ELSE 0 END) as available,
+        SUM(CASE WHEN status = 'maintenance' THEN 1 ELSE 0 END) as maintenance
+    FROM vehicles
+"""
+
+ACTIVE_ASSIGNMENTS_QUERY = """
+    SELECT COUNT(*) as active_assignments
+    FROM vehicle_assignments
+    WHERE status = 'active'
+    {role_filter}
+"""
+
+MAINTENANCE_STATS_QUERY = """
+    SELECT
+        COUNT(*) as total_services,
+        COALESCE(SUM(cost), 0) as total_cost,
+        SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending,
+        SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
+    FROM service_maintenance
+    WHERE service_date >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)
+"""
+
+MAINTENANCE_SCHEDULE_QUERY = """
+    SELECT
+        v.make, v.model, v.vehicle_number,
+        sm.service_type, sm.next_service_date as scheduled_date, sm.status, sm.cost,
+        sm.description
+    FROM service_maintenance sm
+    JOIN vehicles v ON sm.vehicle_id = v.id
+    WHERE sm.next_service_date >= CURDATE()
+    ORDER BY sm.next_service_date ASC
+    LIMIT 20
+"""
+
+
+def parse_widgets(value):
+    """'stats,fuel_costs' -> ('stats', 'fuel_costs'); empty means every widget"""
+    if not value:
+        return WIDGETS
+    requested = {w.strip() for w in value.split(',') if w.strip()}
+    unknown = requested - set(WIDGETS)
+    if unknown:
+        raise ValueError(f"Unknown widgets: {', '.join(sorted(unknown))}")
+    return tuple(w for w in WIDGETS if w in requested)
+
+
+def build_payload(widgets, employee_id=None, days=30):
+    """
+    Compute the requested widgets
+
+    employee_id limits the fuel and assignment stat cards to that employee
+    (users without view_all_reports), exactly like /api/dashboard-stats.
+    """
+    widgets = set(widgets)
+    queries = {}
+
+    needs_fuel = widgets & {'stats', 'fuel_costs', 'efficiency'}
+    if needs_fuel:
+        # The charts need six months; the stat cards alone only the last 30 days
+        window = '6 MONTH' if widgets & {'fuel_costs', 'efficiency'} else '30 DAY'
+        queries['fuel'] = (FUEL_WINDOW_QUERY.format(window=window), (), 'all')
+    if widgets & {'stats', 'utilization'}:
+        window_days = max(days, 30)
+        queries['assignments'] = (ASSIGNMENTS_QUERY, (days, days, window_days), 'all')
+    if 'stats' in widgets:
+        role_filter = " AND employee_id = %s" if employee_id is not None else ''
+        queries['vehicles'] = (VEHICLE_STATUS_QUERY, None, 'one')
+        queries['active_assignments'] = (ACTIVE_ASSIGNMENTS_QUERY.format(role_filter=role_filter),
+                                         (employee_id,) if employee_id is not None else None, 'one')
+        queries['maintenance'] = (MAINTENANCE_STATS_QUERY, None, 'one')
+    if 'maintenance_schedule' in widgets:
+        queries['schedule'] = (MAINTENANCE_SCHEDULE_QUERY, None, 'all')
+
+    results = query_fanout.run(queries, replica=True) if queries else {}
+    payload = {}
+
+    if needs_fuel:
+        fuel = summarize_fuel(results['fuel'], employee_id)
+        if 'fuel_costs' in widgets:
+            payload['fuel_costs'] = fuel['fuel_costs']
+        if 'efficiency' in widgets:
+            payload['efficiency'] = fuel['efficiency']
+
+    if 'stats' in widgets:
+        maintenance = results['maintenance']
+        payload['stats'] = {
+            'vehicles': results['vehicles'],
+            'fuel': fuel['stats'],
+            'active_assignments': results['active_assignments']['active_assignments'],
+            'maintenance': {
+                'total_services': maintenance['total_services'],
+                'total_cost': float(maintenance['total_cost'] or 0),
+                'pending': maintenance['pending'],
+                'completed': maintenance['completed']
+            },
+            'top_utilized': top_utilized(results['assignments']),
+        }
+
+    if 'utilization' in widgets:
+        payload['utilization'] = utilization_chart(results['assignments'], days)
+
+    if 'maintenance_schedule' in widgets:
+        schedule = results['schedule']
+        for row in schedule:
+            if row['scheduled_date']:
+                row['scheduled_date'] = row['scheduled_date'].strftime('%Y-%m-%d')
+            row['cost'] = float(row['cost']) if row['cost'] else 0
+        payload['maintenance_schedule'] = schedule
+
+    return payload
+
+
+def summarize_fuel(rows, employee_id=None):
+    """Single pass over the fuel window: stat card totals, monthly costs and efficiency per vehicle"""
+    records = 0
+    liters = 0.0
+    cost = 0.0
+    price_sum = 0.0
+    price_count = 0
+
+    # (vehicle_id, month) -> total cost; insertion order is irrelevant, charts sort below
+    monthly_cost = {}
+    # (vehicle_id, month) -> [efficiency sum, count]
+    efficiency = {}
+    vehicles = {}
+
+    previous_vehicle = None
+    previous_odometer = None
+    for row in rows:
+        vehicle_id = row['vehicle_id']
+        month = row['month']
+        amount = float(row['fuel_amount']) if row['fuel_amount'] is not None else None
+        fuel_cost = float(row['fuel_cost']) if row['fuel_cost'] is not None else None
+        vehicles[vehicle_id] = row
+
+        if row['in_last_30_days'] and (employee_id is None or row['employee_id'] == employee_id):
+            records += 1
+            liters += amount or 0
+            cost += fuel_cost or 0
+            if amount and fuel_cost is not None:
+                price_sum += fuel_cost / amount
+                price_count += 1
+
+        if fuel_cost is not None:
+            key = (vehicle_id, month)
+            monthly_cost[key] = monthly_cost.get(key, 0.0) + fuel_cost
+
+        # Same as LAG(odometer_reading) OVER (PARTITION BY vehicle_id ORDER BY fuel_date)
+        if vehicle_id != previous_vehicle:
+            previous_vehicle, previous_odometer = vehicle_id, None
+        odometer = row['odometer_reading']
+        if odometer is not None and previous_odometer is not None and amount and amount > 0:
+            entry = efficiency.setdefault((vehicle_id, month), [0.0, 0])
+            entry[0] += (odometer - previous_odometer) / amount
+            entry[1] += 1
+        previous_odometer = odometer
+
+    return {
+        'stats': {
+            'total_records': records,
+            'total_liters': liters,
+            'total_cost': cost,
+            'avg_price_per_liter': price_sum / price_count if price_count else 0.0
+        },
+        'fuel_costs': fuel_costs_chart(monthly_cost, vehicles),
+        'efficiency': efficiency_chart(efficiency, vehicles),
+    }
+
+
+def fuel_costs_chart(monthly_cost, vehicles):
+    """Chart.js line data: one dataset per vehicle, ordered like the month / cost DESC query"""
+    series = OrderedDict()
+    months = set()
+    for (vehicle_id, month), total in sorted(monthly_cost.items(), key=lambda item: (item[0][1], -item[1])):
+        row = vehicles[vehicle_id]
+        vehicle_key = f"{row['make']} {row['model']} ({row['vehicle_number']})"
+        series.setdefault(vehicle_key, {})[month] = total
+        months.add(month)
+
+    months_sorted = sorted(months)
+    datasets = []
+    for idx, (vehicle, costs) in enumerate(series.items()):
+        color = FUEL_COST_COLORS[idx % len(FUEL_COST_COLORS)]
+        datasets.append({
+            'label': vehicle,
+            'data': [costs.get(month, 0) for month in months_sorted],
+            'borderColor': color,
+            'backgroundColor': color + '33',
+            'tension': 0.3
+        })
+    return {'labels': months_sorted, 'datasets': datasets}
+
+
+def efficiency_chart(efficiency, vehicles):
+    """Chart.js line data of average km/liter per vehicle and month (0 < km/L < 50)"""
+    series = OrderedDict()
+    months = set()
+    for (vehicle_id, month), (total, count) in sorted(efficiency.items(), key=lambda item: item[0][1]):
+        average = total / count
+        if not 0 < average < 50:
+            continue
+        row = vehicles[vehicle_id]
+        series.setdefault(f"{row['make']} {row['model']}", {})[month] = round(average, 2)
+        months.add(month)
+
+    months_sorted = sorted(months)
+    datasets = []
+    for idx, (vehicle, values) in enumerate(series.items()):
+        datasets.append({
+            'label': vehicle,
+            'data': [values.get(month, None) for month in months_sorted],
+            'borderColor': EFFICIENCY_COLORS[idx % len(EFFICIENCY_COLORS)],
+            'tension': 0.3,
+            'fill': False
+        })
+    return {'labels': months_sorted, 'datasets': datasets}
+
+
+def top_utilized(assignments, limit=10):
+    """Vehicles with the most assignments in the last 30 days"""
+    used = [row for row in assignments if row['assignment_count'] > 0]
+    used.sort(key=lambda row: row['assignment_count'], reverse=True)
+    return [{
+        'id': row['id'], 'make': row['make'], 'model': row['model'],
+        'vehicle_number': row['vehicle_number'], 'assignment_count': row['assignment_count']
+    } for row in used[:limit]]
+
+
+def utilization_chart(assignments, days):
+    """Chart.js bar data: utilization rate and assignment count per vehicle"""
+    rows = [dict(row, utilization_rate=round(row['days_used'] / days * 100, 2)) for row in assignments]
+    rows.sort(key=lambda row: row['utilization_rate'], reverse=True)
+    return {
+        'labels': [f"{row['make']} {row['model']}" for row in rows],
+        'datasets': [
+            {
+                'label': 'Utilization Rate (%)',
+                'data': [row['utilization_rate'] for row in rows],
+                'backgroundColor': '#36A2EB',
+                'yAxisID': 'y'
+            },
+            {
+                'label': 'Total Assignments',
+                'data': [row['total_assignments'] for row in rows],
+                'backgroundColor': '#FF6384',
+                'yAxisID': 'y1'
+            }
+        ]
+    }
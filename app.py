@@ -3,10 +3,22 @@ import pymysql
 from config import Config
 import os
 import json
+import db_metrics
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Per-request DB/template/outbound timing and the /metrics endpoint
+db_metrics.init_app(app)
+
+# Slow statements (with EXPLAIN) -> logs/slow_queries.log and /analytics/slow-queries
+from slow_query_log import slow_query_log
+slow_query_log.init_app(app)
+
+# N+1 / duplicate query warnings and per-route query budgets (dev/staging)
+from query_detector import query_detector
+query_detector.init_app(app)
+
 # Ensure Python builtin functions used in templates are available in Jinja
 app.jinja_env.globals['abs'] = abs
 
@@ -54,23 +66,44 @@ if MULTI_TENANT_ENABLED:
             return TenantDatabaseManager.get_tenant_connection(g.tenant_db)
         else:
             # Fallback for non-tenant routes or development
-            return pymysql.connect(
+            return db_metrics.connect(
                 host='localhost',
                 user='root',
                 password='ts#h3ph3rd',
                 database='flask_auth_db',
                 cursorclass=pymysql.cursors.DictCursor
             )
+    
+    def get_read_db_connection():
+        """Read-only connection for reports and exports (the tenant shard's replica when healthy)"""
+        if hasattr(g, 'tenant_db'):
+            from read_replica import replica_router
+            return replica_router.connect(g.tenant_db)
+        return get_db_connection()
 else:
     # Legacy single-tenant mode
     def get_db_connection():
-        return pymysql.connect(
+        return db_metrics.connect(
             host='localhost',
             user='root',
             password='ts#h3ph3rd',
             database='flask_auth_db',
             cursorclass=pymysql.cursors.DictCursor
         )
+    
+    get_read_db_connection = get_db_connection
+
+# Per-tenant concurrency slots for reports, exports and imports (after the tenant is known)
+from admission_control import admission_controller
+admission_controller.init_app(app)
+
+# Per-tenant usage counters (flushed to fleet_saas_main.tenant_usage) and /super-admin/usage
+from usage_metering import usage_meter
+usage_meter.init_app(app)
+
+# Fleet-wide figures across every tenant database for /super-admin
+from fleet_aggregation import fleet_aggregator
+fleet_aggregator.init_app(app)
 
 # Import routes after app initialization
 from routes import *
@@ -93,6 +126,12 @@ try:
 except Exception as e:
     print(f"Note: Analytics routes registration: {e}")
 
+# Pre-fork servers (e.g. gunicorn --preload): pay for the heavy report
+# libraries once in the master instead of on the first export in every worker
+import lazy_imports
+if lazy_imports.preload_enabled():
+    lazy_imports.preload()
+
 # Add global context processor for permissions
 @app.context_processor
 def inject_global_permissions():
@@ -142,6 +181,18 @@ def inject_global_permissions():
 try:
     from scheduler import scheduled_reports_manager
     scheduled_reports_manager.init_app(app)
+    # Nightly backup of every tenant database (enable on one process only)
+    if os.environ.get('FLEET_BACKUP_ENABLED', 'false').lower() == 'true':
+        import fleet_backup
+        fleet_backup.schedule(scheduled_reports_manager.scheduler)
+    # Keep spare tenant databases ready so signup does not wait for schema creation
+    if MULTI_TENANT_ENABLED:
+        from tenant_db_pool import tenant_db_pool
+        tenant_db_pool.schedule(scheduled_reports_manager.scheduler)
+        # Recount the users/vehicles behind plan limit checks
+        from plan_limits import plan_limits
+        plan_limits.schedule(scheduled_reports_manager.scheduler)
+    usage_meter.schedule(scheduled_reports_manager.scheduler)
     # Load scheduled reports after a short delay
     import threading
     def load_reports():
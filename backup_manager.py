@@ -1,11 +1,30 @@
+import io
 import os
+import re
+import gzip
+import time
+import queue
+import shutil
+import threading
 import pymysql
 from datetime import datetime
 import subprocess
-from app import get_db_connection
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
 
 BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+BACKUP_EXTENSIONS = ('.sql', '.sql.gz')
+
+# Streaming dump tuning
+BACKUP_FETCH_ROWS = int(os.environ.get('BACKUP_FETCH_ROWS', 5000))
+BACKUP_INSERT_MAX_BYTES = int(os.environ.get('BACKUP_INSERT_MAX_BYTES', 1024 * 1024))
+BACKUP_PARALLELISM = int(os.environ.get('BACKUP_PARALLELISM', 4))
+BACKUP_COMPRESSLEVEL = int(os.environ.get('BACKUP_COMPRESSLEVEL', 6))
+
+# Streaming restore tuning
+RESTORE_PARALLELISM = int(os.environ.get('RESTORE_PARALLELISM', 4))
+RESTORE_BATCH_STATEMENTS = int(os.environ.get('RESTORE_BATCH_STATEMENTS', 50))
+RESTORE_QUEUE_SIZE = 64
 
 def ensure_backup_directory():
     """Create backups directory if it doesn't exist"""
@@ -18,81 +37,211 @@ def create_backup():
     ensure_backup_directory()
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"backup_{Config.MYSQL_DB}_{timestamp}.sql"
+    backup_filename = f"backup_{Config.MYSQL_DB}_{timestamp}.sql.gz"
     
     # Use Python-based backup method (more reliable)
     return create_python_backup(backup_filename)
 
 def create_python_backup(filename):
-    """Create backup using Python (fallback method)"""
+    """Create a gzip-compressed backup of the current database using Python"""
+    from app import get_db_connection
+    
     backup_path = os.path.join(BACKUP_DIR, filename)
+    dump_database(get_db_connection, backup_path)
+    return backup_path
+
+def dump_database(connect, backup_path, parallelism=None, throttle=None, on_snapshot=None):
+    """
+    Stream a database into a gzip-compressed SQL dump.
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    `connect` is a zero-argument connection factory; up to `parallelism`
+    connections dump tables concurrently inside one consistent snapshot.
+    Each table is streamed with a server-side cursor into bounded
+    extended INSERTs, so memory stays flat whatever the table size.
+    `throttle(nbytes)`, if given, is called as data is written (I/O budgets).
+    `on_snapshot(conn)`, if given, runs inside the snapshot before the dump
+    and its result is returned as 'snapshot'.
+    Returns {'tables': {table: rows}, 'database': name, 'snapshot': ...}.
+    """
+    parallelism = parallelism or BACKUP_PARALLELISM
+    connections = [connect()]
+    parts_dir = f"{backup_path}.parts"
     
     try:
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            # Write header
-            f.write(f"-- MySQL Backup\n")
-            f.write(f"-- Database: {Config.MYSQL_DB}\n")
-            f.write(f"-- Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"SET FOREIGN_KEY_CHECKS=0;\n\n")
-            
-            # Get all tables
-            cursor.execute("SHOW TABLES")
-            result = cursor.fetchall()
-            
-            # Handle the table list extraction (works with both dict and tuple results)
-            if result and isinstance(result[0], dict):
-                # Get the first key from the dictionary (it will be 'Tables_in_<database_name>')
-                table_key = list(result[0].keys())[0]
-                tables = [row[table_key] for row in result]
-            else:
-                tables = [row[0] for row in result]
-            
-            for table in tables:
-                # Get table structure
-                cursor.execute(f"SHOW CREATE TABLE `{table}`")
-                create_table = cursor.fetchone()
-                f.write(f"DROP TABLE IF EXISTS `{table}`;\n")
-                f.write(f"{create_table['Create Table']};\n\n")
-                
-                # Get table data
-                cursor.execute(f"SELECT * FROM `{table}`")
-                rows = cursor.fetchall()
-                
-                if rows:
-                    # Get column names
-                    cursor.execute(f"DESCRIBE `{table}`")
-                    columns = [col['Field'] for col in cursor.fetchall()]
-                    
-                    f.write(f"INSERT INTO `{table}` ({', '.join([f'`{col}`' for col in columns])}) VALUES\n")
-                    
-                    for i, row in enumerate(rows):
-                        values = []
-                        for col in columns:
-                            val = row[col]
-                            if val is None:
-                                values.append('NULL')
-                            elif isinstance(val, (int, float)):
-                                values.append(str(val))
-                            elif isinstance(val, datetime):
-                                values.append(f"'{val.strftime('%Y-%m-%d %H:%M:%S')}'")
-                            else:
-                                val_str = str(val).replace("'", "\\'").replace("\\", "\\\\")
-                                values.append(f"'{val_str}'")
-                        
-                        if i < len(rows) - 1:
-                            f.write(f"({', '.join(values)}),\n")
-                        else:
-                            f.write(f"({', '.join(values)});\n\n")
-            
-            f.write("SET FOREIGN_KEY_CHECKS=1;\n")
+        database, tables = _list_tables(connections[0])
+        
+        # One connection per worker, opened up front so the snapshot covers them all
+        for _ in range(min(parallelism, len(tables)) - 1):
+            connections.append(connect())
+        _start_snapshots(connections)
+        snapshot = on_snapshot(connections[0]) if on_snapshot else None
+        
+        os.makedirs(parts_dir, exist_ok=True)
+        pending = queue.Queue()
+        # Largest tables first so the long dumps start immediately
+        for table, _ in sorted(tables, key=lambda t: t[1], reverse=True):
+            pending.put(table)
+        
+        row_counts = {}
+        lock = threading.Lock()
+        
+        def worker(conn):
+            while True:
+                try:
+                    table = pending.get_nowait()
+                except queue.Empty:
+                    return
+                rows = _dump_table(conn, table, os.path.join(parts_dir, f"{table}.sql.gz"), throttle)
+                with lock:
+                    row_counts[table] = rows
+        
+        if len(connections) == 1:
+            worker(connections[0])
+        else:
+            with ThreadPoolExecutor(max_workers=len(connections)) as pool:
+                # result() re-raises the first failure
+                for future in [pool.submit(worker, conn) for conn in connections]:
+                    future.result()
+        
+        write_dump(backup_path, database, [os.path.join(parts_dir, f"{table}.sql.gz") for table, _ in tables])
         
-        return backup_path
+        return {'database': database, 'tables': row_counts, 'snapshot': snapshot}
+    finally:
+        for conn in connections:
+            try:
+                conn.rollback()
+                conn.close()
+            except Exception:
+                pass
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+def write_dump(backup_path, database, part_paths, kind='MySQL Backup'):
+    """Join gzip part files between a header and footer; concatenated gzip members form one valid .gz stream"""
+    header = (
+        f"-- {kind}\n"
+        f"-- Database: {database}\n"
+        f"-- Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        f"SET FOREIGN_KEY_CHECKS=0;\n\n"
+    )
+    partial_path = f"{backup_path}.partial"
+    try:
+        with open(partial_path, 'wb') as out:
+            out.write(gzip.compress(header.encode('utf-8'), BACKUP_COMPRESSLEVEL))
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out)
+            out.write(gzip.compress(b"SET FOREIGN_KEY_CHECKS=1;\n", BACKUP_COMPRESSLEVEL))
+        os.replace(partial_path, backup_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+def _list_tables(conn):
+    """Database name and its base tables as (name, data_length), in name order"""
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("SELECT DATABASE() AS name")
+        database = cursor.fetchone()['name']
+        cursor.execute("""
+            SELECT table_name AS name, COALESCE(data_length, 0) AS size
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'
+            ORDER BY table_name
+        """)
+        return database, [(row['name'], row['size']) for row in cursor.fetchall()]
     finally:
         cursor.close()
-        conn.close()
+
+def _start_snapshots(connections):
+    """
+    Start a consistent-snapshot transaction on every connection. With several
+    connections a global read lock is held for the few milliseconds it takes,
+    so all of them see the same point in time.
+    """
+    locked = False
+    lock_cursor = connections[0].cursor()
+    try:
+        if len(connections) > 1:
+            try:
+                lock_cursor.execute("SET SESSION lock_wait_timeout = 10")
+                lock_cursor.execute("FLUSH TABLES WITH READ LOCK")
+                locked = True
+            except Exception as e:
+                print(f"⚠️  Backup: could not take global read lock ({e}); snapshots may differ slightly between tables")
+        
+        for conn in connections:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            finally:
+                cursor.close()
+    finally:
+        if locked:
+            lock_cursor.execute("UNLOCK TABLES")
+        lock_cursor.close()
+
+def _dump_table(conn, table, part_path, throttle=None, where=None, params=None,
+                verb='INSERT', include_schema=True, preamble=None):
+    """
+    Write DROP/CREATE and the table's rows as bounded extended INSERTs into a gzip part.
+    Incremental dumps pass a `where` filter, verb='REPLACE', no schema and a
+    `preamble` of statements (e.g. tombstone DELETEs) written before the rows.
+    """
+    rows_written = 0
+    
+    with gzip.open(part_path, 'wt', encoding='utf-8', newline='\n', compresslevel=BACKUP_COMPRESSLEVEL) as f:
+        if include_schema:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            try:
+                cursor.execute(f"SHOW CREATE TABLE `{table}`")
+                create_table = cursor.fetchone()
+            finally:
+                cursor.close()
+            f.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+            f.write(f"{create_table['Create Table']};\n\n")
+        
+        for statement in preamble or ():
+            f.write(f"{statement};\n")
+        
+        # Unbuffered cursor: rows arrive in chunks instead of one fetchall()
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(f"SELECT * FROM `{table}`" + (f" WHERE {where}" if where else ''), params)
+            columns = [col[0] for col in cursor.description]
+            insert_prefix = f"{verb} INTO `{table}` ({', '.join([f'`{col}`' for col in columns])}) VALUES\n"
+            escape = conn.escape
+            
+            statement_size = 0
+            while True:
+                rows = cursor.fetchmany(BACKUP_FETCH_ROWS)
+                if not rows:
+                    break
+                chunk_size = 0
+                for row in rows:
+                    values = f"({', '.join([escape(val) for val in row])})"
+                    if statement_size and statement_size + len(values) > BACKUP_INSERT_MAX_BYTES:
+                        f.write(";\n")
+                        statement_size = 0
+                    if statement_size == 0:
+                        f.write(insert_prefix)
+                        statement_size = len(insert_prefix)
+                    else:
+                        f.write(",\n")
+                    f.write(values)
+                    statement_size += len(values) + 2
+                    chunk_size += len(values) + 2
+                    rows_written += 1
+                if throttle:
+                    throttle(chunk_size)
+            
+            if statement_size:
+                f.write(";\n")
+            f.write("\n")
+        finally:
+            cursor.close()
+    
+    return rows_written
 
 def list_backups():
     """List all available backups"""
@@ -100,7 +249,7 @@ def list_backups():
     backups = []
     
     for filename in os.listdir(BACKUP_DIR):
-        if filename.endswith('.sql'):
+        if filename.endswith(BACKUP_EXTENSIONS):
             filepath = os.path.join(BACKUP_DIR, filename)
             stat = os.stat(filepath)
             backups.append({
@@ -132,35 +281,326 @@ def restore_backup(filename):
 
 def restore_python_backup(filepath):
     """Restore backup using Python (fallback method)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    from app import get_db_connection
+    
+    restore_database(get_db_connection, filepath)
+    return True
+
+class RestoreError(Exception):
+    """Raised when a restore stops; `report` says what was restored and what failed"""
     
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+_STATEMENT_SPECIALS = re.compile(r"[;'\"`#/-]")
+_QUOTE_SPECIALS = {"'": re.compile(r"['\\]"), '"': re.compile(r'["\\]')}
+_COMMENT_ONLY = re.compile(r"^(?:\s|--[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*(?!!).*?\*/)*$", re.S)
+_LEADING_COMMENTS = r"^(?:\s|--[^\n]*\n|#[^\n]*\n|/\*(?!!).*?\*/)*"
+_TABLE_STATEMENT = re.compile(
+    _LEADING_COMMENTS +
+    r"(?:/\*!\d*\s*)?(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?|"
+    r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?|ALTER\s+TABLE|LOCK\s+TABLES|TRUNCATE\s+(?:TABLE\s+)?|DELETE\s+FROM)"
+    r"\s*`?([^`\s(,;]+)`?", re.I | re.S)
+_SESSION_STATEMENT = re.compile(_LEADING_COMMENTS + r"(?:/\*!\d*\s*)?(?:SET|USE|UNLOCK\s+TABLES)\b", re.I | re.S)
+
+def iter_sql_statements(f, chunk_size=1024 * 1024):
+    """
+    Yield SQL statements from a text stream without reading it all into memory.
+    Semicolons inside quoted strings, identifiers and comments do not split
+    statements; backslash escapes and doubled quotes are honoured.
+    """
+    buf = ''
+    start = 0       # start of the current statement in buf
+    pos = 0         # scan position in buf
+    state = None    # None, a quote character, '--' (line comment) or '/*'
+    eof = False
+    
+    while True:
+        chunk = f.read(chunk_size)
+        if chunk:
+            buf = buf[start:] + chunk
+            pos -= start
+            start = 0
+        else:
+            eof = True
+        
+        while True:
+            if state is None:
+                match = _STATEMENT_SPECIALS.search(buf, pos)
+                if not match:
+                    pos = len(buf)
+                    break
+                i = match.start()
+                c = buf[i]
+                if c == ';':
+                    statement = buf[start:i]
+                    if not _COMMENT_ONLY.match(statement):
+                        yield statement.strip()
+                    start = pos = i + 1
+                elif c in '\'"`':
+                    state = c
+                    pos = i + 1
+                elif c == '#':
+                    state = '--'
+                    pos = i + 1
+                else:
+                    # '-' or '/' may start a comment; decide once the next characters are known
+                    if i + 2 >= len(buf) and not eof:
+                        pos = i
+                        break
+                    following = buf[i + 1:i + 3]
+                    if c == '-' and following[:1] == '-' and (len(following) < 2 or following[1] in ' \t\r\n'):
+                        state = '--'
+                        pos = i + 2
+                    elif c == '/' and following[:1] == '*':
+                        state = '/*'
+                        pos = i + 2
+                    else:
+                        pos = i + 1
+            elif state == '`':
+                end = buf.find('`', pos)
+                if end < 0:
+                    pos = len(buf)
+                    break
+                state = None
+                pos = end + 1
+            elif state in _QUOTE_SPECIALS:
+                match = _QUOTE_SPECIALS[state].search(buf, pos)
+                if not match:
+                    pos = len(buf)
+                    break
+                i = match.start()
+                if buf[i] == '\\':
+                    if i + 1 >= len(buf) and not eof:
+                        pos = i
+                        break
+                    pos = i + 2
+                else:
+                    state = None
+                    pos = i + 1
+            elif state == '--':
+                end = buf.find('\n', pos)
+                if end < 0:
+                    pos = len(buf)
+                    break
+                state = None
+                pos = end + 1
+            else:
+                end = buf.find('*/', pos)
+                if end < 0:
+                    pos = max(pos, len(buf) - 1)
+                    break
+                state = None
+                pos = end + 2
+        
+        if eof:
+            if state in ('`', "'", '"'):
+                raise ValueError(f"Backup is truncated or corrupt: unterminated {state} quote")
+            statement = buf[start:]
+            if not _COMMENT_ONLY.match(statement):
+                yield statement.strip()
+            return
+
+def _open_backup(filepath):
+    """(text stream, raw file) for a plain or gzip-compressed dump; raw.tell() tracks progress"""
+    raw = open(filepath, 'rb')
+    if filepath.endswith('.gz'):
+        stream = io.TextIOWrapper(gzip.GzipFile(fileobj=raw), encoding='utf-8')
+    else:
+        stream = io.TextIOWrapper(raw, encoding='utf-8')
+    return stream, raw
+
+def scan_backup(filepath):
+    """Parse the whole dump without executing it; raises if the file is truncated or corrupt"""
+    statements = 0
+    tables = set()
+    stream, raw = _open_backup(filepath)
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            sql_script = f.read()
-            
-            # Split by semicolons and execute each statement
-            statements = sql_script.split(';\n')
-            for statement in statements:
-                statement = statement.strip()
-                if statement and not statement.startswith('--'):
+        for statement in iter_sql_statements(stream):
+            statements += 1
+            match = _TABLE_STATEMENT.match(statement)
+            if match:
+                tables.add(match.group(1))
+    finally:
+        stream.close()
+        raw.close()
+    return {'statements': statements, 'tables': sorted(tables)}
+
+class _RestoreWorker(threading.Thread):
+    """Executes the statements of the tables assigned to it, in order, on its own connection"""
+    
+    def __init__(self, conn, abort, batch_size):
+        super().__init__(daemon=True)
+        self.conn = conn
+        self.abort = abort
+        self.batch_size = batch_size
+        self.statements = queue.Queue(maxsize=RESTORE_QUEUE_SIZE)
+        self.executed = 0
+        self.tables = set()
+        self.error = None
+    
+    def run(self):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+            cursor.execute("SET UNIQUE_CHECKS=0")
+            pending = 0
+            while True:
+                item = self.statements.get()
+                try:
+                    if item is None:
+                        if not self.abort.is_set():
+                            self.conn.commit()
+                        return
+                    if self.abort.is_set():
+                        continue
+                    number, table, statement = item
                     try:
                         cursor.execute(statement)
                     except Exception as e:
-                        print(f"Warning: {e}")
+                        self.conn.rollback()
+                        self.error = {
+                            'statement_number': number,
+                            'table': table,
+                            'statement': statement[:300],
+                            'error': str(e),
+                        }
+                        self.abort.set()
+                        continue
+                    self.executed += 1
+                    if table:
+                        self.tables.add(table)
+                    pending += 1
+                    # Batched transactions: one commit per batch of statements
+                    if pending >= self.batch_size:
+                        self.conn.commit()
+                        pending = 0
+                finally:
+                    self.statements.task_done()
+        except Exception as e:
+            self.error = self.error or {'statement_number': None, 'table': None, 'statement': None, 'error': str(e)}
+            self.abort.set()
+        finally:
+            cursor.close()
+
+def restore_database(connect, filepath, parallelism=None, verify=True, progress=None):
+    """
+    Stream a plain or gzip-compressed dump into the database.
+    
+    Statements for different tables run in parallel on up to `parallelism`
+    connections (statements of one table stay in order on one connection),
+    with foreign key and unique checks disabled and one commit per batch.
+    The file is parsed once up front (`verify`) so a truncated dump fails
+    before anything is dropped. Raises RestoreError with a report on failure.
+    """
+    parallelism = parallelism or RESTORE_PARALLELISM
+    started = time.time()
+    
+    if verify:
+        try:
+            scanned = scan_backup(filepath)
+        except Exception as e:
+            raise RestoreError(f"Backup file is unreadable, nothing was restored: {e}",
+                               {'restored_tables': [], 'failed': None, 'statements': 0})
+        parallelism = max(1, min(parallelism, len(scanned['tables'])))
+    
+    abort = threading.Event()
+    workers = [_RestoreWorker(connect(), abort, RESTORE_BATCH_STATEMENTS) for _ in range(parallelism)]
+    for worker in workers:
+        worker.start()
+    
+    assigned = {}
+    total_size = os.path.getsize(filepath) or 1
+    dispatched = 0
+    last_report = 0
+    stream, raw = _open_backup(filepath)
+    reader_error = None
+    
+    def dispatch(worker, item):
+        # Blocks while the worker's queue is full (back-pressure keeps memory bounded)
+        while not abort.is_set():
+            try:
+                worker.statements.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+    
+    try:
+        for statement in iter_sql_statements(stream):
+            if abort.is_set():
+                break
+            dispatched += 1
             
-            conn.commit()
-        return True
+            match = _TABLE_STATEMENT.match(statement)
+            if match:
+                table = match.group(1)
+                worker = assigned.get(table)
+                if worker is None:
+                    # New table goes to the least busy connection
+                    worker = min(workers, key=lambda w: w.statements.qsize())
+                    assigned[table] = worker
+                dispatch(worker, (dispatched, table, statement))
+            elif _SESSION_STATEMENT.match(statement):
+                # Session settings apply to every connection
+                for worker in workers:
+                    dispatch(worker, (dispatched, None, statement))
+            else:
+                # Anything else (views, routines) may depend on any table: wait for all loads first
+                for worker in workers:
+                    worker.statements.join()
+                dispatch(workers[0], (dispatched, None, statement))
+            
+            if dispatched - last_report >= 1000:
+                last_report = dispatched
+                done = min(raw.tell() / total_size, 1.0)
+                if progress:
+                    progress(statements=dispatched, fraction=done)
+                print(f"Restore: {done:.0%} read, {dispatched} statements")
+    except Exception as e:
+        reader_error = str(e)
+        abort.set()
     finally:
-        cursor.close()
-        conn.close()
+        for worker in workers:
+            worker.statements.put(None)
+        for worker in workers:
+            worker.join()
+            try:
+                worker.conn.close()
+            except Exception:
+                pass
+        stream.close()
+        raw.close()
+    
+    restored_tables = sorted(set().union(*[w.tables for w in workers]))
+    failed = next((w.error for w in workers if w.error), None)
+    if reader_error and not failed:
+        failed = {'statement_number': dispatched, 'table': None, 'statement': None, 'error': reader_error}
+    report = {
+        'statements': sum(w.executed for w in workers),
+        'restored_tables': restored_tables,
+        'failed': failed,
+        'seconds': round(time.time() - started, 2),
+    }
+    
+    if failed:
+        where = f" (table `{failed['table']}`)" if failed['table'] else ''
+        raise RestoreError(
+            f"Restore stopped at statement {failed['statement_number']}{where}: {failed['error']}. "
+            f"{len(restored_tables)} tables were touched before the failure; restore again from a good backup.",
+            report)
+    
+    if progress:
+        progress(statements=dispatched, fraction=1.0)
+    print(f"✓ Restore complete: {report['statements']} statements, {len(restored_tables)} tables in {report['seconds']}s")
+    return report
 
 def get_backup_size_total():
     """Get total size of all backups"""
     ensure_backup_directory()
     total = 0
     for filename in os.listdir(BACKUP_DIR):
-        if filename.endswith('.sql'):
+        if filename.endswith(BACKUP_EXTENSIONS):
             filepath = os.path.join(BACKUP_DIR, filename)
             total += os.path.getsize(filepath)
     return total
@@ -0,0 +1,204 @@
+"""
+Endpoint Benchmark Suite
+Drives the hot endpoints through the Flask test client against the tenants
+created by generate_benchmark_data.py (local MySQL/MariaDB) and records
+p50/p95 latency and query counts into a JSON baseline that can be compared
+between runs.
+
+Usage:
+    python benchmark_endpoints.py --tenants 3 --iterations 20 --output bench_baseline.json
+    python benchmark_endpoints.py --tenants 3 --compare bench_baseline.json
+"""
+
+import sys
+sys.path.append('.')
+
+import os
+# Keep the detector's per-statement bookkeeping out of the timings
+os.environ.setdefault('QUERY_DETECTOR_ENABLED', 'false')
+
+import argparse
+import json
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from generate_benchmark_data import DEFAULT_PREFIX, BENCHMARK_PASSWORD, subdomain_for
+
+MAIN_DOMAIN = 'fleetmanager.local'
+
+
+def build_endpoints():
+    """Hot endpoints: (name, method, path, payload)"""
+    today = datetime.now().date()
+    year_ago = (today - timedelta(days=365)).isoformat()
+    quarter_ago = (today - timedelta(days=90)).isoformat()
+    sample_rows = [{'vehicle_number': f'V{i:04d}', 'fuel_amount': 40.5, 'fuel_cost': 62.1,
+                    'fuel_date': today.isoformat()} for i in range(200)]
+
+    return [
+        ('employee_dashboard', 'GET', '/employee/dashboard', None),
+        ('fuel_reports_monthly', 'GET', '/fuel-reports?report_type=monthly', None),
+        ('fuel_reports_year', 'GET', f'/fuel-reports?report_type=custom&start_date={year_ago}&end_date={today}', None),
+        ('fuel_reports_export', 'GET', f'/fuel-reports/export?report_type=custom&start_date={quarter_ago}&end_date={today}', None),
+        ('service_notifications', 'GET', '/service-notifications', None),
+        ('fuel_records', 'GET', '/fuel-records', None),
+        ('api_vehicles', 'GET', '/api/vehicles', None),
+        ('api_employees', 'GET', '/api/employees', None),
+        ('analytics_dashboard_stats', 'GET', '/analytics/api/dashboard-stats', None),
+        ('analytics_fuel_costs_chart', 'GET', '/analytics/api/fuel-costs-chart', None),
+        ('analytics_vehicle_utilization', 'GET', '/analytics/api/vehicle-utilization?days=30', None),
+        ('analytics_maintenance_schedule', 'GET', '/analytics/api/maintenance-schedule', None),
+        ('analytics_fuel_efficiency', 'GET', '/analytics/api/fuel-efficiency-trends', None),
+        ('analytics_fuel_cost_summary', 'GET', f'/analytics/api/fuel-cost-summary?start_date={year_ago}&end_date={today}', None),
+        ('analytics_maintenance_cost_summary', 'GET', f'/analytics/api/maintenance-cost-summary?start_date={year_ago}&end_date={today}', None),
+        ('analytics_export_excel', 'POST', '/analytics/api/export-excel', {'data': sample_rows, 'title': 'Benchmark'}),
+        ('analytics_export_pdf', 'POST', '/analytics/api/export-pdf', {'data': sample_rows, 'title': 'Benchmark'}),
+    ]
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples):
+    latencies = [s['ms'] for s in samples]
+    queries = [s['queries'] for s in samples]
+    statuses = {}
+    for s in samples:
+        statuses[str(s['status'])] = statuses.get(str(s['status']), 0) + 1
+    return {
+        'samples': len(samples),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_p50': percentile(queries, 50),
+        'queries_max': max(queries),
+        'status_codes': statuses,
+    }
+
+
+def timed_request(client, query_detector, method, path, base_url, payload=None, data=None):
+    with query_detector.count_queries() as queries:
+        start = time.perf_counter()
+        if method == 'POST':
+            response = client.post(path, base_url=base_url, json=payload, data=data)
+        else:
+            response = client.get(path, base_url=base_url)
+        response.get_data()
+        elapsed = (time.perf_counter() - start) * 1000
+    return {'ms': elapsed, 'queries': len(queries), 'status': response.status_code}
+
+
+def run(args):
+    from app import app
+    from query_detector import query_detector
+
+    app.config['TESTING'] = False
+    endpoints = build_endpoints()
+    if args.only:
+        endpoints = [e for e in endpoints if e[0] in args.only]
+
+    samples = {'login': []}
+    samples.update({name: [] for name, _, _, _ in endpoints})
+
+    for index in range(1, args.tenants + 1):
+        subdomain = subdomain_for(args.prefix, index)
+        base_url = f"http://{subdomain}.{MAIN_DOMAIN}"
+        username = f"admin_{subdomain}"
+        print(f"\n▶ {subdomain}")
+
+        # Login (exercises the tenant-scanning path) on a fresh client each time
+        for i in range(args.iterations):
+            client = app.test_client()
+            sample = timed_request(client, query_detector, 'POST', '/employee/login', base_url,
+                                   data={'username': username, 'password': BENCHMARK_PASSWORD})
+            samples['login'].append(sample)
+
+        client = app.test_client()
+        response = client.post('/employee/login', base_url=base_url,
+                               data={'username': username, 'password': BENCHMARK_PASSWORD})
+        with client.session_transaction() as sess:
+            if 'employee_id' not in sess:
+                print(f"   ✗ Could not log in as {username} (status {response.status_code}); skipping tenant")
+                continue
+
+        for name, method, path, payload in endpoints:
+            # Warm-up request is not recorded
+            timed_request(client, query_detector, method, path, base_url, payload)
+            for _ in range(args.iterations):
+                samples[name].append(timed_request(client, query_detector, method, path, base_url, payload))
+            summary = summarize(samples[name][-args.iterations:])
+            print(f"   {name:40s} p50 {summary['p50_ms']:9.1f} ms  p95 {summary['p95_ms']:9.1f} ms  "
+                  f"queries {summary['queries_p50']}")
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'tenants': args.tenants,
+            'iterations': args.iterations,
+            'prefix': args.prefix,
+        },
+        'endpoints': {name: summarize(values) for name, values in samples.items() if values},
+    }
+
+
+def compare(current, baseline_path):
+    """Print the change against a previous baseline file"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    print()
+    print(f"Comparison with {baseline_path} ({baseline['meta'].get('git_commit')})")
+    print(f"{'endpoint':40s} {'p50 before':>11s} {'p50 now':>9s} {'Δ%':>7s} {'p95 Δ%':>8s} {'queries':>12s}")
+    for name, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            print(f"{name:40s} {'-':>11s} {now['p50_ms']:9.1f}   (new)")
+            continue
+        p50_delta = (now['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        p95_delta = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        print(f"{name:40s} {before['p50_ms']:11.1f} {now['p50_ms']:9.1f} {p50_delta:+7.1f} {p95_delta:+8.1f} "
+              f"{str(before['queries_p50']) + '→' + str(now['queries_p50']):>12s}")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hot endpoints against generated tenants')
+    parser.add_argument('--tenants', type=int, default=3, help='Number of generated tenants to hit')
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='Subdomain prefix used by the generator')
+    parser.add_argument('--iterations', type=int, default=10, help='Measured requests per endpoint and tenant')
+    parser.add_argument('--only', nargs='*', help='Restrict to these endpoint names')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Compare results with a previous JSON baseline')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Baseline written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
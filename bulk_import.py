@@ -0,0 +1,387 @@
+"""
+Bulk Data Import
+Streaming Excel import for vehicles, employees and fuel records: rows are read
+with a read-only workbook, validated in batches against keys prefetched in one
+query per table, and inserted with chunked executemany() - one transaction per
+chunk - while progress is published for the upload page to poll.
+"""
+
+from datetime import datetime
+import threading
+import time
+
+IMPORT_CHUNK_SIZE = 1000
+
+# Insert statements per data type (fuel_records depends on the payment_method column)
+VEHICLE_INSERT = """
+    INSERT INTO vehicles
+    (vehicle_number, make, model, year, color, vehicle_type,
+     status, mileage, last_service_date, expected_fuel_consumption, notes)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+EMPLOYEE_INSERT = """
+    INSERT INTO employees
+    (username, email, password_hash, employee_id, phone, department,
+     position, status)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+FUEL_INSERT = """
+    INSERT INTO fuel_records
+    (vehicle_id, employee_id, fuel_date, fuel_amount, fuel_cost,
+     odometer_reading, fuel_type, station_name{payment_column})
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s{payment_placeholder})
+"""
+
+
+class ImportProgress:
+    """
+    Progress of running imports keyed by (tenant, import id), polled by the upload page.
+    Kept in the response cache backend, so with the Redis backend any worker can answer
+    the poll; with the memory backend the poll must reach the importing worker.
+    """
+
+    MAX_AGE_SECONDS = 3600
+
+    def __init__(self):
+        # Jobs this process is running (it is their only writer)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(tenant, import_id):
+        return f"import:{tenant}:{import_id}"
+
+    def _publish(self, tenant, import_id, job):
+        from response_cache import response_cache
+        try:
+            response_cache.backend.set(self._key(tenant, import_id), job, self.MAX_AGE_SECONDS)
+        except Exception as e:
+            print(f"⚠️  Import progress not published ({tenant}/{import_id}): {e}")
+
+    def start(self, tenant, import_id, data_type):
+        if not import_id:
+            return
+        job = {
+            'data_type': data_type,
+            'status': 'running',
+            'rows_read': 0,
+            'imported': 0,
+            'failed': 0,
+            'started_at': time.time(),
+            'updated_at': time.time(),
+        }
+        with self._lock:
+            self._jobs[(tenant, import_id)] = job
+        self._publish(tenant, import_id, dict(job))
+
+    def update(self, tenant, import_id, **values):
+        if not import_id:
+            return
+        with self._lock:
+            job = self._jobs.get((tenant, import_id))
+            if job is None:
+                return
+            job.update(values, updated_at=time.time())
+            if job['status'] != 'running':
+                del self._jobs[(tenant, import_id)]
+            job = dict(job)
+        self._publish(tenant, import_id, job)
+
+    def get(self, tenant, import_id):
+        from response_cache import response_cache
+        try:
+            return response_cache.backend.get(self._key(tenant, import_id))
+        except Exception as e:
+            print(f"⚠️  Import progress unavailable ({tenant}/{import_id}): {e}")
+            return None
+
+
+def _clean(value):
+    """Trim strings; empty strings become None"""
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _to_float(val):
+    if val is None:
+        return None
+    if isinstance(val, (int, float)):
+        return float(val)
+    s = str(val).strip()
+    # Remove common currency symbols and thousands separators
+    s = s.replace('$', '').replace('€', '').replace('£', '')
+    s = s.replace(',', '')
+    if s == '':
+        return None
+    try:
+        return float(s)
+    except Exception:
+        raise ValueError(f"Invalid numeric value: {val}")
+
+
+def _to_int(val):
+    if val is None or val == '':
+        return None
+    if isinstance(val, int):
+        return val
+    try:
+        return int(float(str(val).strip().replace(',', '')))
+    except Exception:
+        raise ValueError(f"Invalid integer value: {val}")
+
+
+class BulkImporter:
+    """
+    Imports one uploaded workbook into the current tenant database
+
+    Usage:
+        importer = BulkImporter(conn, 'fuel_records', progress=callback)
+        result = importer.run(file)   # {'imported': n, 'failed': n, 'errors': [...]}
+    """
+
+    DATA_TYPES = ('vehicles', 'employees', 'fuel_records')
+
+    def __init__(self, conn, data_type, chunk_size=IMPORT_CHUNK_SIZE, progress=None, max_rows=None):
+        if data_type not in self.DATA_TYPES:
+            raise ValueError(f"Unsupported import type: {data_type}")
+        self.conn = conn
+        self.data_type = data_type
+        self.chunk_size = chunk_size
+        self.progress = progress
+        # Rows that may still be inserted (plan limit); None = no limit
+        self.max_rows = max_rows
+
+        self.rows_read = 0
+        self.imported = 0
+        self.errors = []
+
+    # ----- reading -----
+
+    @staticmethod
+    def stream_rows(file):
+        """Yield (excel row number, values) from the active sheet without loading it into memory"""
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            # Skip header row
+            for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+                # Skip empty rows or notes section
+                if not row or not row[0] or str(row[0]).startswith('Notes'):
+                    continue
+                yield idx, row
+        finally:
+            wb.close()
+
+    def run(self, file):
+        self.prefetch()
+
+        batch = []
+        for idx, row in self.stream_rows(file):
+            self.rows_read += 1
+            batch.append((idx, row))
+            if len(batch) >= self.chunk_size:
+                self._process_batch(batch)
+                batch = []
+        if batch:
+            self._process_batch(batch)
+
+        return {'imported': self.imported, 'failed': len(self.errors), 'errors': self.errors}
+
+    # ----- prefetch -----
+
+    def prefetch(self):
+        """Load every key the validation needs in one query per table"""
+        cursor = self.conn.cursor()
+        try:
+            if self.data_type in ('vehicles', 'fuel_records'):
+                cursor.execute("SELECT id, vehicle_number FROM vehicles")
+                self.vehicle_ids = {row['vehicle_number']: row['id'] for row in cursor.fetchall()}
+
+            if self.data_type in ('employees', 'fuel_records'):
+                cursor.execute("SELECT id, username, email, employee_id FROM employees")
+                employees = cursor.fetchall()
+                self.employee_ids = {row['username']: row['id'] for row in employees}
+                self.emails = {row['email'] for row in employees if row['email']}
+                self.employee_numbers = {row['employee_id'] for row in employees if row['employee_id']}
+
+            if self.data_type == 'fuel_records':
+                # Detect whether the `payment_method` column exists in the fuel_records table
+                try:
+                    cursor.execute("SHOW COLUMNS FROM fuel_records LIKE 'payment_method'")
+                    self.has_payment_column = cursor.fetchone() is not None
+                except Exception:
+                    self.has_payment_column = False
+        finally:
+            cursor.close()
+
+    # ----- validation -----
+
+    def _process_batch(self, batch):
+        validate = getattr(self, f'_validate_{self.data_type}')
+        valid = []
+        for idx, row in batch:
+            try:
+                values = validate(idx, row)
+            except Exception as e:
+                values = None
+                if self.data_type == 'employees':
+                    # Never echo the plain-text password column back
+                    self.errors.append(f"Row {idx}: {str(e)}")
+                else:
+                    self.errors.append(f"Row {idx}: {str(e)} - data: {row}")
+            if values is not None:
+                valid.append((idx, values))
+
+        if self.max_rows is not None:
+            room = max(0, self.max_rows - self.imported)
+            for idx, _ in valid[room:]:
+                self.errors.append(f"Row {idx}: plan limit of {self.data_type} reached")
+            valid = valid[:room]
+
+        if self.data_type == 'employees':
+            # Hash the whole batch at once across cores (slowest step of an employee import)
+            passwords = self.hash_passwords([values[2] for _, values in valid])
+            valid = [(idx, values[:2] + (hashed,) + values[3:])
+                     for (idx, values), hashed in zip(valid, passwords)]
+
+        self._insert(valid)
+        if self.progress:
+            self.progress(rows_read=self.rows_read, imported=self.imported, failed=len(self.errors))
+
+    @staticmethod
+    def hash_passwords(passwords):
+        """Hash in parallel on the shared process pool (same generate_password_hash format)"""
+        from password_hasher import password_hasher
+        return password_hasher.hash_many(passwords)
+
+    def _validate_vehicles(self, idx, row):
+        vehicle_number, make, model, year, color, vehicle_type, status, mileage, last_service_date, expected_fuel_consumption, notes = \
+            (list(row) + [None] * 11)[:11]
+        vehicle_number = _clean(vehicle_number)
+
+        # Required fields
+        if not all([vehicle_number, make, model, year]):
+            self.errors.append(f"Row {idx}: Missing required fields")
+            return None
+
+        if vehicle_number in self.vehicle_ids:
+            self.errors.append(f"Row {idx}: Vehicle {vehicle_number} already exists")
+            return None
+
+        if last_service_date and isinstance(last_service_date, str):
+            last_service_date = datetime.strptime(last_service_date.strip(), '%Y-%m-%d').date()
+
+        # Reserve the key so a duplicate further down the file is rejected too
+        self.vehicle_ids[vehicle_number] = None
+        return (vehicle_number, make, model, year, color, vehicle_type,
+                status or 'available', mileage, last_service_date, expected_fuel_consumption, notes)
+
+    def _validate_employees(self, idx, row):
+        username, email, password, employee_id, phone, department, position, status = \
+            (list(row) + [None] * 8)[:8]
+        username, email, employee_id = _clean(username), _clean(email), _clean(employee_id)
+
+        if not all([username, email, password, employee_id]):
+            self.errors.append(f"Row {idx}: Missing required fields")
+            return None
+
+        if username in self.employee_ids or email in self.emails or employee_id in self.employee_numbers:
+            self.errors.append(f"Row {idx}: Employee {username}, email, or employee ID already exists")
+            return None
+
+        self.employee_ids[username] = None
+        self.emails.add(email)
+        self.employee_numbers.add(employee_id)
+        return (username, email, str(password), employee_id, phone, department,
+                position, status or 'active')
+
+    def _validate_fuel_records(self, idx, row):
+        vehicle_number, employee_username, fuel_date, fuel_amount, fuel_cost, odometer, fuel_type, station, payment = \
+            [_clean(v) for v in (list(row) + [None] * 9)[:9]]
+
+        try:
+            fuel_amount = _to_float(fuel_amount)
+        except Exception as e:
+            self.errors.append(f"Row {idx}: fuel_amount conversion error: {e} - data: {row}")
+            return None
+
+        try:
+            fuel_cost = _to_float(fuel_cost)
+        except Exception as e:
+            self.errors.append(f"Row {idx}: fuel_cost conversion error: {e} - data: {row}")
+            return None
+
+        try:
+            odometer = _to_int(odometer)
+        except Exception as e:
+            self.errors.append(f"Row {idx}: odometer conversion error: {e} - data: {row}")
+            return None
+
+        if not all([vehicle_number, employee_username, fuel_date, fuel_amount is not None, fuel_cost is not None]):
+            self.errors.append(f"Row {idx}: Missing required fields")
+            return None
+
+        vehicle_id = self.vehicle_ids.get(vehicle_number)
+        if not vehicle_id:
+            self.errors.append(f"Row {idx}: Vehicle {vehicle_number} not found")
+            return None
+
+        employee_id = self.employee_ids.get(employee_username)
+        if not employee_id:
+            self.errors.append(f"Row {idx}: Employee {employee_username} not found")
+            return None
+
+        if isinstance(fuel_date, str):
+            fuel_date = datetime.strptime(fuel_date, '%Y-%m-%d %H:%M')
+
+        values = (vehicle_id, employee_id, fuel_date, fuel_amount, fuel_cost, odometer, fuel_type, station)
+        if self.has_payment_column:
+            values += (payment,)
+        return values
+
+    # ----- writing -----
+
+    def _insert_sql(self):
+        if self.data_type == 'vehicles':
+            return VEHICLE_INSERT
+        if self.data_type == 'employees':
+            return EMPLOYEE_INSERT
+        if self.has_payment_column:
+            return FUEL_INSERT.format(payment_column=', payment_method', payment_placeholder=', %s')
+        return FUEL_INSERT.format(payment_column='', payment_placeholder='')
+
+    def _insert(self, valid):
+        """One executemany() and commit per chunk; a failing chunk is retried row by row to find the bad rows"""
+        if not valid:
+            return
+        sql = self._insert_sql()
+        cursor = self.conn.cursor()
+        try:
+            try:
+                cursor.executemany(sql, [values for _, values in valid])
+                self.conn.commit()
+                self.imported += len(valid)
+                return
+            except Exception:
+                self.conn.rollback()
+
+            for idx, values in valid:
+                try:
+                    cursor.execute(sql, values)
+                    self.conn.commit()
+                    self.imported += 1
+                except Exception as e:
+                    self.conn.rollback()
+                    self.errors.append(f"Row {idx}: {str(e)}")
+        finally:
+            cursor.close()
+
+
+# Global instance
+import_progress = ImportProgress()
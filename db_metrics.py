@@ -0,0 +1,453 @@
+"""
+Request and Database Instrumentation
+Wraps database connections/cursors to record per-request query statistics
+and exposes Prometheus-style histograms on /metrics
+"""
+
+from flask import g, request, has_request_context, Response, before_render_template, template_rendered
+from contextlib import contextmanager
+from functools import lru_cache
+import threading
+import hashlib
+import re
+import pymysql
+import time
+import os
+
+# Set DB_METRICS_ENABLED=false to skip instrumentation entirely
+METRICS_ENABLED = os.environ.get('DB_METRICS_ENABLED', 'true').lower() == 'true'
+# Shared secret required to scrape /metrics (?token=... or Bearer header);
+# without it only direct loopback requests are answered
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+# Bucket boundaries for the different kinds of histograms
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+ROWS_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+class Histogram:
+    """
+    Thread-safe labelled histogram rendered in Prometheus text format
+    Each process keeps its own values (scrape every worker, or aggregate upstream)
+    """
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation for the given label values"""
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        """Render this histogram in Prometheus exposition format"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, dict(series, buckets=list(series['buckets']))) for key, series in self._series.items()]
+
+        for key, series in sorted(items):
+            base_labels = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, key)]
+            for bound, count in zip(self.buckets, series['buckets']):
+                labels = ','.join(base_labels + [f'le="{_format_number(bound)}"'])
+                lines.append(f"{self.name}_bucket{{{labels}}} {count}")
+            labels = ','.join(base_labels + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{labels}}} {series['count']}")
+            labels = ','.join(base_labels)
+            lines.append(f"{self.name}_sum{{{labels}}} {_format_number(series['sum'])}")
+            lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        """Drop all recorded series"""
+        with self._lock:
+            self._series = {}
+
+
+class MetricsRegistry:
+    """Collection of histograms exposed on the /metrics endpoint"""
+
+    def __init__(self):
+        self.histograms = []
+
+    def histogram(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        """Create and register a histogram"""
+        hist = Histogram(name, help_text, label_names, buckets)
+        self.histograms.append(hist)
+        return hist
+
+    def render(self):
+        """Render all histograms as one Prometheus text payload"""
+        return '\n'.join(hist.render() for hist in self.histograms) + '\n'
+
+    def reset(self):
+        for hist in self.histograms:
+            hist.reset()
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return f"{value:.1f}"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+REQUEST_LABELS = ('endpoint', 'tenant')
+
+request_duration = registry.histogram(
+    'fleet_request_duration_seconds', 'Total request handling time', REQUEST_LABELS)
+request_db_queries = registry.histogram(
+    'fleet_request_db_queries', 'Number of SQL statements executed per request', REQUEST_LABELS, COUNT_BUCKETS)
+request_db_time = registry.histogram(
+    'fleet_request_db_time_seconds', 'Time spent executing SQL per request', REQUEST_LABELS)
+request_db_rows = registry.histogram(
+    'fleet_request_db_rows_fetched', 'Rows fetched from the database per request', REQUEST_LABELS, ROWS_BUCKETS)
+request_db_connections = registry.histogram(
+    'fleet_request_db_connections', 'Database connections opened per request', REQUEST_LABELS, COUNT_BUCKETS)
+db_connect_time = registry.histogram(
+    'fleet_db_connect_seconds', 'Time to establish a database connection', REQUEST_LABELS)
+db_connection_open_time = registry.histogram(
+    'fleet_db_connection_open_seconds', 'Time a database connection was held open', REQUEST_LABELS)
+template_render_time = registry.histogram(
+    'fleet_template_render_seconds', 'Jinja template render time', REQUEST_LABELS)
+outbound_call_time = registry.histogram(
+    'fleet_outbound_call_seconds', 'Outbound call time (SMTP, Twilio)', REQUEST_LABELS + ('service',))
+
+
+# ===========================
+# REQUEST-SCOPED STATISTICS
+# ===========================
+
+def _new_request_stats():
+    return {
+        'queries': 0,
+        'db_time': 0.0,
+        'rows': 0,
+        'connections': 0,
+        'connect_time': 0.0,
+        'template_time': 0.0,
+        'outbound_time': 0.0,
+    }
+
+
+def get_request_stats():
+    """
+    Get the statistics dict for the current request
+    Returns None outside of a request (scheduler threads, CLI scripts)
+    """
+    if not has_request_context():
+        return None
+    stats = g.get('db_stats')
+    if stats is None:
+        stats = _new_request_stats()
+        g.db_stats = stats
+    return stats
+
+
+def current_labels():
+    """Endpoint/tenant labels for the current request"""
+    if not has_request_context():
+        return {'endpoint': 'background', 'tenant': 'none'}
+    return {
+        'endpoint': request.endpoint or 'unmatched',
+        'tenant': g.get('tenant_subdomain') or g.get('tenant_db') or 'none',
+    }
+
+
+# ===========================
+# SQL FINGERPRINTING
+# ===========================
+
+_COMMENT_RE = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_PLACEHOLDER_RE = re.compile(r'%\(\w+\)s|%s')
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+_IN_LIST_RE = re.compile(r'\bin \(\?(?:, \?)*\)')
+_VALUES_RE = re.compile(r'\bvalues (\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape: literals and placeholders become ?,
+    IN-lists and multi-row VALUES collapse, whitespace and case are folded
+    """
+    text = _COMMENT_RE.sub(' ', sql)
+    text = _STRING_RE.sub('?', text)
+    text = _PLACEHOLDER_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _WHITESPACE_RE.sub(' ', text).strip().lower()
+    text = text.replace('( ', '(').replace(' )', ')').replace(' ,', ',').replace(',?', ', ?')
+    text = _IN_LIST_RE.sub('in (?+)', text)
+    text = _VALUES_RE.sub(r'values \1+', text)
+    return text
+
+
+def fingerprint_sql(sql):
+    """Return (fingerprint_id, normalized_sql) for a statement"""
+    normalized = normalize_sql(sql)
+    return hashlib.md5(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+
+# Callbacks invoked after every executed statement:
+# listener(sql, params, duration_seconds, rowcount, cursor)
+_query_listeners = []
+
+
+def add_query_listener(listener):
+    """Register a callback that is invoked after every executed statement"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+
+def remove_query_listener(listener):
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+
+def _record_query(sql, params, duration, rowcount, cursor):
+    stats = get_request_stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_time'] += duration
+
+    for listener in list(_query_listeners):
+        try:
+            listener(sql, params, duration, rowcount, cursor)
+        except Exception as e:
+            print(f"Query listener error: {e}")
+
+
+def _record_rows(count):
+    if not count:
+        return
+    stats = get_request_stats()
+    if stats is not None:
+        stats['rows'] += count
+
+
+# ===========================
+# CONNECTION / CURSOR WRAPPERS
+# ===========================
+
+class InstrumentedCursor:
+    """Cursor proxy that times statements and counts fetched rows"""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self.connection = connection
+
+    @property
+    def raw_cursor(self):
+        """The underlying pymysql cursor"""
+        return self._cursor
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            _record_query(query, args, time.perf_counter() - start, self._cursor.rowcount, self)
+
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            _record_query(query, args, time.perf_counter() - start, self._cursor.rowcount, self)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            _record_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size)
+        _record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        _record_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy that hands out instrumented cursors and tracks open time"""
+
+    def __init__(self, connection, labels=None):
+        self._connection = connection
+        self._labels = labels or current_labels()
+        self._opened_at = time.perf_counter()
+        self._closed = False
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self)
+
+    def close(self):
+        try:
+            self._connection.close()
+        finally:
+            if not self._closed:
+                self._closed = True
+                db_connection_open_time.observe(time.perf_counter() - self._opened_at, **self._labels)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def connect(**config):
+    """
+    Open an instrumented pymysql connection
+    Drop-in replacement for pymysql.connect()
+    """
+    if not METRICS_ENABLED:
+        return pymysql.connect(**config)
+
+    labels = current_labels()
+    start = time.perf_counter()
+    connection = pymysql.connect(**config)
+    elapsed = time.perf_counter() - start
+
+    db_connect_time.observe(elapsed, **labels)
+    stats = get_request_stats()
+    if stats is not None:
+        stats['connections'] += 1
+        stats['connect_time'] += elapsed
+
+    return InstrumentedConnection(connection, labels)
+
+
+@contextmanager
+def track_outbound(service):
+    """
+    Time an outbound call (SMTP, Twilio, ...)
+
+    Usage:
+        with track_outbound('smtp'):
+            server.send_message(msg)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if METRICS_ENABLED:
+            outbound_call_time.observe(elapsed, service=service, **current_labels())
+            stats = get_request_stats()
+            if stats is not None:
+                stats['outbound_time'] += elapsed
+
+
+# ===========================
+# FLASK INTEGRATION
+# ===========================
+
+def _before_request():
+    g.request_started_at = time.perf_counter()
+    get_request_stats()
+
+
+def _after_request(response):
+    started = g.get('request_started_at')
+    stats = g.get('db_stats')
+    if started is None or stats is None:
+        return response
+
+    labels = current_labels()
+    request_duration.observe(time.perf_counter() - started, **labels)
+    request_db_queries.observe(stats['queries'], **labels)
+    request_db_time.observe(stats['db_time'], **labels)
+    request_db_rows.observe(stats['rows'], **labels)
+    request_db_connections.observe(stats['connections'], **labels)
+
+    # Per-request breakdown for the browser dev tools
+    response.headers['Server-Timing'] = (
+        f'db;dur={stats["db_time"] * 1000:.1f};desc="{stats["queries"]} queries, {stats["rows"]} rows", '
+        f'connect;dur={stats["connect_time"] * 1000:.1f}, '
+        f'tpl;dur={stats["template_time"] * 1000:.1f}, '
+        f'ext;dur={stats["outbound_time"] * 1000:.1f}'
+    )
+    return response
+
+
+def _on_before_render(sender, template, context, **extra):
+    g.setdefault('template_render_stack', []).append(time.perf_counter())
+
+
+def _on_template_rendered(sender, template, context, **extra):
+    stack = g.get('template_render_stack')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    template_render_time.observe(elapsed, **current_labels())
+    stats = get_request_stats()
+    if stats is not None and not stack:
+        stats['template_time'] += elapsed
+
+
+def _metrics_allowed():
+    if METRICS_TOKEN:
+        return (request.args.get('token') == METRICS_TOKEN
+                or request.headers.get('Authorization') == f'Bearer {METRICS_TOKEN}')
+    # A request relayed by a local reverse proxy also arrives from loopback
+    return request.remote_addr in LOOPBACK_ADDRESSES and 'X-Forwarded-For' not in request.headers
+
+
+def metrics_endpoint():
+    """Prometheus scrape endpoint (token, or loopback when no token is configured)"""
+    if not _metrics_allowed():
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Install request hooks, template signals and the /metrics endpoint"""
+    if not METRICS_ENABLED:
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_template_rendered, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
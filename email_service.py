@@ -9,6 +9,7 @@ from email.mime.base import MIMEBase
 from email import encoders
 import os
 from datetime import datetime
+from db_metrics import track_outbound
 
 class EmailService:
     """Service for sending emails with attachments"""
@@ -65,10 +66,11 @@ class EmailService:
                     msg.attach(part)
             
             # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            with track_outbound('smtp'):
+                with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                    server.starttls()
+                    server.login(self.smtp_username, self.smtp_password)
+                    server.send_message(msg)
             
             print(f"✓ Email sent to {', '.join(to_emails)}")
             return True
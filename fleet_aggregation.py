@@ -0,0 +1,240 @@
+"""
+Cross-Tenant Aggregation
+Fleet-wide figures for the super-admin dashboard (/super-admin) and company
+list (/super-admin/companies). Every tenant database is queried concurrently
+on a bounded thread pool (AGGREGATION_MAX_WORKERS), reading from the shard's
+replica when it is healthy. Each tenant query is limited to
+AGGREGATION_TENANT_TIMEOUT_SECONDS on the server, and the whole round to
+AGGREGATION_DEADLINE_SECONDS; tenants that fail or time out keep their last
+figures and are flagged.
+
+Results are cached for AGGREGATION_TTL_SECONDS. A stale cache is served while
+one background refresh runs; only the very first page view waits for a round.
+
+Usage:
+    snapshot = fleet_aggregator.snapshot()            # cached
+    python fleet_aggregation.py                       # one round, printed
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import request, render_template
+from datetime import datetime
+import threading
+import time
+import os
+
+AGGREGATION_MAX_WORKERS = int(os.environ.get('AGGREGATION_MAX_WORKERS', 8))
+# Server-side limit per tenant query (MAX_EXECUTION_TIME)
+AGGREGATION_TENANT_TIMEOUT_SECONDS = float(os.environ.get('AGGREGATION_TENANT_TIMEOUT_SECONDS', 5))
+# Tenants not done by then are reported as timed out
+AGGREGATION_DEADLINE_SECONDS = float(os.environ.get('AGGREGATION_DEADLINE_SECONDS', 30))
+AGGREGATION_TTL_SECONDS = int(os.environ.get('AGGREGATION_TTL_SECONDS', 300))
+# Window for fuel spend and active users
+AGGREGATION_WINDOW_DAYS = int(os.environ.get('AGGREGATION_WINDOW_DAYS', 30))
+
+METRICS = ('vehicles', 'vehicles_in_use', 'employees', 'active_employees', 'active_users',
+           'fuel_cost', 'fuel_litres', 'fuel_records', 'open_job_cards')
+
+# One round trip per tenant
+TENANT_METRICS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM vehicles) AS vehicles,
+        (SELECT COUNT(*) FROM vehicles WHERE status = 'in_use') AS vehicles_in_use,
+        (SELECT COUNT(*) FROM employees) AS employees,
+        (SELECT COUNT(*) FROM employees WHERE status = 'active') AS active_employees,
+        (SELECT COUNT(DISTINCT employee_id) FROM fuel_records
+         WHERE fuel_date >= NOW() - INTERVAL %(days)s DAY) AS active_users,
+        (SELECT COALESCE(SUM(fuel_cost), 0) FROM fuel_records
+         WHERE fuel_date >= NOW() - INTERVAL %(days)s DAY) AS fuel_cost,
+        (SELECT COALESCE(SUM(fuel_amount), 0) FROM fuel_records
+         WHERE fuel_date >= NOW() - INTERVAL %(days)s DAY) AS fuel_litres,
+        (SELECT COUNT(*) FROM fuel_records
+         WHERE fuel_date >= NOW() - INTERVAL %(days)s DAY) AS fuel_records,
+        (SELECT COUNT(*) FROM job_cards WHERE status NOT IN ('completed', 'cancelled')) AS open_job_cards
+"""
+
+
+class FleetAggregator:
+    """Concurrent per-tenant metrics with a TTL cache of the last round"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=AGGREGATION_MAX_WORKERS,
+                                            thread_name_prefix='fleet-aggregation')
+        # database -> {'metrics': {...}, 'fetched_at': datetime} from the last successful query
+        self._tenants = {}
+        self._snapshot = None
+        self._refreshed_at = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Install the super-admin dashboard views"""
+        from tenant_middleware import require_super_admin
+        app.add_url_rule('/super-admin', 'super_admin_dashboard', require_super_admin(dashboard_view))
+        app.add_url_rule('/super-admin/companies', 'super_admin_companies', require_super_admin(companies_view))
+
+    # ----- per tenant -----
+
+    @staticmethod
+    def query_tenant(database):
+        from read_replica import replica_router
+        conn = replica_router.connect(database)
+        try:
+            with conn.cursor() as cursor:
+                try:
+                    cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s",
+                                   (int(AGGREGATION_TENANT_TIMEOUT_SECONDS * 1000),))
+                except Exception:
+                    pass  # MariaDB and old MySQL: the round deadline still applies
+                cursor.execute(TENANT_METRICS_QUERY, {'days': AGGREGATION_WINDOW_DAYS})
+                row = cursor.fetchone()
+            return {name: float(row[name]) if name in ('fuel_cost', 'fuel_litres') else int(row[name])
+                    for name in METRICS}
+        finally:
+            conn.close()
+
+    # ----- rounds -----
+
+    @staticmethod
+    def companies():
+        from tenant_manager import TenantDatabaseManager
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, name, subdomain, database_name, plan, status, shard_id,
+                           max_users, max_vehicles, created_at, trial_ends_at, subscription_ends_at
+                    FROM companies
+                    WHERE database_name IS NOT NULL
+                    ORDER BY name
+                """)
+                return cursor.fetchall()
+
+    def refresh(self):
+        """Query every tenant database once and rebuild the cached snapshot"""
+        started = time.monotonic()
+        companies = self.companies()
+        futures = {self._executor.submit(self.query_tenant, company['database_name']): company
+                   for company in companies}
+        done, not_done = wait(futures, timeout=AGGREGATION_DEADLINE_SECONDS)
+
+        now = datetime.now()
+        errors = {}
+        for future, company in futures.items():
+            database = company['database_name']
+            if future in not_done:
+                future.cancel()
+                errors[database] = f"timed out after {AGGREGATION_DEADLINE_SECONDS:g}s"
+                continue
+            try:
+                metrics = future.result()
+            except Exception as e:
+                errors[database] = str(e)
+                continue
+            with self._lock:
+                self._tenants[database] = {'metrics': metrics, 'fetched_at': now}
+
+        rows = []
+        with self._lock:
+            for company in companies:
+                cached = self._tenants.get(company['database_name'])
+                rows.append(dict(company,
+                                 metrics=cached['metrics'] if cached else None,
+                                 fetched_at=cached['fetched_at'] if cached else None,
+                                 error=errors.get(company['database_name'])))
+
+        snapshot = {
+            'companies': rows,
+            'totals': self.totals(rows),
+            'computed_at': now,
+            'duration': time.monotonic() - started,
+            'failed': len(errors),
+            'window_days': AGGREGATION_WINDOW_DAYS,
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self._refreshed_at = time.monotonic()
+        mark = '✓' if not errors else '⚠️ '
+        print(f"{mark} Fleet aggregation: {len(companies)} tenants in {snapshot['duration']:.1f}s "
+              f"({len(errors)} failed or timed out)")
+        return snapshot
+
+    @staticmethod
+    def totals(rows):
+        totals = dict.fromkeys(METRICS, 0)
+        by_status = {}
+        by_plan = {}
+        for row in rows:
+            by_status[row['status']] = by_status.get(row['status'], 0) + 1
+            by_plan[row['plan']] = by_plan.get(row['plan'], 0) + 1
+            for name, value in (row['metrics'] or {}).items():
+                totals[name] += value
+        totals.update(companies=len(rows), by_status=by_status, by_plan=by_plan)
+        return totals
+
+    def _refresh_once(self):
+        """Run a round unless one is already running; returns False if it was skipped"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"✗ Fleet aggregation failed: {e}")
+        finally:
+            self._refresh_lock.release()
+        return True
+
+    def snapshot(self, force=False):
+        """Cached snapshot; stale ones are served while a background round refreshes them"""
+        with self._lock:
+            snapshot = self._snapshot
+            age = time.monotonic() - self._refreshed_at
+
+        if snapshot is None or force:
+            if not self._refresh_once():
+                # Another request is running the round; wait for it
+                with self._refresh_lock:
+                    pass
+            with self._lock:
+                return self._snapshot
+        if age > AGGREGATION_TTL_SECONDS and not self._refresh_lock.locked():
+            threading.Thread(target=self._refresh_once, daemon=True).start()
+        return snapshot
+
+
+# Global instance
+fleet_aggregator = FleetAggregator()
+
+
+# ----- super-admin views -----
+
+def _snapshot():
+    return fleet_aggregator.snapshot(force=request.args.get('refresh') == '1')
+
+
+def dashboard_view():
+    """Fleet-wide totals and the companies with the highest fuel spend"""
+    snapshot = _snapshot()
+    if snapshot is None:
+        return "Fleet figures are not available yet, please retry shortly.", 503
+    top = sorted((row for row in snapshot['companies'] if row['metrics']),
+                 key=lambda row: row['metrics']['fuel_cost'], reverse=True)[:10]
+    return render_template('super_admin_dashboard.html', snapshot=snapshot, top=top)
+
+
+def companies_view():
+    """Every company with its cached figures (?status= filter)"""
+    snapshot = _snapshot()
+    if snapshot is None:
+        return "Fleet figures are not available yet, please retry shortly.", 503
+    status = request.args.get('status') or None
+    companies = [row for row in snapshot['companies'] if status is None or row['status'] == status]
+    return render_template('super_admin_companies.html', snapshot=snapshot, companies=companies, status=status)
+
+
+if __name__ == '__main__':
+    result = fleet_aggregator.refresh()
+    for row in result['companies']:
+        metrics = row['metrics'] or {}
+        print(f"   {row['database_name']:30s} {metrics.get('vehicles', '-'):>6} veh  "
+              f"{metrics.get('active_users', '-'):>5} users  {metrics.get('fuel_cost', 0):>12,.2f} fuel"
+              f"{'  ✗ ' + row['error'] if row['error'] else ''}")
@@ -0,0 +1,637 @@
+"""
+Fleet Backup Orchestrator
+Backs up every tenant database (fleet_*) and fleet_saas_main concurrently
+within a global connection and I/O budget. Each database gets its own
+directory under backups/fleet/ with a manifest (sizes, SHA-256 checksums,
+row counts) and tiered daily/weekly/monthly retention.
+
+Incremental mode exports only rows whose updated_at moved past the previous
+backup's watermark, plus primary-key tombstones for deleted rows; restore
+replays the base full backup followed by its chain of increments.
+
+Usage:
+    python fleet_backup.py                      # full backup of everything, apply retention
+    python fleet_backup.py --mode incremental   # increments on top of the latest full backups
+    python fleet_backup.py --only fleet_acme    # one database
+    python fleet_backup.py --list               # show manifests
+    python fleet_backup.py --restore fleet_acme [--upto FILE] [--target fleet_acme_copy]
+
+Scheduler: set FLEET_BACKUP_ENABLED=true (FLEET_BACKUP_HOUR, default 2) and
+app.py registers a nightly job on the background scheduler: a full backup on
+FLEET_BACKUP_FULL_DAY (default sun) and increments on the other days.
+"""
+
+import sys
+sys.path.append('.')
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import hashlib
+import shutil
+import gzip
+import json
+import time
+import os
+
+from backup_manager import (BACKUP_DIR, dump_database, restore_database, write_dump,
+                            _dump_table, _start_snapshots, RestoreError)
+from tenant_manager import TenantDatabaseManager
+from shard_manager import shard_registry
+
+FLEET_BACKUP_DIR = os.path.join(BACKUP_DIR, 'fleet')
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.fleet_backup.lock'
+
+# Global budget for one run
+FLEET_BACKUP_CONCURRENCY = int(os.environ.get('FLEET_BACKUP_CONCURRENCY', 4))
+FLEET_BACKUP_MAX_CONNECTIONS = int(os.environ.get('FLEET_BACKUP_MAX_CONNECTIONS', 8))
+FLEET_BACKUP_MAX_MBPS = float(os.environ.get('FLEET_BACKUP_MAX_MBPS', 0))  # 0 = unlimited
+
+# Incremental backups re-read rows changed this long before the previous
+# watermark, covering transactions that committed after the snapshot started
+INCREMENTAL_OVERLAP_SECONDS = int(os.environ.get('INCREMENTAL_OVERLAP_SECONDS', 300))
+TOMBSTONE_BATCH = 1000
+
+# Retention tiers: newest backup per day / ISO week / month is kept for this many periods
+RETENTION = {
+    'daily': int(os.environ.get('BACKUP_KEEP_DAILY', 7)),
+    'weekly': int(os.environ.get('BACKUP_KEEP_WEEKLY', 4)),
+    'monthly': int(os.environ.get('BACKUP_KEEP_MONTHLY', 12)),
+}
+
+
+class IOBudget:
+    """Token bucket shared by all dump threads (bytes per second across the whole run)"""
+
+    def __init__(self, max_mbps):
+        self.rate = max_mbps * 1024 * 1024
+        self.allowance = self.rate
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            self.allowance -= nbytes
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class BackupManifest:
+    """Per-database manifest.json listing its backup files"""
+
+    def __init__(self, database):
+        self.database = database
+        self.directory = os.path.join(FLEET_BACKUP_DIR, database)
+        self.path = os.path.join(self.directory, MANIFEST_NAME)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {'database': self.database, 'backups': []}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
+
+    def add(self, entry):
+        manifest = self.load()
+        manifest['backups'].append(entry)
+        self.save(manifest)
+
+
+def sha256_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_databases():
+    """fleet_saas_main plus every fleet_* tenant database on every enabled shard"""
+    with TenantDatabaseManager.main_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW DATABASES LIKE 'fleet\\_%'")
+            databases = {list(row.values())[0] for row in cursor.fetchall()}
+
+    for shard_id, shard in shard_registry.shards(refresh=True).items():
+        if shard['status'] == 'disabled':
+            continue
+        connection = TenantDatabaseManager.get_server_connection(shard_id)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW DATABASES LIKE 'fleet\\_%'")
+                databases.update(list(row.values())[0] for row in cursor.fetchall())
+        finally:
+            connection.close()
+    return sorted(databases)
+
+
+def _connect(database, replica=False):
+    """Connection factory; backups read from the shard's replica when it is healthy, restores use the primary"""
+    if replica:
+        from read_replica import replica_router
+        import db_metrics
+        # One server for every connection of a dump, so the per-table snapshots stay consistent:
+        # no per-connection fallback, a dump fails if that server goes away. Replica lag stays
+        # well inside INCREMENTAL_OVERLAP_SECONDS.
+        target, config = replica_router.resolve(database)
+        print(f"   {database}: reading from the {target}")
+        return lambda: db_metrics.connect(**config)
+    return lambda: TenantDatabaseManager.get_tenant_connection(database)
+
+
+# ----- primary-key snapshots (tombstone source) -----
+
+def _to_ranges(ids):
+    """Sorted integer ids -> [[first, last], ...]"""
+    ranges = []
+    for value in ids:
+        if ranges and value == ranges[-1][1] + 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+
+def _ranges_difference(previous, current):
+    """Ids covered by `previous` ranges but not by `current` ranges (both sorted)"""
+    missing = []
+    i = 0
+    for start, end in previous:
+        position = start
+        while i < len(current) and current[i][1] < position:
+            i += 1
+        j = i
+        while position <= end:
+            if j < len(current) and current[j][0] <= position:
+                position = current[j][1] + 1
+                j += 1
+                continue
+            stop = min(end, current[j][0] - 1) if j < len(current) else end
+            missing.extend(range(position, stop + 1))
+            position = stop + 1
+    return missing
+
+
+def _count(ranges):
+    return sum(end - start + 1 for start, end in ranges)
+
+
+def capture_keys(conn):
+    """
+    Inside the backup snapshot: server time (the next watermark), a schema
+    hash per table, and the primary keys of tables that can be backed up
+    incrementally (single integer primary key and an updated_at column)
+    """
+    import pymysql
+
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("SELECT NOW() AS taken_at")
+        taken_at = cursor.fetchone()['taken_at']
+        cursor.execute("""
+            SELECT c.table_name AS table_name, c.column_name AS column_name,
+                   c.column_key AS column_key, c.data_type AS data_type
+            FROM information_schema.columns c
+            JOIN information_schema.tables t
+              ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+            WHERE c.table_schema = DATABASE() AND t.table_type = 'BASE TABLE'
+        """)
+        columns = {}
+        for row in cursor.fetchall():
+            columns.setdefault(row['table_name'], []).append(row)
+
+        tables = {}
+        for table in sorted(columns):
+            cursor.execute(f"SHOW CREATE TABLE `{table}`")
+            schema = hashlib.md5(cursor.fetchone()['Create Table'].encode('utf-8')).hexdigest()
+            primary = [c for c in columns[table] if c['column_key'] == 'PRI']
+            has_updated_at = any(c['column_name'] == 'updated_at' for c in columns[table])
+            pk = primary[0]['column_name'] if (
+                len(primary) == 1 and primary[0]['data_type'] in ('int', 'bigint', 'mediumint', 'smallint')
+            ) else None
+            tables[table] = {'schema': schema, 'pk': pk if has_updated_at else None, 'keys': None}
+    finally:
+        cursor.close()
+
+    for table, info in tables.items():
+        if not info['pk']:
+            continue
+        key_cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            key_cursor.execute(f"SELECT `{info['pk']}` FROM `{table}` ORDER BY `{info['pk']}`")
+            info['keys'] = _to_ranges(row[0] for row in key_cursor)
+        finally:
+            key_cursor.close()
+
+    return {'taken_at': taken_at.isoformat(), 'tables': tables}
+
+
+def write_keys(path, keys):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(keys, f)
+
+
+def read_keys(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# ----- full and incremental backups -----
+
+def backup_database(database, parallelism=1, io_budget=None):
+    """Full dump of one database into its directory; returns the manifest entry"""
+    manifest = BackupManifest(database)
+    os.makedirs(manifest.directory, exist_ok=True)
+
+    created_at = datetime.now()
+    filename = f"{database}_{created_at.strftime('%Y%m%d_%H%M%S')}_full.sql.gz"
+    path = os.path.join(manifest.directory, filename)
+
+    started = time.time()
+    result = dump_database(
+        _connect(database, replica=True),
+        path,
+        parallelism=parallelism,
+        throttle=io_budget.consume if io_budget else None,
+        on_snapshot=capture_keys
+    )
+    keys_file = filename.replace('.sql.gz', '.keys.json.gz')
+    write_keys(os.path.join(manifest.directory, keys_file), result['snapshot'])
+
+    entry = {
+        'file': filename,
+        'type': 'full',
+        'created_at': created_at.isoformat(timespec='seconds'),
+        'size': os.path.getsize(path),
+        'sha256': sha256_file(path),
+        'tables': result['tables'],
+        'watermark': result['snapshot']['taken_at'],
+        'keys_file': keys_file,
+        'seconds': round(time.time() - started, 2),
+    }
+    manifest.add(entry)
+    return entry
+
+
+def current_chain(backups, upto=None):
+    """The latest full backup (or the one `upto` belongs to) followed by its increments, oldest first"""
+    ordered = sorted(backups, key=lambda b: b['created_at'])
+    if upto:
+        target = next((b for b in ordered if b['file'] == upto), None)
+        if target is None:
+            raise ValueError(f"{upto} is not in the manifest")
+        base = target.get('base', target['file'])
+    else:
+        fulls = [b for b in ordered if b['type'] == 'full']
+        if not fulls:
+            return []
+        base = fulls[-1]['file']
+
+    chain = [b for b in ordered if b['file'] == base or b.get('base') == base]
+    if upto:
+        chain = chain[:[b['file'] for b in chain].index(upto) + 1]
+    return chain
+
+
+def incremental_backup(database, io_budget=None):
+    """
+    Rows changed since the previous backup in the chain (REPLACE INTO) plus
+    DELETEs for primary keys that disappeared. Tables without a usable
+    updated_at/primary key, new tables and tables whose schema changed are
+    copied in full. Falls back to a full backup when there is no chain yet.
+    """
+    manifest_store = BackupManifest(database)
+    chain = current_chain(manifest_store.load()['backups'])
+    if not chain or not chain[-1].get('keys_file'):
+        return backup_database(database, io_budget=io_budget)
+
+    previous = chain[-1]
+    previous_keys = read_keys(os.path.join(manifest_store.directory, previous['keys_file']))
+    since = datetime.fromisoformat(previous_keys['taken_at']) - timedelta(seconds=INCREMENTAL_OVERLAP_SECONDS)
+
+    created_at = datetime.now()
+    filename = f"{database}_{created_at.strftime('%Y%m%d_%H%M%S')}_incr.sql.gz"
+    path = os.path.join(manifest_store.directory, filename)
+    parts_dir = f"{path}.parts"
+    throttle = io_budget.consume if io_budget else None
+
+    started = time.time()
+    conn = _connect(database, replica=True)()
+    try:
+        _start_snapshots([conn])
+        keys = capture_keys(conn)
+        os.makedirs(parts_dir, exist_ok=True)
+        parts = []
+        tables = {}
+
+        # Tables dropped since the previous backup
+        dropped = sorted(set(previous_keys['tables']) - set(keys['tables']))
+        if dropped:
+            part = os.path.join(parts_dir, '_dropped.sql.gz')
+            with gzip.open(part, 'wt', encoding='utf-8', newline='\n') as f:
+                for table in dropped:
+                    f.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+            parts.append(part)
+
+        for table, info in keys['tables'].items():
+            part = os.path.join(parts_dir, f"{table}.sql.gz")
+            before = previous_keys['tables'].get(table)
+            incremental = (info['pk'] and before and before['schema'] == info['schema']
+                           and before.get('keys') is not None)
+            deleted = _ranges_difference(before['keys'], info['keys']) if incremental else []
+
+            # Mass deletes are cheaper to restore as a copy of the table
+            if incremental and len(deleted) > max(TOMBSTONE_BATCH, _count(info['keys'])):
+                incremental = False
+
+            if incremental:
+                tombstones = [
+                    f"DELETE FROM `{table}` WHERE `{info['pk']}` IN ("
+                    + ', '.join(str(pk) for pk in deleted[i:i + TOMBSTONE_BATCH]) + ")"
+                    for i in range(0, len(deleted), TOMBSTONE_BATCH)
+                ]
+                rows = _dump_table(conn, table, part, throttle, where="`updated_at` >= %s", params=(since,),
+                                   verb='REPLACE', include_schema=False, preamble=tombstones)
+                tables[table] = {'mode': 'changes', 'rows': rows, 'deleted': len(deleted)}
+            else:
+                rows = _dump_table(conn, table, part, throttle)
+                tables[table] = {'mode': 'copy', 'rows': rows}
+            parts.append(part)
+
+        write_dump(path, database, parts, kind='MySQL Incremental Backup')
+    finally:
+        try:
+            conn.rollback()
+            conn.close()
+        except Exception:
+            pass
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    keys_file = filename.replace('.sql.gz', '.keys.json.gz')
+    write_keys(os.path.join(manifest_store.directory, keys_file), keys)
+
+    entry = {
+        'file': filename,
+        'type': 'incremental',
+        'base': chain[0]['file'],
+        'previous': previous['file'],
+        'created_at': created_at.isoformat(timespec='seconds'),
+        'size': os.path.getsize(path),
+        'sha256': sha256_file(path),
+        'since': since.isoformat(),
+        'watermark': keys['taken_at'],
+        'keys_file': keys_file,
+        'tables': tables,
+        'seconds': round(time.time() - started, 2),
+    }
+    manifest_store.add(entry)
+    return entry
+
+
+def restore_chain(database, upto=None, target=None, parallelism=None):
+    """
+    Restore the latest full backup of `database` (or the chain ending at
+    `upto`) and replay its increments in order into `target` (default: the
+    same database, which must exist). Checksums are verified before anything
+    is touched.
+    """
+    manifest_store = BackupManifest(database)
+    chain = current_chain(manifest_store.load()['backups'], upto)
+    if not chain:
+        raise RestoreError(f"No full backup of {database} to restore", {'restored': []})
+
+    for backup in chain:
+        path = os.path.join(manifest_store.directory, backup['file'])
+        if not os.path.exists(path) or sha256_file(path) != backup['sha256']:
+            raise RestoreError(f"{backup['file']} is missing or fails its checksum; nothing was restored",
+                               {'restored': []})
+
+    target = target or database
+    restored = []
+    for backup in chain:
+        print(f"▶ Restoring {backup['file']} into {target}")
+        try:
+            restore_database(_connect(target), os.path.join(manifest_store.directory, backup['file']),
+                             parallelism=parallelism)
+        except RestoreError as e:
+            e.report['restored'] = restored
+            raise
+        restored.append(backup['file'])
+    print(f"✓ {target} restored from {len(restored)} backup files")
+    return restored
+
+
+def select_retained(backups, retention=None):
+    """
+    Names of full backups to keep: the newest one of each of the last N days,
+    ISO weeks and months (grandfather-father-son)
+    """
+    retention = retention or RETENTION
+    keep = set()
+    fulls = sorted((b for b in backups if b['type'] == 'full'),
+                   key=lambda b: b['created_at'], reverse=True)
+
+    periods = {
+        'daily': lambda d: d.date(),
+        'weekly': lambda d: tuple(d.isocalendar()[:2]),
+        'monthly': lambda d: (d.year, d.month),
+    }
+    for tier, period_of in periods.items():
+        seen = []
+        for backup in fulls:
+            period = period_of(datetime.fromisoformat(backup['created_at']))
+            if period in seen:
+                continue
+            if len(seen) >= retention[tier]:
+                break
+            seen.append(period)
+            keep.add(backup['file'])
+
+    # Never delete the newest backup
+    if fulls:
+        keep.add(fulls[0]['file'])
+    return keep
+
+
+def apply_retention(database, dry_run=False):
+    """Delete backups outside the retention tiers; returns deleted file names"""
+    manifest_store = BackupManifest(database)
+    manifest = manifest_store.load()
+    keep = select_retained(manifest['backups'])
+
+    # Increments belong to their base full backup and share its fate
+    kept, deleted = [], []
+    for backup in manifest['backups']:
+        owner = backup.get('base', backup['file'])
+        if owner in keep:
+            kept.append(backup)
+        else:
+            deleted.append(backup)
+
+    if not dry_run and deleted:
+        for backup in deleted:
+            for name in (backup['file'], backup.get('keys_file')):
+                path = os.path.join(manifest_store.directory, name) if name else None
+                if path and os.path.exists(path):
+                    os.remove(path)
+        manifest['backups'] = kept
+        manifest_store.save(manifest)
+    return [b['file'] for b in deleted]
+
+
+def _acquire_run_lock():
+    """Cross-process guard so only one orchestrator runs (e.g. several app workers)"""
+    os.makedirs(FLEET_BACKUP_DIR, exist_ok=True)
+    lock_path = os.path.join(FLEET_BACKUP_DIR, LOCK_NAME)
+    # A lock older than a day belongs to a crashed run
+    if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > 86400:
+        os.remove(lock_path)
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return lock_path
+
+
+def run_fleet_backup(databases=None, concurrency=None, max_connections=None, max_mbps=None, retention=True,
+                     mode='full'):
+    """
+    Back up all (or the given) databases concurrently; returns the run summary.
+    mode: 'full', 'incremental', or 'auto' (full on FLEET_BACKUP_FULL_DAY, increments otherwise)
+    """
+    if mode == 'auto':
+        full_day = os.environ.get('FLEET_BACKUP_FULL_DAY', 'sun').lower()[:3]
+        mode = 'full' if datetime.now().strftime('%a').lower() == full_day else 'incremental'
+
+    lock_path = _acquire_run_lock()
+    if lock_path is None:
+        print("⚠️  Fleet backup already running; skipped")
+        return None
+
+    try:
+        databases = databases or list_databases()
+        concurrency = max(1, min(concurrency or FLEET_BACKUP_CONCURRENCY, len(databases) or 1))
+        max_connections = max_connections or FLEET_BACKUP_MAX_CONNECTIONS
+        # Every running dump gets an equal share of the connection budget
+        parallelism = max(1, max_connections // concurrency)
+        io_budget = IOBudget(FLEET_BACKUP_MAX_MBPS if max_mbps is None else max_mbps)
+
+        started = time.time()
+        summary = {'started_at': datetime.now().isoformat(timespec='seconds'), 'mode': mode,
+                   'databases': {}, 'failed': []}
+        print(f"▶ Fleet {mode} backup: {len(databases)} databases, {concurrency} at a time, "
+              f"{parallelism} connections each")
+
+        def backup_one(database):
+            try:
+                if mode == 'incremental':
+                    entry = incremental_backup(database, io_budget)
+                else:
+                    entry = backup_database(database, parallelism, io_budget)
+                deleted = apply_retention(database) if retention else []
+                print(f"   ✓ {database}: {entry['size'] / 1024 / 1024:.1f} MB in {entry['seconds']}s"
+                      + (f", {len(deleted)} old backups removed" if deleted else ''))
+                return database, {'file': entry['file'], 'type': entry['type'], 'size': entry['size'],
+                                  'sha256': entry['sha256'], 'deleted': deleted}
+            except Exception as e:
+                print(f"   ✗ {database}: {e}")
+                return database, {'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for database, outcome in pool.map(backup_one, databases):
+                summary['databases'][database] = outcome
+                if 'error' in outcome:
+                    summary['failed'].append(database)
+
+        summary['seconds'] = round(time.time() - started, 2)
+        with open(os.path.join(FLEET_BACKUP_DIR, 'last_run.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"✓ Fleet backup finished in {summary['seconds']}s "
+              f"({len(databases) - len(summary['failed'])} ok, {len(summary['failed'])} failed)")
+        return summary
+    finally:
+        os.remove(lock_path)
+
+
+def schedule(scheduler):
+    """Register the nightly fleet backup on an APScheduler instance"""
+    from apscheduler.triggers.cron import CronTrigger
+
+    hour = int(os.environ.get('FLEET_BACKUP_HOUR', 2))
+    scheduler.add_job(
+        run_fleet_backup,
+        CronTrigger(hour=hour, minute=0),
+        kwargs={'mode': 'auto'},
+        id='fleet_backup',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    print(f"✓ Fleet backup scheduled daily at {hour:02d}:00")
+
+
+def print_manifests(databases):
+    for database in databases:
+        manifest = BackupManifest(database).load()
+        print(f"\n{database}")
+        for backup in manifest['backups']:
+            print(f"   {backup['created_at']}  {backup['type']:11s} {backup['size'] / 1024 / 1024:9.2f} MB  "
+                  f"{backup['sha256'][:12]}  {backup['file']}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Back up every tenant database with tiered retention')
+    parser.add_argument('--mode', choices=['full', 'incremental', 'auto'], default='full',
+                        help='Full dumps, increments on top of the latest full, or full on FLEET_BACKUP_FULL_DAY')
+    parser.add_argument('--only', nargs='*', help='Restrict to these database names')
+    parser.add_argument('--concurrency', type=int, help='Databases dumped at the same time')
+    parser.add_argument('--max-connections', type=int, help='MySQL connections used by the whole run')
+    parser.add_argument('--max-mbps', type=float, help='Write budget for the whole run (MB/s, 0 = unlimited)')
+    parser.add_argument('--no-retention', action='store_true', help='Do not delete old backups')
+    parser.add_argument('--list', action='store_true', help='Show manifests instead of backing up')
+    parser.add_argument('--restore', metavar='DATABASE', help='Restore the latest full backup plus increments')
+    parser.add_argument('--upto', metavar='FILE', help='With --restore: stop at this backup file')
+    parser.add_argument('--target', metavar='DATABASE', help='With --restore: restore into another database')
+    args = parser.parse_args()
+
+    if args.restore:
+        try:
+            restore_chain(args.restore, args.upto, args.target)
+        except RestoreError as e:
+            print(f"✗ {e}")
+            print(json.dumps(e.report, indent=2, default=str))
+            sys.exit(1)
+        return
+
+    if args.list:
+        databases = args.only or sorted(d for d in os.listdir(FLEET_BACKUP_DIR)
+                                        if os.path.isdir(os.path.join(FLEET_BACKUP_DIR, d)))
+        print_manifests(databases)
+        return
+
+    summary = run_fleet_backup(args.only, args.concurrency, args.max_connections, args.max_mbps,
+                               retention=not args.no_retention, mode=args.mode)
+    if summary is None or summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
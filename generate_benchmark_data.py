@@ -0,0 +1,286 @@
+"""
+Synthetic Multi-Tenant Dataset Generator
+Provisions N benchmark tenants through TenantDatabaseManager and fills each
+with realistic vehicles, employees, fuel records, services, job cards and
+assignments at a configurable scale.
+
+Usage:
+    python generate_benchmark_data.py --tenants 5 --vehicles 50 --years 3
+    python generate_benchmark_data.py --tenants 5 --drop      # remove them again
+"""
+
+import sys
+sys.path.append('.')
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+
+from tenant_manager import TenantDatabaseManager, init_main_database
+from models_tenant import Company, TenantUser
+
+DEFAULT_PREFIX = 'bench'
+BENCHMARK_PASSWORD = 'benchmark123'
+BATCH_SIZE = 1000
+
+MAKES = {
+    'Toyota': ['Hilux', 'Land Cruiser', 'Corolla', 'Hiace', 'Fortuner'],
+    'Nissan': ['Navara', 'NP200', 'Patrol', 'Almera'],
+    'Ford': ['Ranger', 'Everest', 'Transit'],
+    'Isuzu': ['D-Max', 'NPR', 'FVZ'],
+    'Mercedes-Benz': ['Actros', 'Sprinter'],
+    'Volkswagen': ['Amarok', 'Polo', 'Crafter'],
+}
+VEHICLE_TYPES = ['sedan', 'pickup', 'suv', 'van', 'truck']
+COLORS = ['White', 'Silver', 'Black', 'Blue', 'Red', 'Grey']
+DEPARTMENTS = ['Operations', 'Logistics', 'Sales', 'Maintenance', 'Finance', 'Administration']
+POSITIONS = ['Driver', 'Technician', 'Supervisor', 'Coordinator', 'Officer']
+STATIONS = ['Total Samora', 'Zuva Borrowdale', 'Puma Avondale', 'Engen Msasa', 'Sakunda Belvedere', 'Redan Eastlea']
+FUEL_TYPES = ['Diesel', 'Petrol']
+SERVICE_TYPES = ['Oil Change', 'Minor Service', 'Major Service', 'Brake Service', 'Tyre Replacement', 'Battery Replacement']
+PROVIDERS = ['City Motors', 'Fleet Care', 'AutoWorld', 'Dealer Workshop']
+ISSUES = ['Engine overheating', 'Brake noise', 'Warning light on dashboard', 'Gearbox slipping',
+          'Suspension knock', 'Aircon not cooling', 'Hard starting in the morning']
+
+
+def subdomain_for(prefix, index):
+    return f"{prefix}{index:03d}"
+
+
+def insert_batches(cursor, conn, sql, rows):
+    """executemany in fixed-size chunks, committing after each chunk"""
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+        conn.commit()
+    return len(rows)
+
+
+def provision_tenant(subdomain, name):
+    """Create (or reuse) the company row and its tenant database"""
+    with TenantDatabaseManager.main_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM companies WHERE subdomain = %s", (subdomain,))
+            company = cursor.fetchone()
+            if not company:
+                company_id = Company.create(cursor, name=name, subdomain=subdomain,
+                                            email=f"admin@{subdomain}.example.com", plan='enterprise')
+                cursor.execute('''
+                    UPDATE companies SET status = %s, max_users = 100000, max_vehicles = 100000
+                    WHERE id = %s
+                ''', (Company.STATUS_ACTIVE, company_id))
+                conn.commit()
+                company = Company.get_by_id(cursor, company_id)
+
+    if not TenantDatabaseManager.create_tenant_database(company['database_name']):
+        raise Exception(f"Failed to create tenant database {company['database_name']}")
+    return company
+
+
+def populate_tenant(company, args, rng, password_hash):
+    """Fill one tenant database; returns a dict of row counts"""
+    counts = {}
+    subdomain = company['subdomain']
+    now = datetime.now().replace(microsecond=0)
+    history_start = now - timedelta(days=365 * args.years)
+
+    with TenantDatabaseManager.tenant_db(company['database_name']) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS total FROM vehicles")
+            if cursor.fetchone()['total'] and not args.append:
+                print(f"   ↷ {subdomain} already has data (use --append to add more)")
+                return None
+
+            # Employees (admin first so it gets a predictable username)
+            employees = [(f"{subdomain.upper()}-A001", f"admin_{subdomain}", f"admin@{subdomain}.example.com",
+                          password_hash, 'Administration', 'Fleet Manager', 'admin', 'active', None)]
+            for i in range(1, args.employees):
+                employees.append((
+                    f"{subdomain.upper()}-{i:05d}", f"emp{i:05d}_{subdomain}", f"emp{i:05d}@{subdomain}.example.com",
+                    password_hash, rng.choice(DEPARTMENTS), rng.choice(POSITIONS), 'employee',
+                    'active' if rng.random() > 0.05 else 'inactive', f"+2637{rng.randint(10000000, 99999999)}"
+                ))
+            counts['employees'] = insert_batches(cursor, conn, '''
+                INSERT INTO employees (employee_id, username, email, password_hash, department, position, role, status, phone)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', employees)
+            cursor.execute("SELECT id FROM employees ORDER BY id")
+            employee_ids = [row['id'] for row in cursor.fetchall()]
+            admin_id = employee_ids[0]
+
+            # Vehicles
+            vehicles = []
+            for i in range(args.vehicles):
+                make = rng.choice(list(MAKES))
+                vehicles.append((
+                    f"{subdomain[:3].upper()}{i:05d}", make, rng.choice(MAKES[make]), rng.randint(now.year - 12, now.year),
+                    rng.choice(COLORS), rng.choice(VEHICLE_TYPES), rng.choice(['available', 'available', 'assigned', 'maintenance']),
+                    rng.randint(5000, 250000), round(rng.uniform(6, 16), 2), admin_id
+                ))
+            counts['vehicles'] = insert_batches(cursor, conn, '''
+                INSERT INTO vehicles (vehicle_number, make, model, year, color, vehicle_type, status, mileage,
+                                      expected_fuel_consumption, added_by)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', vehicles)
+            cursor.execute("SELECT id, mileage, expected_fuel_consumption FROM vehicles ORDER BY id")
+            vehicle_rows = cursor.fetchall()
+
+            fuel_records, services, assignments, job_cards = [], [], [], []
+            months = args.years * 12
+            job_card_seq = 0
+
+            for vehicle in vehicle_rows:
+                odometer = max(1000, (vehicle['mileage'] or 50000) - rng.randint(20000, 60000))
+                km_per_liter = float(vehicle['expected_fuel_consumption'] or 10)
+
+                # Fuel records spread over the whole history, odometer strictly increasing
+                fills = months * args.fuel_per_month
+                step = (now - history_start) / max(fills, 1)
+                for n in range(fills):
+                    fuel_date = history_start + step * n + timedelta(minutes=rng.randint(0, 600))
+                    liters = round(rng.uniform(25, 80), 2)
+                    odometer += int(liters * km_per_liter * rng.uniform(0.8, 1.15))
+                    fuel_records.append((
+                        vehicle['id'], rng.choice(employee_ids), fuel_date, liters,
+                        round(liters * rng.uniform(1.35, 1.75), 2), odometer,
+                        rng.choice(FUEL_TYPES), rng.choice(STATIONS)
+                    ))
+
+                # Services roughly every (12 / services_per_year) months
+                interval_days = int(365 / max(args.services_per_year, 1))
+                service_date = history_start + timedelta(days=rng.randint(0, interval_days))
+                service_odometer = odometer - 40000
+                while service_date < now:
+                    service_odometer += rng.randint(5000, 12000)
+                    services.append((
+                        vehicle['id'], rng.choice(SERVICE_TYPES), service_date.date(), rng.choice(PROVIDERS),
+                        round(rng.uniform(80, 1500), 2), service_odometer,
+                        (service_date + timedelta(days=interval_days)).date(), service_odometer + 10000,
+                        'completed', rng.choice(employee_ids)
+                    ))
+                    service_date += timedelta(days=interval_days + rng.randint(-10, 10))
+
+                # Job cards
+                for _ in range(args.years * args.job_cards_per_year):
+                    job_card_seq += 1
+                    date_in = history_start + timedelta(days=rng.randint(0, 365 * args.years - 1))
+                    closed = date_in < now - timedelta(days=14)
+                    labor, parts = round(rng.uniform(50, 600), 2), round(rng.uniform(0, 1200), 2)
+                    job_cards.append((
+                        f"JC-{subdomain.upper()}-{job_card_seq:06d}", vehicle['id'], date_in,
+                        date_in + timedelta(days=rng.randint(1, 5)), date_in + timedelta(days=rng.randint(1, 7)) if closed else None,
+                        rng.choice(ISSUES), rng.choice(employee_ids), 'completed' if closed else rng.choice(['open', 'in_progress']),
+                        rng.choice(['low', 'normal', 'normal', 'high']), labor + parts, labor, parts, admin_id
+                    ))
+
+                # Assignments: back-to-back trips, the last one may still be active
+                assign_date = history_start
+                assign_mileage = odometer - 30000
+                for n in range(months * args.assignments_per_month):
+                    assign_date += timedelta(days=rng.uniform(1, 30 / max(args.assignments_per_month, 1)))
+                    if assign_date >= now:
+                        break
+                    distance = rng.randint(20, 900)
+                    is_last = n == months * args.assignments_per_month - 1
+                    assignments.append((
+                        vehicle['id'], rng.choice(employee_ids), admin_id, assign_date,
+                        None if is_last else assign_date + timedelta(hours=rng.randint(2, 72)),
+                        'active' if is_last else 'returned', assign_mileage,
+                        None if is_last else assign_mileage + distance, 'Field trip'
+                    ))
+                    assign_mileage += distance
+
+            counts['fuel_records'] = insert_batches(cursor, conn, '''
+                INSERT INTO fuel_records (vehicle_id, employee_id, fuel_date, fuel_amount, fuel_cost,
+                                          odometer_reading, fuel_type, station_name)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ''', fuel_records)
+            counts['service_maintenance'] = insert_batches(cursor, conn, '''
+                INSERT INTO service_maintenance (vehicle_id, service_type, service_date, service_provider, cost,
+                                                 odometer_reading, next_service_date, next_service_mileage,
+                                                 status, performed_by)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', services)
+            counts['job_cards'] = insert_batches(cursor, conn, '''
+                INSERT INTO job_cards (job_card_number, vehicle_id, date_in, expected_completion, date_out,
+                                       reported_issues, assigned_technician, status, priority,
+                                       total_cost, labor_cost, parts_cost, created_by)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', job_cards)
+            counts['vehicle_assignments'] = insert_batches(cursor, conn, '''
+                INSERT INTO vehicle_assignments (vehicle_id, employee_id, assigned_by, assignment_date, return_date,
+                                                 status, mileage_at_assignment, mileage_at_return, purpose)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', assignments)
+
+    # Link the admin to the tenant like tenant_signup does
+    with TenantDatabaseManager.main_db() as conn:
+        with conn.cursor() as cursor:
+            TenantUser.add_user_to_tenant(cursor, company['id'], admin_id, 'employee',
+                                          role='administrator', is_owner=True)
+
+    return counts
+
+
+def drop_tenants(prefix, count):
+    """Remove benchmark tenants and their databases"""
+    for index in range(1, count + 1):
+        subdomain = subdomain_for(prefix, index)
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id, database_name FROM companies WHERE subdomain = %s", (subdomain,))
+                company = cursor.fetchone()
+                if not company:
+                    continue
+                cursor.execute("DELETE FROM companies WHERE id = %s", (company['id'],))
+        TenantDatabaseManager.drop_tenant_database(company['database_name'])
+        print(f"   ✓ Dropped {subdomain} ({company['database_name']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic benchmark tenants')
+    parser.add_argument('--tenants', type=int, default=3, help='Number of tenants to provision')
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='Subdomain prefix (bench001, bench002, ...)')
+    parser.add_argument('--vehicles', type=int, default=50, help='Vehicles per tenant')
+    parser.add_argument('--employees', type=int, default=40, help='Employees per tenant (including admin)')
+    parser.add_argument('--years', type=int, default=3, help='Years of history')
+    parser.add_argument('--fuel-per-month', type=int, default=6, help='Fuel fills per vehicle per month')
+    parser.add_argument('--services-per-year', type=int, default=4, help='Service records per vehicle per year')
+    parser.add_argument('--job-cards-per-year', type=int, default=2, help='Job cards per vehicle per year')
+    parser.add_argument('--assignments-per-month', type=int, default=4, help='Assignments per vehicle per month')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed -> same data)')
+    parser.add_argument('--append', action='store_true', help='Add data even if the tenant already has vehicles')
+    parser.add_argument('--drop', action='store_true', help='Drop the benchmark tenants instead of creating them')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Fleet Manager - Benchmark Data Generator")
+    print("=" * 60)
+
+    if args.drop:
+        drop_tenants(args.prefix, args.tenants)
+        return
+
+    init_main_database()
+    # Hash once: the same credentials are used for every generated employee
+    password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+
+    for index in range(1, args.tenants + 1):
+        subdomain = subdomain_for(args.prefix, index)
+        started = time.time()
+        print(f"\n{index}/{args.tenants} Provisioning {subdomain}...")
+
+        company = provision_tenant(subdomain, f"Benchmark Fleet {index:03d}")
+        counts = populate_tenant(company, args, random.Random(args.seed + index), password_hash)
+
+        if counts:
+            summary = ', '.join(f"{table}={count}" for table, count in counts.items())
+            print(f"   ✓ {subdomain}: {summary} ({time.time() - started:.1f}s)")
+
+    print()
+    print(f"Login with admin_<subdomain> / {BENCHMARK_PASSWORD}, e.g. admin_{subdomain_for(args.prefix, 1)}")
+
+
+if __name__ == '__main__':
+    main()
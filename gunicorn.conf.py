@@ -0,0 +1,21 @@
+"""
+Gunicorn Hooks
+Loaded automatically by `gunicorn app:app` from this directory (or with -c gunicorn.conf.py).
+
+Each web worker gets a stable slot, and right after it is forked (still
+single-threaded) it starts its share of the host-wide password hashing
+budget (PASSWORD_HASH_WORKERS), so the hashing processes of all web workers
+together never exceed it.
+"""
+
+
+def pre_fork(server, worker):
+    """Master: give the new worker the lowest slot no live worker holds"""
+    used = {getattr(live, 'hash_slot', None) for live in server.WORKERS.values()}
+    worker.hash_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    """Worker: start its password hashing pool before any thread exists"""
+    from password_hasher import password_hasher, worker_share
+    password_hasher.start(worker_share(worker.hash_slot, server.num_workers))
@@ -0,0 +1,182 @@
+"""
+Lazy Imports
+Defers heavy report dependencies (pandas, reportlab) until first use so
+web workers start quickly, logs what each deferred import cost,
+and can preload everything in a pre-fork master so workers share the pages.
+
+Usage:
+    from lazy_imports import lazy_module
+    pd = lazy_module('pandas')          # nothing imported yet
+    df = pd.DataFrame(rows)             # pandas imported here, once
+
+    python lazy_imports.py              # import-time report for app startup
+    python lazy_imports.py --budget-ms 1500
+"""
+
+import importlib
+import threading
+import time
+import sys
+import os
+
+# Heavy modules the app defers; preload() imports all of them
+HEAVY_MODULES = [
+    'pandas',
+    'reportlab.lib.colors',
+    'reportlab.lib.pagesizes',
+    'reportlab.lib.units',
+    'reportlab.lib.styles',
+    'reportlab.lib.enums',
+    'reportlab.platypus',
+]
+
+# Default startup budget for `import app` (milliseconds)
+DEFAULT_STARTUP_BUDGET_MS = 2000
+
+_lock = threading.RLock()
+# module name -> {'seconds': float, 'loaded_at': float, 'trigger': 'first use' | 'preload'}
+_load_times = {}
+
+
+def load(name, trigger='first use'):
+    """Import a module (once) and record how long it took"""
+    module = sys.modules.get(name)
+    if module is not None and name in _load_times:
+        return module
+
+    with _lock:
+        already_loaded = name in sys.modules
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        if name not in _load_times:
+            _load_times[name] = {
+                'seconds': 0.0 if already_loaded else time.perf_counter() - start,
+                'loaded_at': time.time(),
+                'trigger': trigger,
+            }
+            if not already_loaded and trigger == 'first use':
+                print(f"✓ Lazy import: {name} loaded in {_load_times[name]['seconds'] * 1000:.0f} ms")
+    return module
+
+
+class LazyModule:
+    """Module stand-in that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = load(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    """Return a LazyModule proxy for `name` (the real module if it is already imported)"""
+    if name in _load_times:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def preload(modules=None):
+    """
+    Import heavy modules now (pre-fork master), so forked workers inherit them.
+    Enabled from app.py with PRELOAD_HEAVY_MODULES=true; missing packages are reported, not raised.
+    """
+    start = time.perf_counter()
+    for name in modules or HEAVY_MODULES:
+        try:
+            load(name, trigger='preload')
+        except ImportError as e:
+            print(f"⚠️  Preload skipped {name}: {e}")
+    print(f"✓ Preloaded heavy modules in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def preload_enabled():
+    return os.environ.get('PRELOAD_HEAVY_MODULES', 'false').lower() == 'true'
+
+
+def measure_startup(target='app', top=15):
+    """
+    Import `target` in a fresh interpreter with -X importtime and return
+    (total_ms, [(cumulative_ms, module), ...] slowest first, set of imported modules)
+    """
+    import subprocess
+
+    env = dict(os.environ)
+    env.setdefault('PRELOAD_HEAVY_MODULES', 'false')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, env=env
+    )
+
+    entries = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        try:
+            _, cumulative_us, name = line.split('|', 2)
+            cumulative_us = int(cumulative_us.strip())
+        except ValueError:
+            continue
+        # Nested imports are indented under their parent; top-level ones add up to the total
+        name = name[1:]
+        if not name.startswith(' '):
+            total_us += cumulative_us
+        entries.append((cumulative_us / 1000.0, name.strip()))
+
+    if result.returncode != 0:
+        tail = '\n'.join(result.stderr.splitlines()[-5:])
+        raise RuntimeError(f"import {target} failed:\n{tail}")
+
+    imported = {name for _, name in entries}
+    entries.sort(key=lambda e: e[0], reverse=True)
+    return total_us / 1000.0, entries[:top], imported
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import-time report for app startup')
+    parser.add_argument('--target', default='app', help='Module to import (default: app)')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('STARTUP_BUDGET_MS', DEFAULT_STARTUP_BUDGET_MS)),
+                        help='Fail (exit 1) if importing the target takes longer than this')
+    args = parser.parse_args()
+
+    total_ms, slowest, imported = measure_startup(args.target, args.top)
+    print(f"Import time for '{args.target}': {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for cumulative_ms, name in slowest:
+        print(f"   {cumulative_ms:9.1f} ms  {name}")
+
+    eager = [name for name in HEAVY_MODULES if name in imported]
+    if eager:
+        print(f"⚠️  Heavy modules imported at startup: {', '.join(eager)}")
+
+    if total_ms > args.budget_ms:
+        print("✗ Startup budget exceeded")
+        sys.exit(1)
+    print("✓ Within startup budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""
+Multi-Tenant Load Test
+Simulates many tenants and concurrent users against a locally running app:
+subdomain hosts, logins, dashboard loads and report pulls. Each step raises
+the number of tenants (e.g. 1 -> 500) and reports throughput, latency
+percentiles and MySQL connection usage, so tenant-resolution and login
+scaling can be compared before/after a change.
+
+The app must be running (python app.py) and the tenants must exist; pass
+--provision to create missing bench tenants with a small dataset first.
+
+Usage:
+    python load_test.py --target http://127.0.0.1:5000 --steps 1,10,50,100,500 --users 20 --duration 30 --provision
+"""
+
+import sys
+sys.path.append('.')
+
+import argparse
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from generate_benchmark_data import DEFAULT_PREFIX, BENCHMARK_PASSWORD, subdomain_for
+from benchmark_endpoints import percentile, _git_commit
+
+MAIN_DOMAIN = 'fleetmanager.local'
+LOGIN_PATH = '/employee/login'
+
+# (action, method, path, weight) - one virtual user picks actions by weight after logging in
+SCENARIO = [
+    ('resolve_tenant', 'GET', '/employee/dashboard?anonymous=1', 1),
+    ('dashboard', 'GET', '/employee/dashboard', 4),
+    ('analytics_stats', 'GET', '/analytics/api/dashboard-stats', 3),
+    ('fuel_records', 'GET', '/fuel-records', 2),
+    ('fuel_reports', 'GET', '/fuel-reports?report_type=monthly', 2),
+    ('service_notifications', 'GET', '/service-notifications', 1),
+]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Measure the response we got, not the page a redirect points to"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser(threading.Thread):
+    """A user looping over the scenario until the deadline, switching tenant on each new session"""
+
+    def __init__(self, target, subdomains, deadline, results, think_time, relogin_every, abort):
+        super().__init__(daemon=True)
+        # Set by any user whose login fails; every user then stops
+        self.abort = abort
+        self.target = target.rstrip('/')
+        self.subdomains = subdomains
+        self.deadline = deadline
+        self.results = results
+        self.think_time = think_time
+        self.relogin_every = relogin_every
+        self.port = urllib.parse.urlparse(self.target).port
+        self.rng = random.Random(id(self))
+        self._new_session()
+
+    def _new_session(self):
+        # Every new session may land on a different tenant, so all tenants get traffic
+        self.subdomain = self.rng.choice(self.subdomains)
+        self.host = f"{self.subdomain}.{MAIN_DOMAIN}" + (f":{self.port}" if self.port else '')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect())
+
+    def request(self, action, method, path, data=None, anonymous=False):
+        url = self.target + path
+        body = urllib.parse.urlencode(data).encode() if data else None
+        req = urllib.request.Request(url, data=body, method=method, headers={'Host': self.host})
+        opener = urllib.request.build_opener(_NoRedirect()) if anonymous else self.opener
+
+        start = time.perf_counter()
+        location = None
+        try:
+            with opener.open(req, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            # Redirects arrive here too (_NoRedirect)
+            status = e.code
+            location = e.headers.get('Location')
+        except Exception:
+            status = 0
+        elapsed = (time.perf_counter() - start) * 1000
+
+        # A session that lost its login only gets fast redirects to the login page
+        to_login = location is not None and urllib.parse.urlparse(location).path == LOGIN_PATH
+        error = status == 0 or status >= 500 or (to_login and not anonymous)
+        self.results.append((action, elapsed, status, error))
+        return status, location
+
+    def login(self):
+        """True if the login redirected somewhere other than back to the login page"""
+        status, location = self.request('login', 'POST', LOGIN_PATH, {
+            'username': f"admin_{self.subdomain}",
+            'password': BENCHMARK_PASSWORD,
+        })
+        if status in (301, 302, 303) and location and urllib.parse.urlparse(location).path != LOGIN_PATH:
+            return True
+        if not self.abort.is_set():
+            self.abort.reason = f"login as admin_{self.subdomain} failed (status {status}, location {location})"
+            self.abort.set()
+        return False
+
+    def run(self):
+        actions = [(a, m, p) for a, m, p, w in SCENARIO for _ in range(w)]
+        iteration = 0
+        if not self.login():
+            return
+        while time.time() < self.deadline and not self.abort.is_set():
+            iteration += 1
+            if self.relogin_every and iteration % self.relogin_every == 0:
+                self._new_session()
+                if not self.login():
+                    return
+            action, method, path = self.rng.choice(actions)
+            self.request(action, method, path, anonymous=path.endswith('anonymous=1'))
+            if self.think_time:
+                time.sleep(self.rng.uniform(0, self.think_time))
+
+
+class ConnectionSampler(threading.Thread):
+    """Samples MySQL Threads_connected while a step runs"""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def status(conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW GLOBAL STATUS LIKE %s", (name,))
+            row = cursor.fetchone()
+            return int(row['Value']) if row else 0
+
+    def run(self):
+        from tenant_manager import TenantDatabaseManager
+        conn = TenantDatabaseManager.get_main_connection()
+        try:
+            while not self._stop_event.is_set():
+                self.samples.append(self.status(conn, 'Threads_connected'))
+                self._stop_event.wait(self.interval)
+        finally:
+            conn.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def total_connections():
+    """MySQL 'Connections' counter (connection attempts since server start)"""
+    from tenant_manager import TenantDatabaseManager
+    conn = TenantDatabaseManager.get_main_connection()
+    try:
+        return ConnectionSampler.status(conn, 'Connections')
+    finally:
+        conn.close()
+
+
+def ensure_tenants(prefix, count):
+    """Create missing bench tenants with a small dataset"""
+    from generate_benchmark_data import provision_tenant, populate_tenant
+    from tenant_manager import TenantDatabaseManager
+    from werkzeug.security import generate_password_hash
+
+    with TenantDatabaseManager.main_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT subdomain FROM companies WHERE subdomain LIKE %s", (prefix + '%',))
+            existing = {row['subdomain'] for row in cursor.fetchall()}
+
+    small = argparse.Namespace(vehicles=5, employees=3, years=1, fuel_per_month=2, services_per_year=2,
+                               job_cards_per_year=1, assignments_per_month=1, append=False)
+    password_hash = None
+    for index in range(1, count + 1):
+        subdomain = subdomain_for(prefix, index)
+        if subdomain in existing:
+            continue
+        company = provision_tenant(subdomain, f"Benchmark Fleet {index:03d}")
+        if password_hash is None:
+            password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+        populate_tenant(company, small, random.Random(index), password_hash)
+
+
+def run_step(args, tenant_count):
+    results = []
+    deadline = time.time() + args.duration
+    subdomains = [subdomain_for(args.prefix, i) for i in range(1, tenant_count + 1)]
+
+    sampler = ConnectionSampler()
+    connections_before = total_connections()
+    sampler.start()
+
+    abort = threading.Event()
+    abort.reason = None
+    users = [VirtualUser(args.target, subdomains, deadline, results, args.think_time, args.relogin_every, abort)
+             for i in range(args.users)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    wall = time.perf_counter() - started
+
+    sampler.stop()
+    connections_opened = total_connections() - connections_before
+
+    by_action = {}
+    for action, elapsed, status, error in results:
+        by_action.setdefault(action, {'latencies': [], 'errors': 0})
+        by_action[action]['latencies'].append(elapsed)
+        if error:
+            by_action[action]['errors'] += 1
+
+    actions = {}
+    for action, data in sorted(by_action.items()):
+        latencies = data['latencies']
+        actions[action] = {
+            'requests': len(latencies),
+            'errors': data['errors'],
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+        }
+
+    return {
+        'tenants': tenant_count,
+        'users': args.users,
+        'duration_s': round(wall, 2),
+        'requests': len(results),
+        'throughput_rps': round(len(results) / wall, 2) if wall else 0,
+        'errors': sum(a['errors'] for a in actions.values()),
+        'db_threads_connected_max': max(sampler.samples) if sampler.samples else None,
+        'db_threads_connected_avg': round(sum(sampler.samples) / len(sampler.samples), 1) if sampler.samples else None,
+        'db_connections_opened': connections_opened,
+        'db_connections_per_request': round(connections_opened / len(results), 2) if results else None,
+        'actions': actions,
+        'aborted': abort.reason,
+    }
+
+
+def print_step(step):
+    print(f"\n=== {step['tenants']} tenants / {step['users']} users: {step['requests']} requests, "
+          f"{step['throughput_rps']} req/s, {step['errors']} errors")
+    print(f"    MySQL threads connected max {step['db_threads_connected_max']} avg {step['db_threads_connected_avg']}, "
+          f"{step['db_connections_opened']} connections opened ({step['db_connections_per_request']}/request)")
+    for action, data in step['actions'].items():
+        print(f"    {action:22s} n={data['requests']:6d}  p50 {data['p50_ms']:8.1f}  p95 {data['p95_ms']:8.1f}  "
+              f"p99 {data['p99_ms']:8.1f} ms  errors {data['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-tenant load test against a running app')
+    parser.add_argument('--target', default='http://127.0.0.1:5000', help='Base URL of the running app')
+    parser.add_argument('--steps', default='1,10,50,100,500', help='Comma-separated tenant counts')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users per step')
+    parser.add_argument('--duration', type=int, default=30, help='Seconds per step')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between requests (s)')
+    parser.add_argument('--relogin-every', type=int, default=20, help='Start a new session every N requests (0 = never)')
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='Tenant subdomain prefix')
+    parser.add_argument('--provision', action='store_true', help='Create missing bench tenants before each step')
+    parser.add_argument('--output', help='Write all step results to this JSON file')
+    args = parser.parse_args()
+
+    steps = [int(s) for s in args.steps.split(',') if s.strip()]
+    report = {
+        'meta': {'created_at': datetime.now().isoformat(timespec='seconds'), 'git_commit': _git_commit(),
+                 'target': args.target, 'users': args.users, 'duration_s': args.duration},
+        'steps': [],
+    }
+
+    for tenant_count in steps:
+        if args.provision:
+            print(f"\nProvisioning up to {tenant_count} tenants...")
+            ensure_tenants(args.prefix, tenant_count)
+        step = run_step(args, tenant_count)
+        print_step(step)
+        report['steps'].append(step)
+        if step['aborted']:
+            # Figures of a step with failing logins only measure redirects to the login page
+            print(f"\n✗ Step aborted: {step['aborted']}")
+            break
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+    if report['steps'] and report['steps'][-1]['aborted']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
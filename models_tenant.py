@@ -35,6 +35,8 @@ class Company:
                 subdomain VARCHAR(100) UNIQUE NOT NULL,
                 custom_domain VARCHAR(255) UNIQUE NULL,
                 database_name VARCHAR(100) UNIQUE NOT NULL,
+                shard_id INT NULL,
+                write_fence_until DATETIME NULL,
                 
                 -- Contact Information
                 email VARCHAR(255) NOT NULL,
@@ -62,13 +64,19 @@ class Company:
                 
                 INDEX idx_subdomain (subdomain),
                 INDEX idx_custom_domain (custom_domain),
-                INDEX idx_status (status)
+                INDEX idx_status (status),
+                INDEX idx_shard (shard_id)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         ''')
         
     @staticmethod
-    def create(cursor, name, subdomain, email, phone=None, plan='trial'):
-        """Create a new company/tenant"""
+    def create(cursor, name, subdomain, email, phone=None, plan='trial', shard_id=None):
+        """Create a new company/tenant (shard_id: database server, see shard_manager)"""
+        if shard_id is None:
+            # Capacity-aware placement across the registered database shards
+            from shard_manager import shard_registry
+            shard_id = shard_registry.choose_shard()
+        
         # Generate database name from subdomain
         database_name = f"fleet_{subdomain.lower().replace('-', '_')}"
         
@@ -78,9 +86,9 @@ class Company:
         
         cursor.execute('''
             INSERT INTO companies 
-            (name, subdomain, database_name, email, phone, plan, status, trial_ends_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (name, subdomain, database_name, email, phone, plan, Company.STATUS_TRIAL, trial_ends_at))
+            (name, subdomain, database_name, shard_id, email, phone, plan, status, trial_ends_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ''', (name, subdomain, database_name, shard_id, email, phone, plan, Company.STATUS_TRIAL, trial_ends_at))
         
         return cursor.lastrowid
     
@@ -142,24 +150,28 @@ class Company:
             SELECT plan, max_users, max_vehicles, status, trial_ends_at, subscription_ends_at
             FROM companies WHERE id = %s
         ''', (company_id,))
-        company = cursor.fetchone()
-        
+        return Company.evaluate_limits(cursor.fetchone())
+    
+    @staticmethod
+    def evaluate_limits(company):
+        """Subscription check for a companies row (plan, max_users, max_vehicles, status, trial/subscription ends)"""
         if not company:
             return {'valid': False, 'message': 'Company not found'}
         
         # Check status
-        if company[3] not in [Company.STATUS_ACTIVE, Company.STATUS_TRIAL]:
+        if company['status'] not in [Company.STATUS_ACTIVE, Company.STATUS_TRIAL]:
             return {'valid': False, 'message': 'Subscription inactive or suspended'}
         
         # Check trial expiry
-        if company[3] == Company.STATUS_TRIAL and company[4] and company[4] < datetime.now():
+        if company['status'] == Company.STATUS_TRIAL and company['trial_ends_at'] and company['trial_ends_at'] < datetime.now():
             return {'valid': False, 'message': 'Trial period expired'}
         
         # Check subscription expiry
-        if company[3] == Company.STATUS_ACTIVE and company[5] and company[5] < datetime.now():
+        if company['status'] == Company.STATUS_ACTIVE and company['subscription_ends_at'] and company['subscription_ends_at'] < datetime.now():
             return {'valid': False, 'message': 'Subscription expired'}
         
-        return {'valid': True, 'plan': company[0], 'max_users': company[1], 'max_vehicles': company[2]}
+        return {'valid': True, 'plan': company['plan'],
+                'max_users': company['max_users'], 'max_vehicles': company['max_vehicles']}
 
 
 class TenantSettings:
@@ -0,0 +1,140 @@
+"""
+Password Hasher
+Offloads Werkzeug password hashing (scrypt by default, deliberately CPU-heavy)
+for bulk employee imports to a small bounded process pool, so a large import
+uses several cores. Single hashes (signups) are computed inline and never
+wait behind an import. Hashes are produced by generate_password_hash itself,
+so the stored format is unchanged.
+
+PASSWORD_HASH_WORKERS is a host-wide budget (default: half the cores). Each
+web worker starts its share from a post-fork hook (gunicorn.conf.py), while it
+is still single-threaded; forking later from a threaded worker can deadlock
+the child on a lock held by another thread, so the pool is never started on
+demand. Processes without a pool (no hook, no share left, pool broken) hash
+inline.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash
+import multiprocessing
+import threading
+import os
+
+
+def _lower_priority():
+    """Pool worker initializer: yield CPU to request handling (logins, page loads)"""
+    try:
+        os.nice(int(os.environ.get('PASSWORD_HASH_NICE', 10)))
+    except (AttributeError, OSError):
+        pass
+
+
+def _hash(password):
+    return generate_password_hash(password)
+
+
+def host_workers():
+    """Hashing processes allowed on this host (0 where fork is unavailable)"""
+    # Spawned workers would re-run app.py as __main__; only fork is safe here
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return 0
+    return int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+
+
+def worker_share(slot, web_workers, total=None):
+    """Hashing processes for web worker `slot` of `web_workers`, so together they stay within the host budget"""
+    total = host_workers() if total is None else total
+    if web_workers <= 0 or slot >= web_workers:
+        return 0
+    return total // web_workers + (1 if slot < total % web_workers else 0)
+
+
+class PasswordHasher:
+    """
+    Per-process pool for generate_password_hash, started explicitly by start()
+
+    Batches keep at most two pending hashes per pool process in flight, so a
+    large import never queues thousands of jobs.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self.workers = 0
+        self._in_flight = None
+
+    def start(self, workers):
+        """Fork `workers` pool processes now; call only while the process is single-threaded (post-fork hook)"""
+        if workers <= 0:
+            return
+        with self._lock:
+            if self._pool is not None:
+                return
+            pool = None
+            try:
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('fork'),
+                    initializer=_lower_priority
+                )
+                # With fork, the first submit launches every process; do it here, not in a request
+                pool.submit(os.getpid).result(timeout=30)
+            except Exception as e:
+                print(f"⚠️  Password hashing pool not started, hashing inline: {e}")
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                return
+            self._pool = pool
+            self._pool_pid = os.getpid()
+            self.workers = workers
+            self._in_flight = threading.BoundedSemaphore(workers * 2)
+            print(f"✓ Password hashing pool started ({workers} workers, pid {self._pool_pid})")
+
+    def _get_pool(self):
+        """The pool started by this process, or None (never forks lazily)"""
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                return self._pool
+            return None
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def hash(self, password):
+        """Hash one password inline (signups); it never queues behind an import"""
+        return generate_password_hash(password)
+
+    def hash_many(self, passwords):
+        """Hash a batch in parallel, preserving order, with bounded in-flight work"""
+        passwords = list(passwords)
+        pool = self._get_pool()
+        if pool is None or len(passwords) < 2:
+            return [generate_password_hash(password) for password in passwords]
+
+        in_flight = self._in_flight
+        futures = []
+        try:
+            for password in passwords:
+                # Back-pressure: wait for a slot before queueing the next hash
+                in_flight.acquire()
+                future = pool.submit(_hash, password)
+                future.add_done_callback(lambda f: in_flight.release())
+                futures.append(future)
+            return [future.result() for future in futures]
+        except Exception as e:
+            print(f"⚠️  Password hashing pool failed, hashing inline: {e}")
+            for future in futures:
+                future.cancel()
+            self._reset_pool()
+            return [generate_password_hash(password) for password in passwords]
+
+    def shutdown(self):
+        self._reset_pool()
+
+
+# Global instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,171 @@
+"""
+Plan Limits
+Enforces a tenant's max_users / max_vehicles without touching the database on
+every check: the companies row (plan, limits, subscription state) is cached per
+tenant for PLAN_LIMITS_TTL_SECONDS, and employee/vehicle counts are counted
+once per process and then kept current by the routes that create, delete and
+import them (adjust()).
+
+Counts are per worker process, so writes made through another worker are only
+seen after the reconciliation job recounts every cached tenant
+(PLAN_LIMITS_RECONCILE_MINUTES).
+
+Usage:
+    limits = plan_limits.check(g.tenant_db, 'vehicles')   # {'valid': ..., 'message': ...}
+    plan_limits.adjust(g.tenant_db, 'vehicles', +1)
+"""
+
+import threading
+import time
+import os
+
+PLAN_LIMITS_TTL_SECONDS = int(os.environ.get('PLAN_LIMITS_TTL_SECONDS', 300))
+PLAN_LIMITS_RECONCILE_MINUTES = int(os.environ.get('PLAN_LIMITS_RECONCILE_MINUTES', 10))
+
+# Limit type -> (tenant table counted, companies column holding the limit)
+LIMITED_TABLES = {
+    'users': ('employees', 'max_users'),
+    'vehicles': ('vehicles', 'max_vehicles'),
+}
+
+COMPANY_LIMITS_QUERY = """
+    SELECT database_name, plan, max_users, max_vehicles, status, trial_ends_at, subscription_ends_at
+    FROM companies WHERE database_name IN ({placeholders})
+"""
+
+
+class PlanLimits:
+    """Cached plan limits and in-memory usage counters per tenant database"""
+
+    def __init__(self):
+        # database -> (companies row or None, loaded_at)
+        self._companies = {}
+        # database -> {limit type: count}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    # ----- loading -----
+
+    def _load_companies(self, databases):
+        from tenant_manager import TenantDatabaseManager
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(COMPANY_LIMITS_QUERY.format(placeholders=', '.join(['%s'] * len(databases))),
+                               list(databases))
+                rows = {row['database_name']: row for row in cursor.fetchall()}
+        now = time.monotonic()
+        with self._lock:
+            for database in databases:
+                self._companies[database] = (rows.get(database), now)
+        return rows
+
+    @staticmethod
+    def _count(database):
+        from tenant_manager import TenantDatabaseManager
+        counts = {}
+        with TenantDatabaseManager.tenant_db(database) as conn:
+            with conn.cursor() as cursor:
+                for limit_type, (table, _) in LIMITED_TABLES.items():
+                    cursor.execute(f"SELECT COUNT(*) AS n FROM {table}")
+                    counts[limit_type] = cursor.fetchone()['n']
+        return counts
+
+    def company(self, database):
+        """Cached companies row for a tenant database (None if there is none)"""
+        with self._lock:
+            cached = self._companies.get(database)
+        if cached is None or time.monotonic() - cached[1] > PLAN_LIMITS_TTL_SECONDS:
+            return self._load_companies([database]).get(database)
+        return cached[0]
+
+    def count(self, database, limit_type):
+        with self._lock:
+            counts = self._counts.get(database)
+        if counts is None:
+            counts = self._count(database)
+            with self._lock:
+                # Another request may have counted (and adjusted) in the meantime
+                counts = self._counts.setdefault(database, counts)
+        return counts[limit_type]
+
+    # ----- checks -----
+
+    def check(self, database, limit_type=None, adding=1):
+        """Subscription state plus room for `adding` more of `limit_type` ('users' / 'vehicles')"""
+        from models_tenant import Company
+        limits = Company.evaluate_limits(self.company(database))
+        if not limits['valid'] or limit_type is None:
+            return limits
+
+        maximum = limits[LIMITED_TABLES[limit_type][1]]
+        if maximum is not None:
+            used = self.count(database, limit_type)
+            if used + adding > maximum:
+                return {'valid': False, 'used': used, 'maximum': maximum,
+                        'message': f"Your {limits['plan']} plan allows {maximum} {limit_type} ({used} in use)"}
+        return limits
+
+    def remaining(self, database, limit_type):
+        """How many more of `limit_type` fit the plan (None = unlimited, 0 if the subscription is not valid)"""
+        from models_tenant import Company
+        limits = Company.evaluate_limits(self.company(database))
+        if not limits['valid']:
+            return 0
+        maximum = limits[LIMITED_TABLES[limit_type][1]]
+        if maximum is None:
+            return None
+        return max(0, maximum - self.count(database, limit_type))
+
+    # ----- updates -----
+
+    def adjust(self, database, limit_type, delta):
+        """Record created (+n) or deleted (-n) rows; tenants not counted yet are counted on first check"""
+        if not database or not delta:
+            return
+        with self._lock:
+            counts = self._counts.get(database)
+            if counts is not None:
+                counts[limit_type] = max(0, counts[limit_type] + delta)
+
+    def invalidate(self, database):
+        """Forget a tenant's cached plan and counts (plan change, tenant dropped)"""
+        with self._lock:
+            self._companies.pop(database, None)
+            self._counts.pop(database, None)
+
+    def reconcile(self):
+        """Recount every tenant this process holds counters for and reload their plan rows"""
+        with self._lock:
+            databases = list(self._counts)
+        if not databases:
+            return 0
+
+        try:
+            self._load_companies(databases)
+        except Exception as e:
+            print(f"✗ Plan limits: could not reload plans: {e}")
+
+        corrected = 0
+        for database in databases:
+            try:
+                counts = self._count(database)
+            except Exception as e:
+                print(f"⚠️  Plan limits: could not recount {database}: {e}")
+                continue
+            with self._lock:
+                if self._counts.get(database) != counts:
+                    corrected += 1
+                self._counts[database] = counts
+        if corrected:
+            print(f"✓ Plan limits: corrected counters of {corrected} of {len(databases)} tenants")
+        return len(databases)
+
+    def schedule(self, scheduler):
+        """Register the periodic recount (every process keeps its own counters)"""
+        scheduler.add_job(self.reconcile, 'interval', minutes=PLAN_LIMITS_RECONCILE_MINUTES,
+                          id='plan_limits_reconcile', replace_existing=True, max_instances=1, coalesce=True)
+        print(f"✓ Plan limits: reconcile every {PLAN_LIMITS_RECONCILE_MINUTES} min")
+
+
+# Global instance
+plan_limits = PlanLimits()
@@ -0,0 +1,243 @@
+"""
+N+1 and Duplicate Query Detector
+Request-scoped statement fingerprinting for development and staging.
+Flags fingerprints repeated above a threshold (with the call site) and
+checks per-route query budgets: overruns are logged and flagged on the
+response (X-Query-Budget-Exceeded), and fail the request only under app.testing.
+"""
+
+from flask import g, request, has_request_context
+from contextlib import contextmanager
+from collections import deque
+import contextvars
+import traceback
+import os
+
+import db_metrics
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+_IGNORED_FILES = {'db_metrics.py', 'query_detector.py', 'slow_query_log.py'}
+
+# Active count_queries() lists; a context variable, so the copied context that
+# query_fanout hands its worker threads records their statements too
+_counters = contextvars.ContextVar('query_counters', default=())
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (under app.testing) when a route runs more statements than its budget"""
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of statements a route may execute
+
+    Usage:
+        @app.route('/api/vehicles')
+        @login_required
+        @query_budget(3)
+        def api_vehicles():
+            ...
+    """
+    def decorator(f):
+        # functools.wraps copies __dict__, so outer decorators keep the attribute
+        f._query_budget = max_queries
+        return f
+    return decorator
+
+
+def _call_site(limit=8):
+    """Application frames leading to the current statement, innermost last"""
+    frames = []
+    for frame in traceback.extract_stack()[:-1]:
+        filename = os.path.abspath(frame.filename)
+        if not filename.startswith(PROJECT_DIR) or os.path.basename(filename) in _IGNORED_FILES:
+            continue
+        frames.append(f"{os.path.relpath(filename, PROJECT_DIR)}:{frame.lineno} in {frame.name}")
+    return frames[-limit:]
+
+
+class QueryDetector:
+    """Fingerprints every statement in a request and reports repeats and budget overruns"""
+
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+        self.app = None
+        # QUERY_DETECTOR_ENABLED if set, else follow app.debug (read per request)
+        self.configured = None
+        # Budgets declared outside the view (e.g. from tests): endpoint -> max statements
+        self.budgets = {}
+        # Last reports, newest first, for inspection from a shell or test
+        self.recent_reports = deque(maxlen=50)
+
+    def init_app(self, app):
+        """
+        Enable with QUERY_DETECTOR_ENABLED=true; when unset it follows app.debug,
+        which app.run(debug=True) only sets after this runs. Budget overruns raise
+        QueryBudgetExceeded at teardown when app.testing is set.
+        """
+        configured = os.environ.get('QUERY_DETECTOR_ENABLED')
+        self.configured = configured.lower() == 'true' if configured is not None else None
+        if self.configured is False:
+            return
+
+        self.threshold = int(os.environ.get('QUERY_DETECTOR_THRESHOLD', self.threshold))
+        self.app = app
+
+        db_metrics.add_query_listener(self.record)
+        app.after_request(self.check_request)
+        app.teardown_request(self.fail_over_budget)
+
+    @property
+    def enabled(self):
+        if self.app is None:
+            return False
+        return self.configured if self.configured is not None else self.app.debug
+
+    # ----- collection -----
+
+    def record(self, sql, params, duration, rowcount, cursor):
+        """Cursor listener: count fingerprints for the current request and any active counters"""
+        counters = _counters.get()
+        in_request = self.enabled and has_request_context()
+        if not counters and not in_request:
+            return
+
+        fingerprint_id, normalized = db_metrics.fingerprint_sql(sql)
+        if normalized.startswith('explain'):
+            return
+
+        for counter in counters:
+            counter.append(normalized)
+
+        if not in_request:
+            return
+
+        seen = g.get('query_fingerprints')
+        if seen is None:
+            seen = {}
+            g.query_fingerprints = seen
+
+        entry = seen.get(fingerprint_id)
+        if entry is None:
+            entry = {'fingerprint': normalized, 'count': 0, 'params': set(), 'time': 0.0, 'stack': None}
+            seen[fingerprint_id] = entry
+
+        entry['count'] += 1
+        entry['time'] += duration
+        try:
+            entry['params'].add(repr(params))
+        except Exception:
+            pass
+        if entry['count'] == self.threshold:
+            entry['stack'] = _call_site()
+
+    # ----- reporting -----
+
+    def check_request(self, response):
+        """after_request hook: report repeated fingerprints and flag an exceeded route budget"""
+        if not self.enabled:
+            return response
+        seen = g.get('query_fingerprints') or {}
+        total = sum(entry['count'] for entry in seen.values())
+
+        repeats = []
+        for fingerprint_id, entry in seen.items():
+            if entry['count'] < self.threshold:
+                continue
+            repeats.append({
+                'fingerprint_id': fingerprint_id,
+                'fingerprint': entry['fingerprint'],
+                'count': entry['count'],
+                'kind': 'duplicate' if len(entry['params']) == 1 else 'n+1',
+                'time_ms': round(entry['time'] * 1000, 2),
+                'stack': entry['stack'] or [],
+            })
+        repeats.sort(key=lambda r: r['count'], reverse=True)
+
+        budget = self.get_budget(request.endpoint)
+        over_budget = budget is not None and total > budget
+
+        if not repeats and not over_budget:
+            return response
+
+        report = {
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'tenant': db_metrics.current_labels()['tenant'],
+            'total_queries': total,
+            'budget': budget,
+            'repeats': repeats,
+        }
+        self.recent_reports.appendleft(report)
+        self._print_report(report)
+
+        response.headers['X-Query-Count'] = str(total)
+        if repeats:
+            response.headers['X-Query-Repeats'] = ', '.join(
+                f"{r['fingerprint_id']}x{r['count']}" for r in repeats[:5])
+
+        if over_budget:
+            # Raising here would replace the response with a 500; tests fail at teardown instead
+            response.headers['X-Query-Budget-Exceeded'] = f"{total}/{budget}"
+            g.query_budget_exceeded = f"{request.endpoint} executed {total} queries (budget {budget})"
+
+        return response
+
+    def fail_over_budget(self, exception=None):
+        """teardown_request hook: fail the request under the test client when the budget was exceeded"""
+        message = g.pop('query_budget_exceeded', None)
+        if message and exception is None and self.app.testing:
+            raise QueryBudgetExceeded(message)
+
+    def get_budget(self, endpoint):
+        """Budget for an endpoint: explicit registration first, then the view decorator"""
+        if endpoint is None:
+            return None
+        if endpoint in self.budgets:
+            return self.budgets[endpoint]
+        view = self.app.view_functions.get(endpoint)
+        return getattr(view, '_query_budget', None)
+
+    def _print_report(self, report):
+        budget = f" (budget {report['budget']})" if report['budget'] is not None else ''
+        print(f"⚠️  Query detector: {report['endpoint']} [{report['tenant']}] "
+              f"ran {report['total_queries']} queries{budget}")
+        for repeat in report['repeats']:
+            print(f"   {repeat['kind'].upper()} x{repeat['count']} ({repeat['time_ms']} ms): {repeat['fingerprint'][:200]}")
+            for frame in repeat['stack']:
+                print(f"      at {frame}")
+
+    # ----- test helpers -----
+
+    @contextmanager
+    def count_queries(self):
+        """
+        Collect normalized statements executed in this context (including query_fanout workers)
+
+        Usage:
+            with query_detector.count_queries() as queries:
+                client.get('/fuel-reports')
+            assert len(queries) <= 20
+        """
+        db_metrics.add_query_listener(self.record)
+        queries = []
+        token = _counters.set(_counters.get() + (queries,))
+        try:
+            yield queries
+        finally:
+            _counters.reset(token)
+
+    @contextmanager
+    def assert_max_queries(self, max_queries):
+        """Fail if the wrapped block executes more than max_queries statements"""
+        with self.count_queries() as queries:
+            yield queries
+        if len(queries) > max_queries:
+            listing = '\n'.join(f"  {q[:160]}" for q in queries)
+            raise QueryBudgetExceeded(
+                f"Expected at most {max_queries} queries, got {len(queries)}:\n{listing}")
+
+
+# Global instance
+query_detector = QueryDetector()
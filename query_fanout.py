@@ -0,0 +1,262 @@
+"""
+Query Fan-out
+Runs independent read queries concurrently, each on its own pooled
+connection to the current tenant database, under one per-request deadline,
+so a dashboard costs its slowest query instead of the sum of all of them.
+With replica=True the connections go to the shard's read replica when it
+is healthy (see read_replica).
+
+Usage:
+    from query_fanout import query_fanout
+    results = query_fanout.run({
+        'vehicles': ("SELECT COUNT(*) AS total FROM vehicles", None, 'one'),
+        'recent': ("SELECT * FROM fuel_records WHERE employee_id = %s LIMIT 10", (employee_id,), 'all'),
+    })
+    results['vehicles']['total']
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from flask import g, has_app_context
+import contextvars
+import threading
+import time
+import math
+import re
+import os
+
+# Per-request deadline for a whole fan-out (seconds)
+FANOUT_DEADLINE_SECONDS = float(os.environ.get('FANOUT_DEADLINE_SECONDS', 10))
+# Shared worker threads for all requests in this process
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', 16))
+# Idle connections kept per database, and across all databases
+FANOUT_POOL_SIZE = int(os.environ.get('FANOUT_POOL_SIZE', 4))
+FANOUT_POOL_MAX_IDLE = int(os.environ.get('FANOUT_POOL_MAX_IDLE', 64))
+# Idle connections older than this are closed instead of reused
+FANOUT_POOL_IDLE_SECONDS = float(os.environ.get('FANOUT_POOL_IDLE_SECONDS', 60))
+# Set FANOUT_ENABLED=false to run the queries one after another on one connection
+FANOUT_ENABLED = os.environ.get('FANOUT_ENABLED', 'true').lower() == 'true'
+
+# Database used outside a tenant request (same fallback as get_db_connection)
+DEFAULT_DATABASE = 'flask_auth_db'
+
+_SELECT_RE = re.compile(r'^\s*SELECT\b', re.I)
+
+
+class QueryDeadlineExceeded(Exception):
+    """Raised when some queries of a fan-out did not finish before the deadline"""
+
+    def __init__(self, names, deadline):
+        self.names = list(names)
+        self.deadline = deadline
+        super().__init__(f"Queries exceeded the {deadline:g}s deadline: {', '.join(self.names)}")
+
+
+class ConnectionPool:
+    """Small pool of idle tenant connections per (database, shard, primary/replica)"""
+
+    def __init__(self, size=FANOUT_POOL_SIZE, max_idle=FANOUT_POOL_MAX_IDLE, idle_seconds=FANOUT_POOL_IDLE_SECONDS):
+        self.size = size
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        # (database, shard_id, target) -> [(connection, returned_at), ...], most recently returned last
+        self._idle = {}
+        self._idle_count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(database, replica=False):
+        """Pool key of a database; it changes when the tenant is relocated or its replica is skipped"""
+        from shard_manager import shard_registry
+        from read_replica import replica_router
+        target = replica_router.target(database) if replica else 'primary'
+        return database, shard_registry.shard_id_for(database), target
+
+    @staticmethod
+    def _connect(key):
+        database, shard_id, target = key
+        if target == 'replica':
+            from read_replica import replica_router
+            return replica_router.connect(database, target)
+        from tenant_manager import TenantDatabaseManager
+        return TenantDatabaseManager.get_tenant_connection(database, shard_id)
+
+    def acquire(self, key):
+        """Reuse an idle connection for `key` (checked with a ping) or open a new one"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                conn, returned_at = idle.pop()
+                self._idle_count -= 1
+
+            if time.monotonic() - returned_at > self.idle_seconds:
+                self._close(conn)
+                continue
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Exception:
+                self._close(conn)
+
+        return self._connect(key)
+
+    def release(self, key, conn, reusable=True):
+        """Return a connection; it is closed instead if broken or the pool is full"""
+        if reusable:
+            try:
+                # End the read snapshot so the next user sees current data
+                conn.rollback()
+            except Exception:
+                reusable = False
+
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.size and self._idle_count < self.max_idle:
+                    idle.append((conn, time.monotonic()))
+                    self._idle_count += 1
+                    return
+        self._close(conn)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle, self._idle_count = self._idle, {}, 0
+        for connections in idle.values():
+            for conn, _ in connections:
+                self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {'idle': self._idle_count, 'databases': len([d for d, c in self._idle.items() if c])}
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class QueryFanout:
+    """Runs a named set of independent queries concurrently with a shared deadline"""
+
+    def __init__(self, pool=None, max_workers=FANOUT_MAX_WORKERS):
+        self.pool = pool or ConnectionPool()
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='query-fanout')
+            return self._executor
+
+    @staticmethod
+    def current_database():
+        """Tenant database of the current request (or the default database)"""
+        if has_app_context() and g.get('tenant_db'):
+            return g.tenant_db
+        return DEFAULT_DATABASE
+
+    @staticmethod
+    def _normalize(spec):
+        """(sql, params[, 'one' | 'all']) -> (sql, params, fetch)"""
+        sql, params = spec[0], spec[1] if len(spec) > 1 else None
+        fetch = spec[2] if len(spec) > 2 else 'all'
+        if fetch not in ('one', 'all'):
+            raise ValueError(f"fetch must be 'one' or 'all', not {fetch!r}")
+        return sql, params, fetch
+
+    @staticmethod
+    def _with_time_limit(sql, seconds):
+        """Ask MySQL to stop a SELECT once the deadline has passed (MariaDB ignores the hint)"""
+        if '/*+' in sql or not _SELECT_RE.match(sql):
+            return sql
+        ms = max(1, math.ceil(seconds * 1000))
+        return _SELECT_RE.sub(f'SELECT /*+ MAX_EXECUTION_TIME({ms}) */', sql, count=1)
+
+    def _execute(self, key, sql, params, fetch, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Deadline passed before the query started")
+
+        conn = self.pool.acquire(key)
+        reusable = False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(self._with_time_limit(sql, remaining), params)
+                result = cursor.fetchone() if fetch == 'one' else cursor.fetchall()
+            reusable = True
+            return result
+        finally:
+            self.pool.release(key, conn, reusable)
+
+    def _run_sequential(self, key, queries):
+        conn = self.pool.acquire(key)
+        reusable = False
+        try:
+            results = {}
+            with conn.cursor() as cursor:
+                for name, (sql, params, fetch) in queries.items():
+                    cursor.execute(sql, params)
+                    results[name] = cursor.fetchone() if fetch == 'one' else cursor.fetchall()
+            reusable = True
+            return results
+        finally:
+            self.pool.release(key, conn, reusable)
+
+    def run(self, queries, deadline=None, database=None, replica=False):
+        """
+        Run {name: (sql, params[, 'one' | 'all'])} concurrently and return {name: result}
+
+        The first failing query's exception is raised; QueryDeadlineExceeded is
+        raised if any query is still running `deadline` seconds after the call.
+        replica=True reads from the shard's replica (read-only queries only).
+        """
+        deadline = FANOUT_DEADLINE_SECONDS if deadline is None else deadline
+        key = self.pool.key(database or self.current_database(), replica)
+        queries = {name: self._normalize(spec) for name, spec in queries.items()}
+
+        if not FANOUT_ENABLED or len(queries) < 2:
+            return self._run_sequential(key, queries)
+
+        deadline_at = time.monotonic() + deadline
+        executor = self._get_executor()
+        futures = {}
+        for name, (sql, params, fetch) in queries.items():
+            # Each task runs in a copy of the request context, so g (tenant, per-request
+            # DB statistics) is visible to the instrumentation in the worker thread
+            context = contextvars.copy_context()
+            future = executor.submit(context.run, self._execute, key, sql, params, fetch, deadline_at)
+            futures[future] = name
+
+        done, not_done = wait(futures, timeout=max(0, deadline_at - time.monotonic()),
+                              return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+
+        for future in done:
+            error = future.exception()
+            if isinstance(error, TimeoutError):
+                # Waited in the worker queue until the deadline had passed
+                raise QueryDeadlineExceeded([futures[future]], deadline)
+            if error is not None:
+                raise error
+        if not_done:
+            raise QueryDeadlineExceeded(sorted(futures[f] for f in not_done), deadline)
+
+        return {name: future.result() for future, name in futures.items()}
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.pool.clear()
+
+
+# Global instance
+query_fanout = QueryFanout()
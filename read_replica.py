@@ -0,0 +1,156 @@
+"""
+Read Replica Routing
+Sends read-only work (analytics, report generation, exports, backups) to the
+read replica of the tenant's shard, so it does not compete with fuel entries
+and job card edits on the primary. Falls back to the primary when a shard has
+no replica, the replica is unreachable, or it lags more than
+REPLICA_MAX_LAG_SECONDS. Read connections are opened READ ONLY wherever they
+point, so a write that is routed here by mistake fails instead of diverging.
+
+After a tenant writes (response_cache.invalidate), this process reads that
+tenant from the primary for REPLICA_STICKY_SECONDS so users see their own
+changes in reports.
+
+Usage:
+    from read_replica import replica_router
+    conn = replica_router.connect(g.tenant_db)
+"""
+
+import threading
+import time
+import os
+
+import db_metrics
+
+REPLICA_ENABLED = os.environ.get('REPLICA_ENABLED', 'true').lower() == 'true'
+# Replicas further behind than this are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))
+# How long a measured lag is trusted before it is checked again
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5))
+# An unreachable or lagging replica is not tried again for this long
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+# Reads of a tenant stay on the primary this long after it wrote
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+READ_ONLY_SESSION = "SET SESSION TRANSACTION READ ONLY"
+
+
+class ReplicaRouter:
+    """Chooses replica or primary for read-only connections to a tenant database"""
+
+    def __init__(self):
+        # shard_id -> (lag seconds or None, checked_at)
+        self._lag = {}
+        # shard_id -> monotonic time until which the replica is skipped
+        self._skip_until = {}
+        # database -> monotonic time until which reads stay on the primary
+        self._sticky_until = {}
+        self._lock = threading.Lock()
+
+    def mark_written(self, database):
+        """Keep reads of this database on the primary for a while (read-your-writes)"""
+        with self._lock:
+            self._sticky_until[database] = time.monotonic() + REPLICA_STICKY_SECONDS
+
+    def _skip(self, shard_id, reason):
+        with self._lock:
+            already = self._skip_until.get(shard_id, 0) > time.monotonic()
+            self._skip_until[shard_id] = time.monotonic() + REPLICA_RETRY_SECONDS
+        if not already:
+            print(f"⚠️  Replica of shard {shard_id} skipped for {REPLICA_RETRY_SECONDS:g}s: {reason}")
+
+    def target(self, database):
+        """'replica' or 'primary' for a read of `database` right now"""
+        if not REPLICA_ENABLED:
+            return 'primary'
+        from shard_manager import shard_registry
+        shard_id = shard_registry.shard_id_for(database)
+        now = time.monotonic()
+        with self._lock:
+            if self._sticky_until.get(database, 0) > now or self._skip_until.get(shard_id, 0) > now:
+                return 'primary'
+        try:
+            if shard_registry.replica_config(database, shard_id) is None:
+                return 'primary'
+        except Exception:
+            return 'primary'
+        return 'replica'
+
+    @staticmethod
+    def replication_lag(conn):
+        """Seconds behind the source, or None if the server is not replicating"""
+        import pymysql
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except pymysql.err.ProgrammingError:
+                cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22, MariaDB
+            status = cursor.fetchone()
+        if not status:
+            return None
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return float(lag) if lag is not None else None
+
+    def _check_lag(self, shard_id, conn):
+        """Raise if the replica is too far behind (measured at most every REPLICA_LAG_CHECK_SECONDS)"""
+        with self._lock:
+            cached = self._lag.get(shard_id)
+        if cached is None or time.monotonic() - cached[1] > REPLICA_LAG_CHECK_SECONDS:
+            cached = (self.replication_lag(conn), time.monotonic())
+            with self._lock:
+                self._lag[shard_id] = cached
+        lag = cached[0]
+        if lag is None:
+            raise RuntimeError("replication is not running")
+        if lag > REPLICA_MAX_LAG_SECONDS:
+            raise RuntimeError(f"{lag:g}s behind (limit {REPLICA_MAX_LAG_SECONDS:g}s)")
+
+    @staticmethod
+    def _read_only(config):
+        return dict(config, init_command=READ_ONLY_SESSION)
+
+    def resolve(self, database, target=None):
+        """
+        ('replica' | 'primary', connect() arguments) for `database`, decided once, for
+        callers whose connections must all read the same server (parallel dumps)
+        """
+        from shard_manager import shard_registry
+        target = target or self.target(database)
+        shard_id = shard_registry.shard_id_for(database)
+
+        if target == 'replica':
+            config = self._read_only(shard_registry.replica_config(database, shard_id))
+            try:
+                conn = db_metrics.connect(**config)
+                try:
+                    self._check_lag(shard_id, conn)
+                finally:
+                    conn.close()
+                return 'replica', config
+            except Exception as e:
+                self._skip(shard_id, e)
+
+        return 'primary', self._read_only(shard_registry.connection_config(database, shard_id))
+
+    def connect(self, database, target=None):
+        """Read-only connection to `database`: its replica when healthy, otherwise its primary"""
+        from shard_manager import shard_registry
+        target = target or self.target(database)
+        shard_id = shard_registry.shard_id_for(database)
+
+        if target == 'replica':
+            conn = None
+            try:
+                conn = db_metrics.connect(**self._read_only(shard_registry.replica_config(database, shard_id)))
+                self._check_lag(shard_id, conn)
+                return conn
+            except Exception as e:
+                if conn is not None:
+                    conn.close()
+                self._skip(shard_id, e)
+
+        return db_metrics.connect(**self._read_only(shard_registry.connection_config(database, shard_id)))
+
+
+# Global instance
+replica_router = ReplicaRouter()
@@ -0,0 +1,121 @@
+"""
+Reference Data Cache
+Compact per-tenant lookup tables of vehicles and employees for dropdowns and
+the /api/vehicles and /api/employees endpoints, so pages stop re-querying the
+same lists on every request.
+
+A table is versioned by the tenant's table version (table_versions.bump(
+'vehicles') / ('employees')); every route that writes those tables bumps it,
+and the next read reloads the table. Tables are loaded from the primary so a
+fresh version never caches replica lag. With the Redis response cache backend
+the versions are shared, so a write in one worker is seen by all of them;
+with the memory backend tables are also reloaded every
+TABLE_VERSIONS_LOCAL_SECONDS.
+
+Usage:
+    vehicles = reference_data.vehicles()                       # every vehicle
+    available = reference_data.vehicles('available', 'in_use')  # by status
+    return reference_data.json_response('vehicles', build)      # ETag / 304
+"""
+
+from collections import OrderedDict
+from flask import request, current_app
+import threading
+import hashlib
+import json
+import os
+
+REFERENCE_CACHE_ENABLED = os.environ.get('REFERENCE_CACHE_ENABLED', 'true').lower() == 'true'
+# Tenants whose tables are kept per process (least recently used are dropped)
+REFERENCE_CACHE_MAX_TENANTS = int(os.environ.get('REFERENCE_CACHE_MAX_TENANTS', 500))
+
+# Columns are the union of what the dropdowns and APIs read
+REFERENCE_QUERIES = {
+    'vehicles': """
+        SELECT id, vehicle_number, make, model, year, status, mileage, last_service_date
+        FROM vehicles
+        ORDER BY vehicle_number
+    """,
+    'employees': """
+        SELECT id, employee_id, username, email, department, position, status
+        FROM employees
+        ORDER BY username
+    """,
+}
+
+
+class ReferenceDataCache:
+    """Per-tenant vehicle/employee lists, reloaded when the tenant's write counter moves"""
+
+    def __init__(self, max_tenants=REFERENCE_CACHE_MAX_TENANTS):
+        self.max_tenants = max_tenants
+        # tenant -> {name: {'version': n, 'rows': [...], 'etag': str}}
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(name):
+        from app import get_db_connection
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(REFERENCE_QUERIES[name])
+                return list(cursor.fetchall())
+        finally:
+            conn.close()
+
+    def table(self, name):
+        """Cache entry {'version', 'rows', 'etag'} of a reference table for the current tenant"""
+        from response_cache import current_tenant
+        from table_versions import table_versions
+        tenant = current_tenant()
+        version = table_versions.token((name,), tenant)
+        with self._lock:
+            entry = self._tenants.get(tenant, {}).get(name)
+            if entry is not None and entry['version'] == version:
+                self._tenants.move_to_end(tenant)
+                return entry
+
+        # Read the counter before loading: a write during the load leaves this entry outdated
+        rows = self._load(name)
+        digest = hashlib.md5(json.dumps(rows, default=str).encode('utf-8')).hexdigest()
+        entry = {'version': version, 'rows': rows, 'etag': f"{name}-{digest}"}
+        if REFERENCE_CACHE_ENABLED:
+            with self._lock:
+                self._tenants.setdefault(tenant, {})[name] = entry
+                self._tenants.move_to_end(tenant)
+                while len(self._tenants) > self.max_tenants:
+                    self._tenants.popitem(last=False)
+        return entry
+
+    def vehicles(self, *statuses):
+        """Vehicles ordered by number, optionally only those in the given statuses"""
+        rows = self.table('vehicles')['rows']
+        return [row for row in rows if row['status'] in statuses] if statuses else rows
+
+    def employees(self, *statuses):
+        """Employees ordered by username, optionally only those in the given statuses"""
+        rows = self.table('employees')['rows']
+        return [row for row in rows if row['status'] in statuses] if statuses else rows
+
+    def json_response(self, name, build):
+        """JSON of build(rows) with the table's ETag; 304 when the client already has this version"""
+        entry = self.table(name)
+        response = current_app.response_class(mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if request.if_none_match.contains(entry['etag']):
+            return response.make_conditional(request)
+        response.set_data(json.dumps(build(entry['rows']), default=str))
+        return response.make_conditional(request)
+
+    def clear(self, tenant=None):
+        with self._lock:
+            if tenant is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant, None)
+
+
+# Global instance
+reference_data = ReferenceDataCache()
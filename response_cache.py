@@ -0,0 +1,311 @@
+"""
+Response Cache
+Short-TTL cache for analytics JSON endpoints. Responses are keyed by tenant,
+endpoint, the user's permission set and the normalized query string; they
+are served fresh for a TTL, then served stale while one background request
+rebuilds them. Write routes invalidate by tag (the table names, e.g. 'fuel_records'),
+which bumps a per-tenant generation that is part of every key.
+
+Backends are pluggable: in-process memory (default) or Redis, shared by all
+workers (RESPONSE_CACHE_BACKEND=redis, RESPONSE_CACHE_REDIS_URL=redis://...).
+
+Usage:
+    @analytics_bp.route('/api/fuel-costs-chart')
+    @login_required
+    @cached_response(tags=('fuel_records', 'vehicles'))
+    def get_fuel_costs_chart():
+        ...
+
+    table_versions.bump('fuel_records')    # after committing a fuel record (see table_versions)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import g, request, current_app, has_request_context
+import threading
+import hashlib
+import json
+import time
+import os
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+# Seconds a response is served as fresh, then for how long it may be served stale while refreshing
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+RESPONSE_CACHE_STALE = int(os.environ.get('RESPONSE_CACHE_STALE', 300))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+# A background refresh holding its lock longer than this is assumed dead
+REFRESH_LOCK_SECONDS = 30
+
+
+class MemoryCacheBackend:
+    """Per-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl):
+        """Set only if absent (or expired); returns True if this call stored it"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] >= time.time():
+                return False
+            self._entries[key] = (value, time.time() + ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisCacheBackend:
+    """Redis store shared by every worker process (needs the redis package)"""
+
+    def __init__(self, url=RESPONSE_CACHE_REDIS_URL, prefix='fleet:rc:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)), nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_counter(self, key):
+        raw = self.client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def _create_backend():
+    if RESPONSE_CACHE_BACKEND == 'redis':
+        try:
+            backend = RedisCacheBackend()
+            backend.client.ping()
+            print(f"✓ Response cache: redis ({RESPONSE_CACHE_REDIS_URL})")
+            return backend
+        except Exception as e:
+            print(f"⚠️  Response cache: redis unavailable ({e}), using per-process memory")
+    return MemoryCacheBackend()
+
+
+def current_tenant():
+    if has_request_context() and g.get('tenant_db'):
+        return g.tenant_db
+    return 'default'
+
+
+def permission_scope():
+    """Digest of the current user's permission set (users with equal permissions share entries)"""
+    from permission_manager import permission_manager
+    permissions = ','.join(sorted(permission_manager.get_user_permissions()))
+    return hashlib.md5(permissions.encode('utf-8')).hexdigest()[:12]
+
+
+def normalized_query_string():
+    """Query parameters sorted by name and value, so ?a=1&b=2 and ?b=2&a=1 share an entry"""
+    return urlencode(sorted(request.args.items(multi=True)))
+
+
+class ResponseCache:
+    """Tenant-scoped response cache with TTL, stale-while-revalidate and tag invalidation"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = _create_backend()
+        return self._backend
+
+    def set_backend(self, backend):
+        """Swap the storage backend (e.g. a RedisCacheBackend, or a fresh memory one in tests)"""
+        self._backend = backend
+
+    # ----- invalidation -----
+
+    def _generation_key(self, tenant, tag):
+        return f"gen:{tenant}:{tag}"
+
+    def invalidate(self, *tags, tenant=None):
+        """Expire every cached response of the tenant that carries one of these tags"""
+        tenant = tenant or current_tenant()
+        # The replica may not have this write yet; keep the tenant's reads on the primary meanwhile
+        from read_replica import replica_router
+        replica_router.mark_written(tenant)
+        for tag in tags:
+            try:
+                self.backend.incr(self._generation_key(tenant, tag))
+            except Exception as e:
+                print(f"⚠️  Response cache invalidation failed ({tenant}/{tag}): {e}")
+
+    def generation(self, tag, tenant=None):
+        """Current write counter of a tag (bumped by every invalidate())"""
+        return self.backend.get_counter(self._generation_key(tenant or current_tenant(), tag))
+
+    def _generations(self, tenant, tags):
+        return [self.backend.get_counter(self._generation_key(tenant, tag)) for tag in tags]
+
+    # ----- lookup -----
+
+    def make_key(self, tags, vary=None):
+        tenant = current_tenant()
+        parts = [
+            request.endpoint or request.path,
+            permission_scope(),
+            vary() if vary else '',
+            normalized_query_string(),
+            ','.join(str(gen) for gen in self._generations(tenant, tags)),
+        ]
+        digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+        return f"resp:{tenant}:{request.endpoint}:{digest}"
+
+    def store(self, key, response, ttl, stale):
+        body = response.get_data(as_text=True)
+        now = time.time()
+        entry = {
+            'body': body,
+            'mimetype': response.mimetype,
+            'etag': hashlib.md5(body.encode('utf-8')).hexdigest(),
+            'fresh_until': now + ttl,
+        }
+        self.backend.set(key, entry, ttl + stale)
+        return entry
+
+    def _refresh(self, app, environ, tenant_context, key, view, args, kwargs, ttl, stale):
+        """Rebuild an entry outside the original request (it has already been answered)"""
+        try:
+            with app.request_context(environ):
+                # before_request hooks do not run here; restore what TenantMiddleware had set
+                for name, value in tenant_context.items():
+                    setattr(g, name, value)
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    self.store(key, response, ttl, stale)
+        except Exception as e:
+            print(f"⚠️  Background refresh failed for {key}: {e}")
+        finally:
+            self.backend.delete(f"lock:{key}")
+
+    def _refresh_in_background(self, key, view, args, kwargs, ttl, stale):
+        if not self.backend.add(f"lock:{key}", 1, REFRESH_LOCK_SECONDS):
+            return  # another request is already refreshing this entry
+        tenant_context = {name: g.get(name) for name in
+                          ('tenant_id', 'tenant_db', 'tenant_name', 'tenant_subdomain', 'tenant_plan', 'tenant_status')
+                          if g.get(name) is not None}
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='response-cache')
+        self._executor.submit(self._refresh, current_app._get_current_object(), dict(request.environ),
+                              tenant_context, key, view, args, kwargs, ttl, stale)
+
+    @staticmethod
+    def respond(entry, status):
+        response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Cache'] = status
+        return response.make_conditional(request)
+
+    def cached(self, ttl=None, stale=None, tags=(), vary=None):
+        """
+        Cache a GET view's 200 responses; other statuses pass through uncached.
+        vary: optional callable whose result is added to the key (e.g. the user for
+        views whose data depends on who asks, not just on their permissions).
+        """
+        ttl = RESPONSE_CACHE_TTL if ttl is None else ttl
+        stale = RESPONSE_CACHE_STALE if stale is None else stale
+
+        def decorator(view):
+            @wraps(view)
+            def decorated_function(*args, **kwargs):
+                if not RESPONSE_CACHE_ENABLED or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                try:
+                    key = self.make_key(tags, vary)
+                    entry = self.backend.get(key)
+                except Exception as e:
+                    print(f"⚠️  Response cache lookup failed: {e}")
+                    return view(*args, **kwargs)
+
+                if entry is not None:
+                    if entry['fresh_until'] >= time.time():
+                        return self.respond(entry, 'HIT')
+                    self._refresh_in_background(key, view, args, kwargs, ttl, stale)
+                    return self.respond(entry, 'STALE')
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                try:
+                    entry = self.store(key, response, ttl, stale)
+                except Exception as e:
+                    print(f"⚠️  Response cache store failed: {e}")
+                    return response
+                return self.respond(entry, 'MISS')
+            return decorated_function
+        return decorator
+
+
+# Global instance
+response_cache = ResponseCache()
+cached_response = response_cache.cached
@@ -1,7 +1,13 @@
 from flask import render_template, request, redirect, url_for, flash, session, g, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from app import app, get_db_connection, allowed_file
+from app import app, get_db_connection, get_read_db_connection, allowed_file
+from password_hasher import password_hasher
+from query_fanout import query_fanout
+from plan_limits import plan_limits
+from reference_data import reference_data
+from table_versions import table_versions, conditional_view
+from tenant_middleware import check_tenant_limits
 import pymysql
 import os
 import whatsapp_service
@@ -66,7 +72,7 @@ def user_signup():
                 return redirect(url_for('user_signup'))
             
             # Insert new user
-            password_hash = generate_password_hash(password)
+            password_hash = password_hasher.hash(password)
             cursor.execute(
                 "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
                 (username, email, password_hash)
@@ -136,6 +142,7 @@ def user_dashboard():
 
 # Employee Routes
 @app.route('/employee/signup', methods=['GET', 'POST'])
+@check_tenant_limits('users')
 def employee_signup():
     if request.method == 'POST':
         employee_id = request.form.get('employee_id')
@@ -177,12 +184,14 @@ def employee_signup():
                 return redirect(url_for('employee_signup'))
             
             # Insert new employee
-            password_hash = generate_password_hash(password)
+            password_hash = password_hasher.hash(password)
             cursor.execute(
                 "INSERT INTO employees (employee_id, username, email, password_hash, department, position) VALUES (%s, %s, %s, %s, %s, %s)",
                 (employee_id, username, email, password_hash, department, position)
             )
             conn.commit()
+            plan_limits.adjust(g.get('tenant_db'), 'users', 1)
+            table_versions.bump('employees')
             flash('Employee account created successfully! Please log in.', 'success')
             return redirect(url_for('employee_login'))
         except Exception as e:
@@ -298,54 +307,49 @@ def employee_dashboard():
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('index'))
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("SELECT * FROM employees WHERE id = %s", (session['employee_id'],))
-        employee = cursor.fetchone()
-        
+    # Employee row and service notification counts are independent: run them concurrently
+    results = query_fanout.run({
+        'employee': ("SELECT * FROM employees WHERE id = %s", (session['employee_id'],), 'one'),
         # Get service notification counts
-        cursor.execute("""
-            SELECT 
-                COUNT(CASE 
-                    WHEN (sm.next_service_mileage IS NOT NULL AND fr.latest_mileage IS NOT NULL 
-                          AND sm.next_service_mileage <= fr.latest_mileage) 
-                    OR (sm.next_service_date IS NOT NULL AND sm.next_service_date <= CURDATE())
-                    THEN 1 END) as overdue_count,
-                COUNT(CASE 
-                    WHEN (sm.next_service_mileage IS NOT NULL AND fr.latest_mileage IS NOT NULL 
-                          AND sm.next_service_mileage - fr.latest_mileage BETWEEN 1 AND 1000)
-                    OR (sm.next_service_date IS NOT NULL 
-                        AND DATEDIFF(sm.next_service_date, CURDATE()) BETWEEN 1 AND 7)
-                    THEN 1 END) as due_soon_count
-            FROM vehicles v
-            LEFT JOIN (
-                SELECT vehicle_id, MAX(odometer_reading) as latest_mileage
-                FROM fuel_records
-                WHERE odometer_reading IS NOT NULL
-                GROUP BY vehicle_id
-            ) fr ON v.id = fr.vehicle_id
-            LEFT JOIN (
-                SELECT sm1.vehicle_id, sm1.next_service_mileage, sm1.next_service_date
-                FROM service_maintenance sm1
-                INNER JOIN (
-                    SELECT vehicle_id, MAX(service_date) as max_date
-                    FROM service_maintenance
+        'notification_counts': ("""
+                SELECT 
+                    COUNT(CASE 
+                        WHEN (sm.next_service_mileage IS NOT NULL AND fr.latest_mileage IS NOT NULL 
+                              AND sm.next_service_mileage <= fr.latest_mileage) 
+                        OR (sm.next_service_date IS NOT NULL AND sm.next_service_date <= CURDATE())
+                        THEN 1 END) as overdue_count,
+                    COUNT(CASE 
+                        WHEN (sm.next_service_mileage IS NOT NULL AND fr.latest_mileage IS NOT NULL 
+                              AND sm.next_service_mileage - fr.latest_mileage BETWEEN 1 AND 1000)
+                        OR (sm.next_service_date IS NOT NULL 
+                            AND DATEDIFF(sm.next_service_date, CURDATE()) BETWEEN 1 AND 7)
+                        THEN 1 END) as due_soon_count
+                FROM vehicles v
+                LEFT JOIN (
+                    SELECT vehicle_id, MAX(odometer_reading) as latest_mileage
+                    FROM fuel_records
+                    WHERE odometer_reading IS NOT NULL
                     GROUP BY vehicle_id
-                ) sm2 ON sm1.vehicle_id = sm2.vehicle_id AND sm1.service_date = sm2.max_date
-            ) sm ON v.id = sm.vehicle_id
-            WHERE (v.status = 'available' OR v.status = 'assigned')
-        """)
-        notification_counts = cursor.fetchone()
-        
-        return render_template('employee_dashboard.html', 
-                             employee=employee,
-                             overdue_count=notification_counts['overdue_count'] or 0,
-                             due_soon_count=notification_counts['due_soon_count'] or 0)
-    finally:
-        cursor.close()
-        conn.close()
+                ) fr ON v.id = fr.vehicle_id
+                LEFT JOIN (
+                    SELECT sm1.vehicle_id, sm1.next_service_mileage, sm1.next_service_date
+                    FROM service_maintenance sm1
+                    INNER JOIN (
+                        SELECT vehicle_id, MAX(service_date) as max_date
+                        FROM service_maintenance
+                        GROUP BY vehicle_id
+                    ) sm2 ON sm1.vehicle_id = sm2.vehicle_id AND sm1.service_date = sm2.max_date
+                ) sm ON v.id = sm.vehicle_id
+                WHERE (v.status = 'available' OR v.status = 'assigned')
+        """, None, 'one'),
+    })
+    employee = results['employee']
+    notification_counts = results['notification_counts']
+    
+    return render_template('employee_dashboard.html', 
+                         employee=employee,
+                         overdue_count=notification_counts['overdue_count'] or 0,
+                         due_soon_count=notification_counts['due_soon_count'] or 0)
 
 # Logout Route
 @app.route('/logout')
@@ -357,6 +361,7 @@ def logout():
 # Vehicle Management Routes
 @app.route('/vehicles')
 @login_required
+@conditional_view('vehicles')
 def vehicles_list():
     if session.get('user_type') != 'employee':
         flash('Only employees can access vehicle management!', 'danger')
@@ -407,6 +412,7 @@ def vehicles_list():
 
 @app.route('/vehicles/add', methods=['GET', 'POST'])
 @login_required
+@check_tenant_limits('vehicles')
 def add_vehicle():
     if session.get('user_type') != 'employee':
         flash('Only employees can add vehicles!', 'danger')
@@ -448,6 +454,8 @@ def add_vehicle():
                   mileage, last_service_date if last_service_date else None, 
                   expected_fuel_consumption if expected_fuel_consumption else None, notes, session['employee_id']))
             conn.commit()
+            plan_limits.adjust(g.get('tenant_db'), 'vehicles', 1)
+            table_versions.bump('vehicles')
             flash('Vehicle added successfully!', 'success')
             return redirect(url_for('vehicles_list'))
         except Exception as e:
@@ -506,6 +514,7 @@ def edit_vehicle(vehicle_id):
                   mileage, last_service_date if last_service_date else None, 
                   expected_fuel_consumption if expected_fuel_consumption else None, notes, vehicle_id))
             conn.commit()
+            table_versions.bump('vehicles')
             flash('Vehicle updated successfully!', 'success')
             return redirect(url_for('vehicles_list'))
         except Exception as e:
@@ -539,6 +548,10 @@ def delete_vehicle(vehicle_id):
     try:
         cursor.execute("DELETE FROM vehicles WHERE id = %s", (vehicle_id,))
         conn.commit()
+        plan_limits.adjust(g.get('tenant_db'), 'vehicles', -cursor.rowcount)
+        # Rows referencing the vehicle go with it (ON DELETE CASCADE)
+        table_versions.bump('vehicles', 'fuel_records', 'vehicle_assignments', 'service_maintenance',
+                            'job_cards', 'service_requisitions')
         flash('Vehicle deleted successfully!', 'success')
     except Exception as e:
         conn.rollback()
@@ -580,6 +593,7 @@ def view_vehicle(vehicle_id):
 # Vehicle Assignment Routes
 @app.route('/assignments')
 @login_required
+@conditional_view('vehicle_assignments', 'vehicles')
 def assignments_list():
     if session.get('user_type') != 'employee':
         flash('Only employees can access assignments!', 'danger')
@@ -700,6 +714,7 @@ def assign_vehicle():
             """, (mileage_at_assignment, vehicle_id))
             
             conn.commit()
+            table_versions.bump('vehicle_assignments', 'vehicles')
             flash('Vehicle assigned successfully!', 'success')
             
             # Send WhatsApp notification to assigned employee
@@ -745,22 +760,9 @@ def assign_vehicle():
             conn.close()
     
     try:
-        # Get available vehicles
-        cursor.execute("""
-            SELECT id, vehicle_number, make, model, year, mileage 
-            FROM vehicles 
-            WHERE status = 'available'
-            ORDER BY vehicle_number
-        """)
-        vehicles = cursor.fetchall()
-        
-        # Get all employees
-        cursor.execute("""
-            SELECT id, employee_id, username, position 
-            FROM employees 
-            ORDER BY username
-        """)
-        employees = cursor.fetchall()
+        # Available vehicles and all employees (cached per tenant)
+        vehicles = reference_data.vehicles('available')
+        employees = reference_data.employees()
         
         return render_template('assign_vehicle.html', vehicles=vehicles, employees=employees)
     finally:
@@ -817,6 +819,7 @@ def return_vehicle(assignment_id):
             """, (mileage_at_return, assignment['vehicle_id']))
             
             conn.commit()
+            table_versions.bump('vehicle_assignments', 'vehicles')
             flash('Vehicle returned successfully!', 'success')
             return redirect(url_for('assignments_list'))
         except Exception as e:
@@ -889,6 +892,7 @@ def view_assignment(assignment_id):
 
 @app.route('/my-assignments')
 @login_required
+@conditional_view('vehicle_assignments', 'vehicles')
 def my_assignments():
     if session.get('user_type') != 'employee':
         flash('Only employees can view their assignments!', 'danger')
@@ -916,6 +920,7 @@ def my_assignments():
 
 # Fuel Tracking Routes
 @app.route('/fuel-records')
+@conditional_view('fuel_records', 'vehicles')
 def fuel_records():
     if 'employee_id' not in session:
         flash('Please log in to access this page.', 'warning')
@@ -954,11 +959,8 @@ def fuel_records():
         fuel_records = cursor.fetchall()
         
         # Get vehicles and employees for filters
-        cursor.execute("SELECT id, vehicle_number, make, model FROM vehicles ORDER BY vehicle_number")
-        vehicles = cursor.fetchall()
-        
-        cursor.execute("SELECT id, username FROM employees ORDER BY username")
-        employees = cursor.fetchall()
+        vehicles = reference_data.vehicles()
+        employees = reference_data.employees()
         
         return render_template('fuel_records.html', 
                              fuel_records=fuel_records, 
@@ -1014,6 +1016,7 @@ def add_fuel_record():
             """, (vehicle_id, session['employee_id'], fuel_amount, fuel_cost, 
                   odometer_reading, fuel_type, station_name, receipt_path, notes))
             conn.commit()
+            table_versions.bump('fuel_records')
             flash('Fuel record added successfully!', 'success')
             
             # Check fuel expense threshold and send WhatsApp notification
@@ -1046,20 +1049,8 @@ def add_fuel_record():
             conn.close()
     
     # GET request - show form
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT id, vehicle_number, make, model, mileage 
-            FROM vehicles 
-            WHERE status = 'available' OR status = 'in_use'
-            ORDER BY vehicle_number
-        """)
-        vehicles = cursor.fetchall()
-        return render_template('add_fuel_record.html', vehicles=vehicles)
-    finally:
-        cursor.close()
-        conn.close()
+    vehicles = reference_data.vehicles('available', 'in_use')
+    return render_template('add_fuel_record.html', vehicles=vehicles)
 
 @app.route('/view-fuel-record/<int:record_id>')
 def view_fuel_record(record_id):
@@ -1111,6 +1102,7 @@ def delete_fuel_record(record_id):
         
         cursor.execute("DELETE FROM fuel_records WHERE id = %s", (record_id,))
         conn.commit()
+        table_versions.bump('fuel_records')
         flash('Fuel record deleted successfully!', 'success')
         return redirect(url_for('fuel_records'))
     finally:
@@ -1118,6 +1110,7 @@ def delete_fuel_record(record_id):
         conn.close()
 
 @app.route('/fuel-reports')
+@conditional_view('fuel_records', 'vehicles')
 def fuel_reports():
     if 'employee_id' not in session:
         flash('Please log in to access this page.', 'warning')
@@ -1125,7 +1118,7 @@ def fuel_reports():
     
     from datetime import datetime, timedelta
     
-    conn = get_db_connection()
+    conn = get_read_db_connection()
     cursor = conn.cursor()
     try:
         # Get filter parameters
@@ -1301,11 +1294,8 @@ def fuel_reports():
                     ddata['avg_consumption'] = (ddata['total_litres'] / ddata['total_km']) * 100
         
         # Get all vehicles and drivers for filters
-        cursor.execute("SELECT id, vehicle_number, make, model FROM vehicles ORDER BY vehicle_number")
-        vehicles = cursor.fetchall()
-        
-        cursor.execute("SELECT id, username FROM employees ORDER BY username")
-        employees = cursor.fetchall()
+        vehicles = reference_data.vehicles()
+        employees = reference_data.employees()
         
         return render_template('fuel_reports.html',
                              fuel_records=fuel_records,
@@ -1331,7 +1321,7 @@ def fuel_reports_print():
     
     from datetime import datetime, timedelta
     
-    conn = get_db_connection()
+    conn = get_read_db_connection()
     cursor = conn.cursor()
     try:
         # Get filter parameters
@@ -1502,7 +1492,7 @@ def fuel_reports_export():
     from flask import send_file
     import io
     
-    conn = get_db_connection()
+    conn = get_read_db_connection()
     cursor = conn.cursor()
     try:
         # Get filter parameters
@@ -1767,6 +1757,7 @@ def fuel_reports_export():
         conn.close()
 
 @app.route('/my-fuel-records')
+@conditional_view('fuel_records', 'vehicles')
 def my_fuel_records():
     if 'employee_id' not in session:
         flash('Please log in to access this page.', 'warning')
@@ -1890,6 +1881,7 @@ def my_fuel_records():
 
 # Service & Maintenance Routes
 @app.route('/service-maintenance')
+@conditional_view('service_maintenance', 'vehicles')
 def service_maintenance():
     if 'employee_id' not in session:
         flash('Please log in to access this page.', 'warning')
@@ -1933,8 +1925,7 @@ def service_maintenance():
         services = cursor.fetchall()
         
         # Get vehicles and service types for filters
-        cursor.execute("SELECT id, vehicle_number, make, model FROM vehicles ORDER BY vehicle_number")
-        vehicles = cursor.fetchall()
+        vehicles = reference_data.vehicles()
         
         cursor.execute("SELECT DISTINCT service_type FROM service_maintenance ORDER BY service_type")
         service_types = cursor.fetchall()
@@ -2019,6 +2010,7 @@ def add_service():
                 """, (service_id, requisition_id))
             
             conn.commit()
+            table_versions.bump('service_maintenance', 'vehicles', 'service_requisitions')
             flash('Service record added successfully!', 'success')
             return redirect(url_for('service_maintenance'))
         finally:
@@ -2029,12 +2021,7 @@ def add_service():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT id, vehicle_number, make, model, mileage, last_service_date
-            FROM vehicles 
-            ORDER BY vehicle_number
-        """)
-        vehicles = cursor.fetchall()
+        vehicles = reference_data.vehicles()
         
         # Check if creating from requisition
         requisition_id = request.args.get('requisition_id')
@@ -2165,6 +2152,7 @@ def edit_service(service_id):
             """, (service_date, odometer_reading, current_service['vehicle_id']))
             
             conn.commit()
+            table_versions.bump('service_maintenance', 'vehicles')
             flash('Service record updated successfully!', 'success')
             return redirect(url_for('view_service', service_id=service_id))
         finally:
@@ -2213,6 +2201,7 @@ def delete_service(service_id):
         
         cursor.execute("DELETE FROM service_maintenance WHERE id = %s", (service_id,))
         conn.commit()
+        table_versions.bump('service_maintenance')
         flash('Service record deleted successfully!', 'success')
         return redirect(url_for('service_maintenance'))
     finally:
@@ -2255,6 +2244,7 @@ def vehicle_service_history(vehicle_id):
 
 # Job Card Routes
 @app.route('/job-cards')
+@conditional_view('job_cards', 'vehicles')
 def job_cards():
     if 'employee_id' not in session:
         flash('Please log in to access this page.', 'warning')
@@ -2295,8 +2285,7 @@ def job_cards():
         job_cards = cursor.fetchall()
         
         # Get vehicles for filter
-        cursor.execute("SELECT id, vehicle_number, make, model FROM vehicles ORDER BY vehicle_number")
-        vehicles = cursor.fetchall()
+        vehicles = reference_data.vehicles()
         
         return render_template('job_cards.html', 
                              job_cards=job_cards,
@@ -2358,6 +2347,7 @@ def create_job_card():
                 """, (job_card_number, requisition_id))
             
             conn.commit()
+            table_versions.bump('job_cards', 'service_requisitions')
             
             flash(f'Job Card {job_card_number} created successfully!', 'success')
             return redirect(url_for('view_job_card', job_card_id=job_card_id))
@@ -2369,11 +2359,8 @@ def create_job_card():
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id, vehicle_number, make, model FROM vehicles ORDER BY vehicle_number")
-        vehicles = cursor.fetchall()
-        
-        cursor.execute("SELECT id, username FROM employees ORDER BY username")
-        technicians = cursor.fetchall()
+        vehicles = reference_data.vehicles()
+        technicians = reference_data.employees()
         
         # Check if creating from requisition
         requisition_id = request.args.get('requisition_id')
@@ -2596,6 +2583,7 @@ def edit_job_card(job_card_id):
                         print(f"WhatsApp notification error: {e}")
             
             conn.commit()
+            table_versions.bump('job_cards', 'service_maintenance', 'vehicles')
             if status != 'completed' or old_status == 'completed':
                 flash('Job card updated successfully!', 'success')
             
@@ -2620,8 +2608,7 @@ def edit_job_card(job_card_id):
             flash('Job card not found!', 'danger')
             return redirect(url_for('job_cards'))
         
-        cursor.execute("SELECT id, username FROM employees ORDER BY username")
-        technicians = cursor.fetchall()
+        technicians = reference_data.employees()
         
         return render_template('edit_job_card.html', job_card=job_card, technicians=technicians)
     finally:
@@ -2670,6 +2657,7 @@ def add_job_card_item(job_card_id):
         """, (parts_cost, labor_cost, total_cost, job_card_id))
         
         conn.commit()
+        table_versions.bump('job_cards')
         flash('Item added successfully!', 'success')
     finally:
         cursor.close()
@@ -2708,6 +2696,7 @@ def delete_job_card_item(item_id, job_card_id):
         """, (parts_cost, labor_cost, total_cost, job_card_id))
         
         conn.commit()
+        table_versions.bump('job_cards')
         flash('Item deleted successfully!', 'success')
     finally:
         cursor.close()
@@ -2766,6 +2755,7 @@ def delete_job_card(job_card_id):
     try:
         cursor.execute("DELETE FROM job_cards WHERE id = %s", (job_card_id,))
         conn.commit()
+        table_versions.bump('job_cards')
         flash('Job card deleted successfully!', 'success')
     finally:
         cursor.close()
@@ -3077,6 +3067,7 @@ def update_settings():
                 """, (value, session['employee_id'], setting_key))
         
         conn.commit()
+        table_versions.bump('settings')
         flash('Settings updated successfully!', 'success')
     except Exception as e:
         conn.rollback()
@@ -3139,6 +3130,7 @@ def profile_settings():
                     return redirect(url_for('profile_settings'))
             
             conn.commit()
+            table_versions.bump('employees')
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('profile_settings'))
         except Exception as e:
@@ -3347,6 +3339,7 @@ def update_print_settings():
             """, (setting_key, setting_value, f'Print setting for {setting_key.replace("_", " ")}'))
         
         conn.commit()
+        table_versions.bump('settings')
         flash('Print settings updated successfully!', 'success')
     except Exception as e:
         conn.rollback()
@@ -3518,6 +3511,7 @@ def test_whatsapp():
 # Service Requisition Routes
 @app.route('/employee/service_requisitions')
 @login_required
+@conditional_view('service_requisitions', 'vehicles')
 def service_requisitions_list():
     if 'employee_id' not in session:
         flash('Access denied!', 'danger')
@@ -3595,6 +3589,7 @@ def create_service_requisition():
                   work_description, session['employee_id'], service_history))
             
             conn.commit()
+            table_versions.bump('service_requisitions')
             flash('Service requisition created successfully!', 'success')
             return redirect(url_for('service_requisitions_list'))
         except Exception as e:
@@ -3725,6 +3720,7 @@ def review_service_requisition(requisition_id):
             flash(f'Requisition {status} by director!', 'success')
         
         conn.commit()
+        table_versions.bump('service_requisitions')
         return redirect(url_for('view_service_requisition', requisition_id=requisition_id))
         
     except Exception as e:
@@ -3823,6 +3819,7 @@ def edit_employee(emp_id):
             """, (username, email, department, position, role, status, phone, emp_id))
             
             conn.commit()
+            table_versions.bump('employees')
             flash('Employee updated successfully!', 'success')
             return redirect(url_for('manage_employees'))
         
@@ -3871,6 +3868,8 @@ def delete_employee(emp_id):
         
         cursor.execute("DELETE FROM employees WHERE id = %s", (emp_id,))
         conn.commit()
+        plan_limits.adjust(g.get('tenant_db'), 'users', -cursor.rowcount)
+        table_versions.bump('employees', 'fuel_records', 'vehicle_assignments')
         
         flash('Employee deleted successfully!', 'success')
         return redirect(url_for('manage_employees'))
@@ -3915,6 +3914,7 @@ def toggle_employee_status(emp_id):
         new_status = 'inactive' if employee['status'] == 'active' else 'active'
         cursor.execute("UPDATE employees SET status = %s WHERE id = %s", (new_status, emp_id))
         conn.commit()
+        table_versions.bump('employees')
         
         flash(f'Employee status changed to {new_status}!', 'success')
         return redirect(url_for('manage_employees'))
@@ -4000,6 +4000,7 @@ def edit_role(role_id):
                 """, (role_id, perm_id))
             
             conn.commit()
+            table_versions.bump('settings')
             flash('Role permissions updated successfully!', 'success')
             return redirect(url_for('manage_roles'))
         
@@ -4100,6 +4101,7 @@ def create_role():
                 """, (role_id, perm_id))
             
             conn.commit()
+            table_versions.bump('settings')
             flash('Role created successfully!', 'success')
             return redirect(url_for('manage_roles'))
         
@@ -4173,6 +4175,7 @@ def delete_role(role_id):
         # Delete role (permissions will be deleted by CASCADE)
         cursor.execute("DELETE FROM roles WHERE id = %s", (role_id,))
         conn.commit()
+        table_versions.bump('settings')
         
         flash('Role deleted successfully!', 'success')
         return redirect(url_for('manage_roles'))
@@ -4439,229 +4442,41 @@ def upload_import_data():
         flash('Only .xlsx files are allowed!', 'danger')
         return redirect(url_for('data_import'))
     
-    try:
-        from openpyxl import load_workbook
-        from datetime import datetime
-        
-        wb = load_workbook(file)
-        ws = wb.active
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        success_count = 0
-        error_count = 0
-        errors = []
-        
-        # Skip header row
-        rows = list(ws.iter_rows(min_row=2, values_only=True))
-        
-        if data_type == 'vehicles':
-            for idx, row in enumerate(rows, start=2):
-                # Skip empty rows or notes section
-                if not row[0] or str(row[0]).startswith('Notes'):
-                    continue
-                
-                try:
-                    vehicle_number, make, model, year, color, vehicle_type, status, mileage, last_service_date, expected_fuel_consumption, notes = row[:11]
-                    
-                    # Required fields
-                    if not all([vehicle_number, make, model, year]):
-                        errors.append(f"Row {idx}: Missing required fields")
-                        error_count += 1
-                        continue
-                    
-                    # Check if vehicle already exists
-                    cursor.execute("SELECT id FROM vehicles WHERE vehicle_number = %s", (vehicle_number,))
-                    if cursor.fetchone():
-                        errors.append(f"Row {idx}: Vehicle {vehicle_number} already exists")
-                        error_count += 1
-                        continue
-                    
-                    # Parse date
-                    if last_service_date:
-                        if isinstance(last_service_date, str):
-                            last_service_date = datetime.strptime(last_service_date, '%Y-%m-%d').date()
-                    
-                    cursor.execute("""
-                        INSERT INTO vehicles 
-                        (vehicle_number, make, model, year, color, vehicle_type, 
-                         status, mileage, last_service_date, expected_fuel_consumption, notes)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (vehicle_number, make, model, year, color, vehicle_type,
-                          status or 'available', mileage, last_service_date, expected_fuel_consumption, notes))
-                    
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {idx}: {str(e)}")
-                    error_count += 1
-        
-        elif data_type == 'employees':
-            for idx, row in enumerate(rows, start=2):
-                if not row[0] or str(row[0]).startswith('Notes'):
-                    continue
-                
-                try:
-                    username, email, password, employee_id, phone, department, position, status = row[:8]
-                    
-                    if not all([username, email, password, employee_id]):
-                        errors.append(f"Row {idx}: Missing required fields")
-                        error_count += 1
-                        continue
-                    
-                    # Check if employee exists
-                    cursor.execute("SELECT id FROM employees WHERE username = %s OR email = %s OR employee_id = %s", (username, email, employee_id))
-                    if cursor.fetchone():
-                        errors.append(f"Row {idx}: Employee {username}, email, or employee ID already exists")
-                        error_count += 1
-                        continue
-                    
-                    # Hash password
-                    hashed_password = generate_password_hash(password)
-                    
-                    cursor.execute("""
-                        INSERT INTO employees 
-                        (username, email, password_hash, employee_id, phone, department, 
-                         position, status)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (username, email, hashed_password, employee_id, phone, department,
-                          position, status or 'active'))
-                    
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {idx}: {str(e)}")
-                    error_count += 1
-        
-        elif data_type == 'fuel_records':
-            # Detect whether the `payment_method` column exists in the fuel_records table
-            try:
-                cursor.execute("SHOW COLUMNS FROM fuel_records LIKE 'payment_method'")
-                has_payment_column = cursor.fetchone() is not None
-            except Exception:
-                has_payment_column = False
-
-            for idx, row in enumerate(rows, start=2):
-                if not row[0] or str(row[0]).startswith('Notes'):
-                    continue
-                
-                try:
-                    # Safely unpack up to 9 columns, padding missing values with None
-                    vals = list(row) + [None] * 9
-                    vehicle_number, employee_username, fuel_date, fuel_amount, fuel_cost, odometer, fuel_type, station, payment = vals[:9]
+    from bulk_import import BulkImporter, import_progress
 
-                    # Trim strings
-                    if isinstance(vehicle_number, str):
-                        vehicle_number = vehicle_number.strip()
-                    if isinstance(employee_username, str):
-                        employee_username = employee_username.strip()
-                    if isinstance(fuel_type, str):
-                        fuel_type = fuel_type.strip()
-                    if isinstance(station, str):
-                        station = station.strip()
-                    if isinstance(payment, str):
-                        payment = payment.strip()
+    if data_type not in BulkImporter.DATA_TYPES:
+        flash('Unknown import type!', 'danger')
+        return redirect(url_for('data_import'))
 
-                    # Sanitize numeric fields: remove currency symbols/commas and convert
-                    def _to_float(val):
-                        if val is None:
-                            return None
-                        if isinstance(val, (int, float)):
-                            return float(val)
-                        s = str(val).strip()
-                        # Remove common currency symbols and thousands separators
-                        s = s.replace('$', '').replace('€', '').replace('£', '')
-                        s = s.replace(',', '')
-                        if s == '':
-                            return None
-                        try:
-                            return float(s)
-                        except Exception:
-                            raise ValueError(f"Invalid numeric value: {val}")
+    # Set by the upload form so the page can poll /data-import/progress/<id>
+    import_id = request.form.get('import_id')
+    tenant = g.get('tenant_db')
+    import_progress.start(tenant, import_id, data_type)
 
-                    def _to_int(val):
-                        if val is None or val == '':
-                            return None
-                        if isinstance(val, int):
-                            return val
-                        try:
-                            return int(float(str(val).strip().replace(',', '')))
-                        except Exception:
-                            raise ValueError(f"Invalid integer value: {val}")
+    # Vehicles and employees count against the plan; rows beyond it are rejected
+    limit_type = {'vehicles': 'vehicles', 'employees': 'users'}.get(data_type)
+    max_rows = plan_limits.remaining(tenant, limit_type) if tenant and limit_type else None
 
-                    try:
-                        fuel_amount = _to_float(fuel_amount)
-                    except Exception as e:
-                        errors.append(f"Row {idx}: fuel_amount conversion error: {e} - data: {row}")
-                        error_count += 1
-                        continue
-
-                    try:
-                        fuel_cost = _to_float(fuel_cost)
-                    except Exception as e:
-                        errors.append(f"Row {idx}: fuel_cost conversion error: {e} - data: {row}")
-                        error_count += 1
-                        continue
-
-                    try:
-                        odometer = _to_int(odometer)
-                    except Exception as e:
-                        errors.append(f"Row {idx}: odometer conversion error: {e} - data: {row}")
-                        error_count += 1
-                        continue
+    conn = get_db_connection()
+    try:
+        def report_progress(**values):
+            import_progress.update(tenant, import_id, **values)
 
-                    if not all([vehicle_number, employee_username, fuel_date, fuel_amount is not None, fuel_cost is not None]):
-                        errors.append(f"Row {idx}: Missing required fields")
-                        error_count += 1
-                        continue
-                    
-                    # Get vehicle ID
-                    cursor.execute("SELECT id FROM vehicles WHERE vehicle_number = %s", (vehicle_number,))
-                    vehicle = cursor.fetchone()
-                    if not vehicle:
-                        errors.append(f"Row {idx}: Vehicle {vehicle_number} not found")
-                        error_count += 1
-                        continue
-                    
-                    # Get employee ID
-                    cursor.execute("SELECT id FROM employees WHERE username = %s", (employee_username,))
-                    employee = cursor.fetchone()
-                    if not employee:
-                        errors.append(f"Row {idx}: Employee {employee_username} not found")
-                        error_count += 1
-                        continue
-                    
-                    # Parse datetime
-                    if isinstance(fuel_date, str):
-                        fuel_date = datetime.strptime(fuel_date, '%Y-%m-%d %H:%M')
-                    
-                    if has_payment_column:
-                        cursor.execute("""
-                            INSERT INTO fuel_records 
-                            (vehicle_id, employee_id, fuel_date, fuel_amount, fuel_cost, 
-                             odometer_reading, fuel_type, station_name, payment_method)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (vehicle['id'], employee['id'], fuel_date, fuel_amount, fuel_cost,
-                              odometer, fuel_type, station, payment))
-                    else:
-                        cursor.execute("""
-                            INSERT INTO fuel_records 
-                            (vehicle_id, employee_id, fuel_date, fuel_amount, fuel_cost, 
-                             odometer_reading, fuel_type, station_name)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (vehicle['id'], employee['id'], fuel_date, fuel_amount, fuel_cost,
-                              odometer, fuel_type, station))
+        importer = BulkImporter(conn, data_type, progress=report_progress, max_rows=max_rows)
+        result = importer.run(file)
+        import_progress.update(tenant, import_id, status='done')
+        if data_type == 'fuel_records' and result['imported']:
+            table_versions.bump('fuel_records')
+        if limit_type:
+            plan_limits.adjust(tenant, limit_type, result['imported'])
+            if result['imported']:
+                table_versions.bump(data_type)
 
-                    success_count += 1
+        success_count = result['imported']
+        error_count = result['failed']
+        errors = result['errors']
+        print(f"✓ Imported {success_count} {data_type} ({error_count} failed, {importer.rows_read} rows read)")
 
-                except Exception as e:
-                    # Include row data to aid debugging of malformed rows or schema mismatches
-                    errors.append(f"Row {idx}: {str(e)} - data: {row}")
-                    error_count += 1
-        
-        conn.commit()
-        
         # Show results
         if success_count > 0:
             flash(f'Successfully imported {success_count} records!', 'success')
@@ -4676,12 +4491,24 @@ def upload_import_data():
         return redirect(url_for('data_import'))
         
     except Exception as e:
+        import_progress.update(tenant, import_id, status='failed')
         flash(f'Error processing file: {str(e)}', 'danger')
         return redirect(url_for('data_import'))
     finally:
-        cursor.close()
         conn.close()
 
+@app.route('/data-import/progress/<import_id>')
+def data_import_progress(import_id):
+    if 'employee_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    from bulk_import import import_progress
+
+    job = import_progress.get(g.get('tenant_db'), import_id)
+    if job is None:
+        return jsonify({'status': 'unknown'}), 404
+    return jsonify(job)
+
 # Fuel Exceptions Report
 @app.route('/fuel-exceptions-report')
 def fuel_exceptions_report():
@@ -4689,7 +4516,7 @@ def fuel_exceptions_report():
         flash('Please log in to access this page.', 'warning')
         return redirect(url_for('employee_login'))
     
-    conn = get_db_connection()
+    conn = get_read_db_connection()
     cursor = conn.cursor()
     
     try:
@@ -4806,8 +4633,7 @@ def fuel_exceptions_report():
         }
         
         # Get vehicles list for filter
-        cursor.execute("SELECT id, vehicle_number, make, model FROM vehicles ORDER BY vehicle_number")
-        vehicles = cursor.fetchall()
+        vehicles = reference_data.vehicles()
         
         return render_template('fuel_exceptions_report.html',
                              exceptions=exceptions,
@@ -4831,30 +4657,16 @@ def api_vehicles():
     if 'employee_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
-            SELECT id, vehicle_number, make, model, year, status
-            FROM vehicles
-            ORDER BY vehicle_number
-        """)
-        vehicles = cursor.fetchall()
-        
-        return jsonify([{
-            'id': v['id'],
-            'vehicle_number': v['vehicle_number'],
-            'make': v['make'],
-            'model': v['model'],
-            'year': v['year'],
-            'status': v['status'],
-            'display_name': f"{v['vehicle_number']} - {v['make']} {v['model']}"
-        } for v in vehicles])
-    
-    finally:
-        cursor.close()
-        conn.close()
+    # Cached per tenant; 304 while the vehicle list is unchanged
+    return reference_data.json_response('vehicles', lambda vehicles: [{
+        'id': v['id'],
+        'vehicle_number': v['vehicle_number'],
+        'make': v['make'],
+        'model': v['model'],
+        'year': v['year'],
+        'status': v['status'],
+        'display_name': f"{v['vehicle_number']} - {v['make']} {v['model']}"
+    } for v in vehicles])
 
 
 @app.route('/api/employees')
@@ -4864,28 +4676,14 @@ def api_employees():
     if 'employee_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
-            SELECT id, username, email, employee_id, department, position, status
-            FROM employees
-            ORDER BY username
-        """)
-        employees = cursor.fetchall()
-        
-        return jsonify([{
-            'id': e['id'],
-            'username': e['username'],
-            'email': e['email'],
-            'employee_id': e['employee_id'],
-            'department': e['department'],
-            'position': e['position'],
-            'status': e['status'],
-            'display_name': f"{e['username']} ({e['employee_id'] if e['employee_id'] else 'No ID'})"
-        } for e in employees])
-    
-    finally:
-        cursor.close()
-        conn.close()
+    # Cached per tenant; 304 while the employee list is unchanged
+    return reference_data.json_response('employees', lambda employees: [{
+        'id': e['id'],
+        'username': e['username'],
+        'email': e['email'],
+        'employee_id': e['employee_id'],
+        'department': e['department'],
+        'position': e['position'],
+        'status': e['status'],
+        'display_name': f"{e['username']} ({e['employee_id'] if e['employee_id'] else 'No ID'})"
+    } for e in employees])
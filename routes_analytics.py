@@ -2,39 +2,42 @@
 Analytics and Reporting Routes
 """
 
-from flask import Blueprint, render_template, request, jsonify, send_file, session, flash, redirect, url_for, g
+from flask import Blueprint, render_template, request, jsonify, send_file, session, flash, redirect, url_for, g, current_app
 from functools import wraps
 import pymysql
 from datetime import date, datetime, timedelta
-import pandas as pd
 import io
 import os
 import json
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-import matplotlib
-matplotlib.use('Agg')  # Use non-GUI backend
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from io import BytesIO
-import base64
+from lazy_imports import lazy_module
 from audit_logger import audit_logger
+import db_metrics
 import time
 from permission_manager import require_permission, permission_manager, get_permission_context
+from query_fanout import query_fanout, QueryDeadlineExceeded
+import analytics_dashboard
+from response_cache import cached_response
+from table_versions import conditional_view
+
+# Heavy report libraries are imported on first export, not at worker start
+pd = lazy_module('pandas')
 
 analytics_bp = Blueprint('analytics', __name__, url_prefix='/analytics')
 
-def get_db_connection():
-    """Get database connection for current tenant or default database"""
+def get_db_connection(primary=False):
+    """
+    Get database connection for current tenant or default database
+    Analytics reads go to the shard's read replica when it is healthy
+    (read-only session); views that write pass primary=True
+    """
     if hasattr(g, 'tenant_db'):
+        if not primary:
+            from read_replica import replica_router
+            return replica_router.connect(g.tenant_db)
         from tenant_manager import TenantDatabaseManager
         return TenantDatabaseManager.get_tenant_connection(g.tenant_db)
     else:
-        return pymysql.connect(
+        return db_metrics.connect(
             host='localhost',
             user='root',
             password='ts#h3ph3rd',
@@ -113,6 +116,8 @@ def fuel_cost_summary():
 
 @analytics_bp.route('/api/maintenance-cost-summary')
 @login_required
+@conditional_view('service_maintenance', 'vehicles')
+@cached_response(tags=('service_maintenance', 'vehicles'))
 def get_maintenance_cost_summary():
     """Get maintenance cost summary data for selected period"""
     start_date = request.args.get('start_date')
@@ -170,6 +175,8 @@ def get_maintenance_cost_summary():
 
 @analytics_bp.route('/api/fuel-cost-summary')
 @login_required
+@conditional_view('fuel_records', 'vehicles')
+@cached_response(tags=('fuel_records', 'vehicles'))
 def get_fuel_cost_summary():
     """Get fuel cost summary data for selected period"""
     start_date = request.args.get('start_date')
@@ -227,111 +234,105 @@ def get_fuel_cost_summary():
 
 @analytics_bp.route('/api/dashboard-stats')
 @login_required
+@conditional_view('vehicles', 'fuel_records', 'vehicle_assignments', 'service_maintenance')
 def get_dashboard_stats():
     """Get key statistics for dashboard"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Get user role and build data filter
+    role_filter = ""
+    filter_params = []
+    
+    if not permission_manager.has_permission('view_all_reports'):
+        # Employee: filter to only their own records
+        current_user_id = session.get('employee_id')
+        role_filter = " AND employee_id = %s"
+        filter_params = [current_user_id]
     
     try:
-        stats = {}
-        
-        # Get user role and build data filter
-        role_filter = ""
-        filter_params = []
-        
-        if not permission_manager.has_permission('view_all_reports'):
-            # Employee: filter to only their own records
-            current_user_id = session.get('employee_id')
-            role_filter = " AND employee_id = %s"
-            filter_params = [current_user_id]
-        
-        # Total vehicles and status breakdown
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'in_use' THEN 1 ELSE 0 END) as in_use,
-                SUM(CASE WHEN status = 'available' THEN 1 ELSE 0 END) as available,
-                SUM(CASE WHEN status = 'maintenance' THEN 1 ELSE 0 END) as maintenance
-            FROM vehicles
-        """)
-        vehicle_stats = cursor.fetchone()
-        stats['vehicles'] = vehicle_stats
-        
-        # Fuel statistics (last 30 days) - filtered by role
-        fuel_query = f"""
-            SELECT 
-                COUNT(*) as total_records,
-                COALESCE(SUM(fuel_amount), 0) as total_liters,
-                COALESCE(SUM(fuel_cost), 0) as total_cost,
-                COALESCE(AVG(fuel_cost / fuel_amount), 0) as avg_price_per_liter
-            FROM fuel_records
-            WHERE DATE(fuel_date) >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            {role_filter if role_filter else ''}
-        """
-        cursor.execute(fuel_query, filter_params)
-        fuel_stats = cursor.fetchone()
-        stats['fuel'] = {
-            'total_records': fuel_stats['total_records'],
-            'total_liters': float(fuel_stats['total_liters'] or 0),
-            'total_cost': float(fuel_stats['total_cost'] or 0),
-            'avg_price_per_liter': float(fuel_stats['avg_price_per_liter'] or 0)
-        }
-        
-        # Active assignments - filtered by role
-        assignment_query = f"""
-            SELECT COUNT(*) as active_assignments
-            FROM vehicle_assignments
-            WHERE status = 'active'
-            {role_filter if role_filter else ''}
-        """
-        cursor.execute(assignment_query, filter_params)
-        stats['active_assignments'] = cursor.fetchone()['active_assignments']
-        
-        # Maintenance statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_services,
-                COALESCE(SUM(cost), 0) as total_cost,
-                SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
-            FROM service_maintenance
-            WHERE DATE(service_date) >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)
-        """)
-        maintenance_stats = cursor.fetchone()
-        stats['maintenance'] = {
-            'total_services': maintenance_stats['total_services'],
-            'total_cost': float(maintenance_stats['total_cost'] or 0),
-            'pending': maintenance_stats['pending'],
-            'completed': maintenance_stats['completed']
+        # The five statistics are independent: run them concurrently on pooled connections
+        results = query_fanout.run({
+            # Total vehicles and status breakdown
+            'vehicles': ("""
+                SELECT 
+                    COUNT(*) as total,
+                    SUM(CASE WHEN status = 'in_use' THEN 1 ELSE 0 END) as in_use,
+                    SUM(CASE WHEN status = 'available' THEN 1 ELSE 0 END) as available,
+                    SUM(CASE WHEN status = 'maintenance' THEN 1 ELSE 0 END) as maintenance
+                FROM vehicles
+            """, None, 'one'),
+            # Fuel statistics (last 30 days) - filtered by role
+            'fuel': (f"""
+                SELECT 
+                    COUNT(*) as total_records,
+                    COALESCE(SUM(fuel_amount), 0) as total_liters,
+                    COALESCE(SUM(fuel_cost), 0) as total_cost,
+                    COALESCE(AVG(fuel_cost / fuel_amount), 0) as avg_price_per_liter
+                FROM fuel_records
+                WHERE DATE(fuel_date) >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+                {role_filter if role_filter else ''}
+            """, filter_params, 'one'),
+            # Active assignments - filtered by role
+            'assignments': (f"""
+                SELECT COUNT(*) as active_assignments
+                FROM vehicle_assignments
+                WHERE status = 'active'
+                {role_filter if role_filter else ''}
+            """, filter_params, 'one'),
+            # Maintenance statistics
+            'maintenance': ("""
+                SELECT 
+                    COUNT(*) as total_services,
+                    COALESCE(SUM(cost), 0) as total_cost,
+                    SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending,
+                    SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
+                FROM service_maintenance
+                WHERE DATE(service_date) >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)
+            """, None, 'one'),
+            # Vehicle utilization (assignments per vehicle in last 30 days)
+            'top_utilized': ("""
+                SELECT 
+                    v.id, v.make, v.model, v.vehicle_number,
+                    COUNT(va.id) as assignment_count
+                FROM vehicles v
+                LEFT JOIN vehicle_assignments va ON v.id = va.vehicle_id 
+                    AND DATE(va.assignment_date) >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+                GROUP BY v.id, v.make, v.model, v.vehicle_number
+                HAVING assignment_count > 0
+                ORDER BY assignment_count DESC
+                LIMIT 10
+            """, None, 'all'),
+        }, replica=True)
+        
+        fuel_stats = results['fuel']
+        maintenance_stats = results['maintenance']
+        stats = {
+            'vehicles': results['vehicles'],
+            'fuel': {
+                'total_records': fuel_stats['total_records'],
+                'total_liters': float(fuel_stats['total_liters'] or 0),
+                'total_cost': float(fuel_stats['total_cost'] or 0),
+                'avg_price_per_liter': float(fuel_stats['avg_price_per_liter'] or 0)
+            },
+            'active_assignments': results['assignments']['active_assignments'],
+            'maintenance': {
+                'total_services': maintenance_stats['total_services'],
+                'total_cost': float(maintenance_stats['total_cost'] or 0),
+                'pending': maintenance_stats['pending'],
+                'completed': maintenance_stats['completed']
+            },
+            'top_utilized': results['top_utilized'],
         }
         
-        # Vehicle utilization (assignments per vehicle in last 30 days)
-        cursor.execute("""
-            SELECT 
-                v.id, v.make, v.model, v.vehicle_number,
-                COUNT(va.id) as assignment_count
-            FROM vehicles v
-            LEFT JOIN vehicle_assignments va ON v.id = va.vehicle_id 
-                AND DATE(va.assignment_date) >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            GROUP BY v.id, v.make, v.model, v.vehicle_number
-            HAVING assignment_count > 0
-            ORDER BY assignment_count DESC
-            LIMIT 10
-        """)
-        stats['top_utilized'] = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
         return jsonify(stats)
         
+    except QueryDeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
-        cursor.close()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/api/fuel-costs-chart')
 @login_required
+@conditional_view('fuel_records', 'vehicles')
+@cached_response(tags=('fuel_records', 'vehicles'))
 def get_fuel_costs_chart():
     """Get fuel costs data for chart (by vehicle, last 6 months)"""
     conn = get_db_connection()
@@ -401,6 +402,8 @@ def get_fuel_costs_chart():
 
 @analytics_bp.route('/api/vehicle-utilization')
 @login_required
+@conditional_view('vehicle_assignments', 'vehicles')
+@cached_response(tags=('vehicle_assignments', 'vehicles'))
 def get_vehicle_utilization():
     """Get vehicle utilization rates"""
     conn = get_db_connection()
@@ -456,6 +459,8 @@ def get_vehicle_utilization():
 
 @analytics_bp.route('/api/maintenance-schedule')
 @login_required
+@conditional_view('service_maintenance', 'vehicles')
+@cached_response(tags=('service_maintenance', 'vehicles'))
 def get_maintenance_schedule():
     """Get upcoming maintenance schedule"""
     conn = get_db_connection()
@@ -493,6 +498,8 @@ def get_maintenance_schedule():
 
 @analytics_bp.route('/api/fuel-efficiency-trends')
 @login_required
+@conditional_view('fuel_records', 'vehicles')
+@cached_response(tags=('fuel_records', 'vehicles'))
 def get_fuel_efficiency_trends():
     """Calculate fuel efficiency (km/liter) trends"""
     conn = get_db_connection()
@@ -561,6 +568,37 @@ def get_fuel_efficiency_trends():
         conn.close()
         return jsonify({'error': str(e)}), 500
 
+def dashboard_scope():
+    """Employees without view_all_reports only see their own fuel and assignment figures"""
+    if permission_manager.has_permission('view_all_reports'):
+        return None
+    return session.get('employee_id')
+
+@analytics_bp.route('/api/dashboard-payload')
+@login_required
+@conditional_view('vehicles', 'fuel_records', 'vehicle_assignments', 'service_maintenance')
+@cached_response(ttl=analytics_dashboard.DASHBOARD_CACHE_SECONDS, tags=('vehicles', 'fuel_records', 'vehicle_assignments', 'service_maintenance'),
+                 vary=lambda: str(dashboard_scope()))
+def get_dashboard_payload():
+    """
+    Every dashboard widget in one response, built from shared query results
+    ?widgets=stats,fuel_costs,utilization,efficiency,maintenance_schedule (default: all)
+    """
+    try:
+        widgets = analytics_dashboard.parse_widgets(request.args.get('widgets'))
+        days = int(request.args.get('days', 30))
+        if days <= 0:
+            raise ValueError("days must be positive")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return jsonify(analytics_dashboard.build_payload(widgets, dashboard_scope(), days))
+    except QueryDeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ===========================
 # CUSTOM REPORT BUILDER
 # ===========================
@@ -841,6 +879,13 @@ def export_to_pdf():
         report_type = 'maintenance_costs'
     
     try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib import colors
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.enums import TA_CENTER
+
         # Create PDF
         output = io.BytesIO()
         doc = SimpleDocTemplate(
@@ -1117,7 +1162,7 @@ def create_scheduled_report():
         if employee_ids:
             filters['employee_ids'] = employee_ids
         
-        conn = get_db_connection()
+        conn = get_db_connection(primary=True)
         cursor = conn.cursor()
         
         try:
@@ -1148,7 +1193,7 @@ def create_scheduled_report():
             conn.close()
             
             # Add to scheduler
-            scheduled_reports_manager.schedule_report(new_report)
+            scheduled_reports_manager.schedule_report(new_report, g.get('tenant_db'))
             
             # Log report creation
             audit_logger.log_action(
@@ -1195,7 +1240,7 @@ def create_scheduled_report():
 @login_required
 def toggle_scheduled_report(report_id):
     """Enable/disable a scheduled report"""
-    conn = get_db_connection()
+    conn = get_db_connection(primary=True)
     cursor = conn.cursor()
     
     try:
@@ -1229,7 +1274,7 @@ def toggle_scheduled_report(report_id):
 @login_required
 def delete_scheduled_report(report_id):
     """Delete a scheduled report"""
-    conn = get_db_connection()
+    conn = get_db_connection(primary=True)
     cursor = conn.cursor()
     
     try:
@@ -1270,7 +1315,7 @@ def run_scheduled_report_now(report_id):
     from scheduler import scheduled_reports_manager
     
     try:
-        scheduled_reports_manager.execute_scheduled_report(report_id)
+        scheduled_reports_manager.execute_scheduled_report(report_id, g.get('tenant_db'))
         
         # Log execution
         execution_time = int((time.time() - start_time) * 1000)
@@ -1563,3 +1608,37 @@ def export_audit_log():
         cursor.close()
         conn.close()
         return jsonify({'error': str(e)}), 500
+
+
+# ===========================
+# SLOW QUERY LOG
+# ===========================
+
+@analytics_bp.route('/slow-queries')
+@login_required
+@require_permission('manage_permissions')
+def slow_queries():
+    """Slow query log for the current tenant, sorted by total time (admin only)"""
+    from slow_query_log import slow_query_log
+    
+    tenant = db_metrics.current_labels()['tenant']
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    entries = slow_query_log.get_entries(tenant=tenant, limit=limit)
+    
+    return render_template('slow_queries.html',
+                         entries=entries,
+                         tenant=tenant,
+                         enabled=slow_query_log.enabled,
+                         threshold_ms=slow_query_log.threshold_ms)
+
+
+@analytics_bp.route('/slow-queries/reset', methods=['POST'])
+@login_required
+@require_permission('manage_permissions')
+def reset_slow_queries():
+    """Clear collected slow queries for the current tenant"""
+    from slow_query_log import slow_query_log
+    
+    slow_query_log.reset(tenant=db_metrics.current_labels()['tenant'])
+    flash('Slow query statistics cleared.', 'success')
+    return redirect(url_for('analytics.slow_queries'))
@@ -97,13 +97,13 @@ def tenant_signup():
             
             # Create tenant database
             database_name = company['database_name']
-            success = TenantDatabaseManager.create_tenant_database(database_name)
+            success = TenantDatabaseManager.create_tenant_database(database_name, company['shard_id'])
             
             if not success:
                 raise Exception("Failed to create tenant database")
             
             # Create admin user in tenant database
-            from werkzeug.security import generate_password_hash
+            from password_hasher import password_hasher
             import random
             import string
             
@@ -117,7 +117,7 @@ def tenant_signup():
                         INSERT INTO employees (employee_id, username, email, password_hash, role, status)
                         VALUES (%s, %s, %s, %s, %s, %s)
                     ''', (emp_id, admin_username, admin_email, 
-                          generate_password_hash(admin_password),
+                          password_hasher.hash(admin_password),
                           'Administrator', 'active'))
                     
                     employee_id = cursor.lastrowid
@@ -156,7 +156,7 @@ def tenant_signup():
                             conn.commit()
                 
                 if 'database_name' in locals():
-                    TenantDatabaseManager.drop_tenant_database(database_name)
+                    TenantDatabaseManager.drop_tenant_database(database_name, company['shard_id'])
             except:
                 pass
             
@@ -7,13 +7,14 @@ from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
 import pymysql
 from email_service import email_service
+from usage_metering import usage_meter
 import io
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 import json
+import time
+from lazy_imports import lazy_module
+
+# Imported on the first scheduled report run, not at worker start
+pd = lazy_module('pandas')
 
 class ScheduledReportsManager:
     """Manages scheduled report generation and email delivery"""
@@ -31,10 +32,13 @@ class ScheduledReportsManager:
             print("✓ Background scheduler started")
         
     def get_db_connection(self, database_name=None):
-        """Get database connection"""
+        """Get database connection (to `database_name` when given in multi-tenant mode)"""
         if self.app:
             with self.app.app_context():
-                from app import get_db_connection
+                from app import get_db_connection, MULTI_TENANT_ENABLED
+                if database_name and MULTI_TENANT_ENABLED:
+                    from tenant_manager import TenantDatabaseManager
+                    return TenantDatabaseManager.get_tenant_connection(database_name)
                 return get_db_connection()
         else:
             # Fallback for testing
@@ -42,6 +46,22 @@ class ScheduledReportsManager:
             db_config = TENANT_DATABASES.get(database_name) if database_name else TENANT_DATABASES['fleet_twt']
             return pymysql.connect(**db_config, cursorclass=pymysql.cursors.DictCursor)
     
+    def get_read_connection(self, database_name=None):
+        """Read-only connection to the report's database (its shard's replica when healthy)"""
+        if self.app and database_name:
+            from app import MULTI_TENANT_ENABLED
+            if MULTI_TENANT_ENABLED:
+                from read_replica import replica_router
+                return replica_router.connect(database_name)
+        return self.get_db_connection(database_name)
+
+    @staticmethod
+    def connection_database(conn):
+        """Name of the database a connection is using"""
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DATABASE() AS database_name")
+            return cursor.fetchone()['database_name']
+    
     def load_scheduled_reports(self):
         """Load all active scheduled reports and create jobs"""
         if self.jobs_loaded:
@@ -49,6 +69,7 @@ class ScheduledReportsManager:
         
         try:
             conn = self.get_db_connection()
+            database_name = self.connection_database(conn)
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -63,7 +84,7 @@ class ScheduledReportsManager:
             conn.close()
             
             for report in reports:
-                self.schedule_report(report)
+                self.schedule_report(report, database_name)
             
             self.jobs_loaded = True
             print(f"✓ Loaded {len(reports)} scheduled reports")
@@ -71,8 +92,8 @@ class ScheduledReportsManager:
         except Exception as e:
             print(f"✗ Error loading scheduled reports: {e}")
     
-    def schedule_report(self, report):
-        """Schedule a single report"""
+    def schedule_report(self, report, database_name=None):
+        """Schedule a single report stored in `database_name` (the tenant database)"""
         job_id = f"report_{report['id']}"
         
         # Remove existing job if present
@@ -94,7 +115,7 @@ class ScheduledReportsManager:
         self.scheduler.add_job(
             func=self.execute_scheduled_report,
             trigger=trigger,
-            args=[report['id']],
+            args=[report['id'], database_name],
             id=job_id,
             name=f"{report['report_name']} ({report['frequency']})",
             replace_existing=True
@@ -102,15 +123,16 @@ class ScheduledReportsManager:
         
         print(f"✓ Scheduled: {report['report_name']} ({report['frequency']})")
     
-    def execute_scheduled_report(self, report_id):
-        """Execute a scheduled report and send via email"""
+    def execute_scheduled_report(self, report_id, database_name=None):
+        """Execute a scheduled report stored in `database_name` and send via email"""
         print(f"\n{'='*60}")
         print(f"Executing scheduled report ID: {report_id}")
         print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*60}")
         
         try:
-            conn = self.get_db_connection()
+            conn = self.get_db_connection(database_name)
+            database_name = database_name or self.connection_database(conn)
             cursor = conn.cursor()
             
             # Get report details
@@ -141,14 +163,19 @@ class ScheduledReportsManager:
             else:
                 start_date = end_date - timedelta(days=30)
             
-            # Generate report data
-            report_data = self.generate_report_data(
-                cursor,
-                report['report_type'],
-                start_date,
-                end_date,
-                filters
-            )
+            # Generate report data on a read connection; bookkeeping stays on the primary
+            read_conn = self.get_read_connection(database_name)
+            try:
+                with read_conn.cursor() as read_cursor:
+                    report_data = self.generate_report_data(
+                        read_cursor,
+                        report['report_type'],
+                        start_date,
+                        end_date,
+                        filters
+                    )
+            finally:
+                read_conn.close()
             
             if not report_data:
                 print(f"⚠️  No data for report {report['report_name']}")
@@ -159,10 +186,16 @@ class ScheduledReportsManager:
                 return
             
             # Generate file based on format
+            render_started = time.time()
             if report['report_format'] == 'excel':
                 file_data = self.generate_excel_report(report, report_data, start_date, end_date)
             else:  # pdf
                 file_data = self.generate_pdf_report(report, report_data, start_date, end_date)
+            render_ms = round((time.time() - render_started) * 1000)
+            if database_name:
+                usage_meter.record(database_name, report_render_ms=render_ms)
+            else:
+                print(f"⚠️  Report {report_id}: tenant unknown, render time not metered")
             
             # Send email to recipients
             recipients = report['recipients'].split(',')
@@ -328,6 +361,11 @@ class ScheduledReportsManager:
     
     def generate_pdf_report(self, report, data, start_date, end_date):
         """Generate PDF report file"""
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet
+
         output = io.BytesIO()
         
         doc = SimpleDocTemplate(output, pagesize=letter)
@@ -0,0 +1,344 @@
+"""
+Tenant Database Shards
+Tenant databases can live on several MySQL servers. fleet_saas_main holds
+a shard registry (db_shards: host, port, user, the environment variable
+holding the password, a capacity weight and an optional read replica) and
+each company's shard_id. TenantDatabaseManager asks this registry where a
+tenant database lives; new tenants are placed on the active shard with the
+lowest tenants/weight. Read-only traffic is routed to the replica by
+read_replica.
+
+Shard 1 is the original server (TENANT_DB_BASE_CONFIG); companies without
+a shard_id live there.
+
+Usage:
+    python shard_manager.py --list
+    python shard_manager.py --add shard2 --host 127.0.0.1 --port 3307 --password-env SHARD2_PASSWORD --weight 100
+    python shard_manager.py --set-weight shard2 200
+    python shard_manager.py --set-status shard1 draining
+    python shard_manager.py --set-replica shard1 10.0.0.12:3306 --replica-password-env SHARD1_REPLICA_PASSWORD
+"""
+
+import threading
+import time
+import os
+
+DEFAULT_SHARD_ID = 1
+# Seconds shard definitions and tenant -> shard lookups are cached per process
+SHARD_CACHE_SECONDS = int(os.environ.get('SHARD_CACHE_SECONDS', 60))
+
+SHARD_STATUSES = ('active', 'draining', 'disabled')
+
+CREATE_DB_SHARDS_TABLE = """
+    CREATE TABLE IF NOT EXISTS db_shards (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) UNIQUE NOT NULL,
+        host VARCHAR(255) NOT NULL,
+        port INT NOT NULL DEFAULT 3306,
+        user VARCHAR(100) NOT NULL,
+        -- Name of the environment variable holding the password (NULL: default tenant password)
+        password_env VARCHAR(100) NULL,
+        capacity_weight INT NOT NULL DEFAULT 100,
+        status ENUM('active', 'draining', 'disabled') NOT NULL DEFAULT 'active',
+        -- Read-only replica of this server (NULL: none); user/password default to the primary's
+        replica_host VARCHAR(255) NULL,
+        replica_port INT NULL,
+        replica_user VARCHAR(100) NULL,
+        replica_password_env VARCHAR(100) NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+REPLICA_COLUMNS = (
+    ('replica_host', 'VARCHAR(255) NULL'),
+    ('replica_port', 'INT NULL'),
+    ('replica_user', 'VARCHAR(100) NULL'),
+    ('replica_password_env', 'VARCHAR(100) NULL'),
+)
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) AS found FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()['found'] > 0
+
+
+class ShardRegistry:
+    """Shard definitions and the tenant database -> shard map, cached per process"""
+
+    def __init__(self):
+        self._shards = None
+        self._shards_loaded_at = 0
+        # database_name -> (shard_id, expires_at)
+        self._tenant_shards = {}
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _base_config():
+        from tenant_manager import TenantDatabaseManager
+        return TenantDatabaseManager.TENANT_DB_BASE_CONFIG
+
+    # ----- schema -----
+
+    def ensure_schema(self, cursor):
+        """Create db_shards, seed the original server as shard 1 and add the companies shard columns"""
+        if self._schema_ready:
+            return
+        cursor.execute(CREATE_DB_SHARDS_TABLE)
+        for column, definition in REPLICA_COLUMNS:
+            if not _column_exists(cursor, 'db_shards', column):
+                cursor.execute(f"ALTER TABLE db_shards ADD COLUMN {column} {definition}")
+        base = self._base_config()
+        cursor.execute("""
+            INSERT IGNORE INTO db_shards (id, name, host, port, user, capacity_weight)
+            VALUES (%s, 'shard1', %s, %s, %s, 100)
+        """, (DEFAULT_SHARD_ID, base['host'], base.get('port', 3306), base['user']))
+        if not _column_exists(cursor, 'companies', 'shard_id'):
+            cursor.execute("ALTER TABLE companies ADD COLUMN shard_id INT NULL, ADD INDEX idx_shard (shard_id)")
+            cursor.execute("UPDATE companies SET shard_id = %s WHERE shard_id IS NULL", (DEFAULT_SHARD_ID,))
+        if not _column_exists(cursor, 'companies', 'write_fence_until'):
+            # Set while tenant_relocation moves the database; TenantMiddleware rejects writes until then
+            cursor.execute("ALTER TABLE companies ADD COLUMN write_fence_until DATETIME NULL")
+        self._schema_ready = True
+
+    # ----- lookups -----
+
+    def shards(self, refresh=False):
+        """
+        {shard_id: shard row}. If the registry cannot be read, the last loaded map
+        is served (retried after SHARD_CACHE_SECONDS); without one the error is raised.
+        """
+        with self._lock:
+            if not refresh and self._shards is not None and \
+                    time.monotonic() - self._shards_loaded_at < SHARD_CACHE_SECONDS:
+                return self._shards
+
+        from tenant_manager import TenantDatabaseManager
+        try:
+            with TenantDatabaseManager.main_db() as conn:
+                with conn.cursor() as cursor:
+                    self.ensure_schema(cursor)
+                    cursor.execute("SELECT * FROM db_shards ORDER BY id")
+                    shards = {row['id']: row for row in cursor.fetchall()}
+        except Exception as e:
+            with self._lock:
+                if self._shards is None:
+                    print(f"✗ Shard registry unavailable: {e}")
+                    raise
+                print(f"⚠️  Shard registry unavailable, keeping the last known shards: {e}")
+                self._shards_loaded_at = time.monotonic()
+                return self._shards
+
+        with self._lock:
+            self._shards = shards
+            self._shards_loaded_at = time.monotonic()
+        return shards
+
+    def get_shard(self, shard_id=None):
+        shard_id = shard_id or DEFAULT_SHARD_ID
+        shard = self.shards().get(shard_id)
+        if shard is None:
+            # Possibly added by another process since the last load
+            shard = self.shards(refresh=True).get(shard_id)
+        if shard is None:
+            raise KeyError(f"Unknown database shard {shard_id}")
+        return shard
+
+    def remember(self, database_name, shard_id):
+        """Record where a tenant database lives (tenant context, provisioning, relocation)"""
+        with self._lock:
+            self._tenant_shards[database_name] = (shard_id or DEFAULT_SHARD_ID,
+                                                  time.monotonic() + SHARD_CACHE_SECONDS)
+
+    def forget(self, database_name):
+        with self._lock:
+            self._tenant_shards.pop(database_name, None)
+
+    def shard_id_for(self, database_name):
+        """
+        Shard of a tenant database; databases that are not a company's live on shard 1.
+        If fleet_saas_main cannot be read, the last known shard is used even when
+        expired; without one the lookup fails rather than guessing a server.
+        """
+        with self._lock:
+            cached = self._tenant_shards.get(database_name)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+
+        from tenant_manager import TenantDatabaseManager
+        shard_id = DEFAULT_SHARD_ID
+        try:
+            with TenantDatabaseManager.main_db() as conn:
+                with conn.cursor() as cursor:
+                    self.ensure_schema(cursor)
+                    cursor.execute("SELECT shard_id FROM companies WHERE database_name = %s", (database_name,))
+                    row = cursor.fetchone()
+                    if row and row['shard_id']:
+                        shard_id = row['shard_id']
+        except Exception as e:
+            if cached is None:
+                print(f"✗ Shard lookup for {database_name} failed: {e}")
+                raise
+            print(f"⚠️  Shard lookup for {database_name} failed, using its last known shard {cached[0]}: {e}")
+            return cached[0]
+
+        self.remember(database_name, shard_id)
+        return shard_id
+
+    def server_config(self, shard_id=None):
+        """pymysql connect() arguments for a shard's server (no default database)"""
+        shard = self.get_shard(shard_id)
+        base = self._base_config()
+        config = dict(base)
+        config.update(host=shard['host'], port=int(shard['port']), user=shard['user'])
+        if shard.get('password_env'):
+            config['password'] = os.environ.get(shard['password_env'], '')
+        return config
+
+    def connection_config(self, database_name, shard_id=None):
+        """pymysql connect() arguments for a tenant database on its shard"""
+        config = self.server_config(shard_id or self.shard_id_for(database_name))
+        config['database'] = database_name
+        return config
+
+    def replica_config(self, database_name, shard_id=None):
+        """connect() arguments for the tenant database on its shard's replica, or None without one"""
+        shard = self.get_shard(shard_id or self.shard_id_for(database_name))
+        if not shard.get('replica_host'):
+            return None
+        config = self.server_config(shard['id'])
+        config.update(host=shard['replica_host'], port=int(shard['replica_port'] or 3306),
+                      database=database_name)
+        if shard.get('replica_user'):
+            config['user'] = shard['replica_user']
+        if shard.get('replica_password_env'):
+            config['password'] = os.environ.get(shard['replica_password_env'], '')
+        return config
+
+    # ----- placement -----
+
+    def choose_shard(self):
+        """Active shard with the lowest tenants-per-capacity-weight ratio"""
+        from tenant_manager import TenantDatabaseManager
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_schema(cursor)
+                cursor.execute("""
+                    SELECT s.id, s.name, s.capacity_weight, COUNT(c.id) AS tenants
+                    FROM db_shards s
+                    LEFT JOIN companies c ON c.shard_id = s.id
+                    WHERE s.status = 'active' AND s.capacity_weight > 0
+                    GROUP BY s.id, s.name, s.capacity_weight
+                """)
+                candidates = cursor.fetchall()
+        if not candidates:
+            return DEFAULT_SHARD_ID
+        best = min(candidates, key=lambda s: ((s['tenants'] + 1) / s['capacity_weight'], s['id']))
+        return best['id']
+
+    def placement_report(self):
+        """Tenants per shard with their share of the total weight"""
+        from tenant_manager import TenantDatabaseManager
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_schema(cursor)
+                cursor.execute("""
+                    SELECT s.id, s.name, s.host, s.port, s.status, s.capacity_weight,
+                           s.replica_host, s.replica_port, COUNT(c.id) AS tenants
+                    FROM db_shards s
+                    LEFT JOIN companies c ON c.shard_id = s.id
+                    GROUP BY s.id, s.name, s.host, s.port, s.status, s.capacity_weight, s.replica_host, s.replica_port
+                    ORDER BY s.id
+                """)
+                return cursor.fetchall()
+
+    # ----- administration -----
+
+    def add_shard(self, name, host, port=3306, user=None, password_env=None, capacity_weight=100):
+        from tenant_manager import TenantDatabaseManager
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_schema(cursor)
+                cursor.execute("""
+                    INSERT INTO db_shards (name, host, port, user, password_env, capacity_weight)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (name, host, port, user or self._base_config()['user'], password_env, capacity_weight))
+                shard_id = cursor.lastrowid
+        self.shards(refresh=True)
+        return shard_id
+
+    def update_shard(self, name, **values):
+        allowed = {k: v for k, v in values.items() if k in (
+            'capacity_weight', 'status', 'replica_host', 'replica_port', 'replica_user', 'replica_password_env')}
+        if 'status' in allowed and allowed['status'] not in SHARD_STATUSES:
+            raise ValueError(f"Status must be one of {', '.join(SHARD_STATUSES)}")
+        from tenant_manager import TenantDatabaseManager
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_schema(cursor)
+                assignments = ', '.join(f"{column} = %s" for column in allowed)
+                cursor.execute(f"UPDATE db_shards SET {assignments} WHERE name = %s",
+                               tuple(allowed.values()) + (name,))
+                updated = cursor.rowcount
+        self.shards(refresh=True)
+        return updated
+
+
+# Global instance
+shard_registry = ShardRegistry()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage tenant database shards')
+    parser.add_argument('--list', action='store_true', help='Show shards and tenants per shard')
+    parser.add_argument('--add', metavar='NAME', help='Register a new shard')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', help='MySQL user (default: the tenant base user)')
+    parser.add_argument('--password-env', help='Environment variable holding the password')
+    parser.add_argument('--weight', type=int, default=100, help='Capacity weight for placement')
+    parser.add_argument('--set-weight', nargs=2, metavar=('NAME', 'WEIGHT'))
+    parser.add_argument('--set-status', nargs=2, metavar=('NAME', 'STATUS'))
+    parser.add_argument('--set-replica', nargs=2, metavar=('NAME', 'HOST[:PORT]'),
+                        help="Read replica of a shard ('none' removes it)")
+    parser.add_argument('--replica-user', help='With --set-replica: MySQL user on the replica')
+    parser.add_argument('--replica-password-env', help='With --set-replica: environment variable holding its password')
+    args = parser.parse_args()
+
+    if args.add:
+        shard_id = shard_registry.add_shard(args.add, args.host, args.port, args.user,
+                                            args.password_env, args.weight)
+        print(f"✓ Shard {args.add} registered as id {shard_id}")
+    if args.set_weight:
+        shard_registry.update_shard(args.set_weight[0], capacity_weight=int(args.set_weight[1]))
+        print(f"✓ {args.set_weight[0]} capacity weight set to {args.set_weight[1]}")
+    if args.set_status:
+        shard_registry.update_shard(args.set_status[0], status=args.set_status[1])
+        print(f"✓ {args.set_status[0]} is now {args.set_status[1]}")
+    if args.set_replica:
+        name, address = args.set_replica
+        if address == 'none':
+            shard_registry.update_shard(name, replica_host=None, replica_port=None,
+                                        replica_user=None, replica_password_env=None)
+            print(f"✓ {name} has no read replica")
+        else:
+            host, _, port = address.partition(':')
+            shard_registry.update_shard(name, replica_host=host, replica_port=int(port or 3306),
+                                        replica_user=args.replica_user,
+                                        replica_password_env=args.replica_password_env)
+            print(f"✓ {name} reads go to the replica at {host}:{port or 3306}")
+
+    for shard in shard_registry.placement_report():
+        print(f"   {shard['id']:3d} {shard['name']:12s} {shard['host']}:{shard['port']:<6d} "
+              f"{shard['status']:9s} weight {shard['capacity_weight']:4d}  {shard['tenants']} tenants"
+              + (f"  replica {shard['replica_host']}:{shard['replica_port'] or 3306}" if shard['replica_host'] else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Slow Query Log
+Records statements slower than a threshold at the cursor layer, grouped by
+tenant and SQL fingerprint, with one EXPLAIN plan captured per fingerprint
+"""
+
+from logging.handlers import RotatingFileHandler
+from datetime import datetime, date
+from decimal import Decimal
+import threading
+import logging
+import pymysql
+import json
+import os
+
+import db_metrics
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+
+
+def redact_params(params):
+    """
+    Replace parameter values with type/size markers so the log never
+    contains user data (passwords, emails, names)
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        # executemany() batches: only the size is interesting
+        if params and isinstance(params[0], (list, tuple, dict)):
+            return [f'<batch:{len(params)}>']
+        return [_redact_value(value) for value in params]
+    return _redact_value(params)
+
+
+def _redact_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return f'<{type(value).__name__}:{len(value)}>'
+    if isinstance(value, (list, tuple, set)):
+        return f'<list:{len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def _json_safe(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class SlowQueryLog:
+    """Collects slow statements per (tenant, fingerprint) and writes them to a rotating log"""
+
+    def __init__(self, threshold_ms=200, max_fingerprints=500):
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.enabled = False
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._logger = None
+
+    def init_app(self, app):
+        """Register the cursor listener and open the rotating log file"""
+        self.enabled = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'true').lower() == 'true'
+        if not self.enabled:
+            return
+
+        self.threshold_ms = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', self.threshold_ms))
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        logger = logging.getLogger('fleet.slow_queries')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            handler = RotatingFileHandler(
+                os.path.join(LOG_DIR, 'slow_queries.log'),
+                maxBytes=int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+                backupCount=int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5)),
+                encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        self._logger = logger
+
+        db_metrics.add_query_listener(self.record)
+
+    def record(self, sql, params, duration, rowcount, cursor):
+        """Cursor listener: keep statements slower than the threshold"""
+        duration_ms = duration * 1000
+        if duration_ms < self.threshold_ms or getattr(self._local, 'explaining', False):
+            return
+
+        fingerprint_id, normalized = db_metrics.fingerprint_sql(sql)
+        labels = db_metrics.current_labels()
+        tenant = labels['tenant']
+        route = labels['endpoint']
+        key = (tenant, fingerprint_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self._evict()
+                entry = {
+                    'fingerprint_id': fingerprint_id,
+                    'fingerprint': normalized,
+                    'tenant': tenant,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'rows': 0,
+                    'routes': {},
+                    'last_params': None,
+                    'first_seen': datetime.now(),
+                    'last_seen': None,
+                    'explain': None,
+                }
+                self._entries[key] = entry
+                needs_explain = True
+            else:
+                needs_explain = False
+
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['rows'] += max(rowcount or 0, 0)
+            entry['routes'][route] = entry['routes'].get(route, 0) + 1
+            entry['last_params'] = redact_params(params)
+            entry['last_seen'] = datetime.now()
+
+        if needs_explain:
+            entry['explain'] = self._explain(sql, params, normalized, cursor)
+
+        if self._logger:
+            self._logger.info(json.dumps({
+                'ts': datetime.now().isoformat(timespec='milliseconds'),
+                'tenant': tenant,
+                'route': route,
+                'fingerprint_id': fingerprint_id,
+                'fingerprint': normalized,
+                'duration_ms': round(duration_ms, 2),
+                'rows': rowcount,
+                'params': redact_params(params),
+                'explain': entry['explain'] if needs_explain else None,
+            }, default=str))
+
+    def _explain(self, sql, params, normalized, cursor):
+        """Run EXPLAIN for a SELECT on the same connection (buffered cursors only)"""
+        if not normalized.startswith(('select', 'with')):
+            return None
+        if isinstance(cursor.raw_cursor, pymysql.cursors.SSCursor):
+            # Unbuffered result still pending on this connection
+            return None
+
+        self._local.explaining = True
+        explain_cursor = None
+        try:
+            explain_cursor = cursor.connection.cursor()
+            explain_cursor.execute('EXPLAIN ' + sql, params)
+            rows = explain_cursor.fetchall()
+            if rows and not isinstance(rows[0], dict):
+                columns = [col[0] for col in explain_cursor.description]
+                rows = [dict(zip(columns, row)) for row in rows]
+            return [{key: _json_safe(value) for key, value in row.items()} for row in rows]
+        except Exception as e:
+            return [{'error': str(e)}]
+        finally:
+            if explain_cursor is not None:
+                explain_cursor.close()
+            self._local.explaining = False
+
+    def _evict(self):
+        """Drop the cheapest fingerprint to bound memory (caller holds the lock)"""
+        cheapest = min(self._entries, key=lambda k: self._entries[k]['total_ms'])
+        del self._entries[cheapest]
+
+    def get_entries(self, tenant=None, limit=100):
+        """Aggregated slow queries sorted by total time (optionally for one tenant)"""
+        with self._lock:
+            entries = [dict(entry, routes=dict(entry['routes'])) for entry in self._entries.values()
+                       if tenant is None or entry['tenant'] == tenant]
+
+        for entry in entries:
+            entry['avg_ms'] = entry['total_ms'] / entry['count'] if entry['count'] else 0
+
+        entries.sort(key=lambda e: e['total_ms'], reverse=True)
+        return entries[:limit]
+
+    def reset(self, tenant=None):
+        """Forget collected entries (optionally only for one tenant)"""
+        with self._lock:
+            if tenant is None:
+                self._entries = {}
+            else:
+                self._entries = {k: v for k, v in self._entries.items() if v['tenant'] != tenant}
+
+
+# Global instance
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,180 @@
+"""
+Table Version Registry
+Per-tenant version counters and last-write times for the tables behind the
+list pages and analytics APIs (vehicles, fuel_records, service_maintenance,
+job_cards, vehicle_assignments, service_requisitions, employees). Write routes
+bump the tables they change; @conditional_view(*tables) turns those versions
+into ETag / Last-Modified validators and answers 304 before the view runs when
+the client's copy is still current, so an unchanged refresh never reaches the
+database.
+
+Counters live in the response cache backend under the same keys as its tags
+(bump('vehicles') also expires responses tagged 'vehicles'), so with the Redis
+backend every worker sees every write. With the per-process memory backend
+another worker's writes are not visible; validators then also change every
+TABLE_VERSIONS_LOCAL_SECONDS, which bounds how long a 304 can hide them.
+
+Validators also cover the user and their permission set, the URL, the
+current date (for "last 30 days" windows), the employees table (roles), the
+tenant's settings and role permissions (bump('settings')) and the deployed
+build (APP_BUILD_ID, else the newest template/module mtime).
+
+Usage:
+    @app.route('/fuel-records')
+    @conditional_view('fuel_records', 'vehicles')
+    def fuel_records():
+        ...
+
+    table_versions.bump('fuel_records')    # after committing a fuel record
+"""
+
+from functools import wraps, lru_cache
+from datetime import datetime, date, timezone
+from flask import request, session, current_app
+import hashlib
+import glob
+import time
+import os
+
+TABLE_VERSIONS_ENABLED = os.environ.get('TABLE_VERSIONS_ENABLED', 'true').lower() == 'true'
+# With the memory backend, validators change at least this often
+TABLE_VERSIONS_LOCAL_SECONDS = int(os.environ.get('TABLE_VERSIONS_LOCAL_SECONDS', 30))
+# How long last-write times are kept (without one, Last-Modified is omitted)
+TABLE_VERSIONS_TIMESTAMP_TTL = 30 * 24 * 3600
+
+# Every page depends on the user's role (employees.role) and on 'settings': not a table
+# but the version bumped by writes to system/print settings (company name) and roles
+IMPLICIT_TABLES = ('employees', 'settings')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@lru_cache(maxsize=1)
+def build_id():
+    """Identifies the deployed code, so a deploy does not answer 304 with old markup"""
+    if os.environ.get('APP_BUILD_ID'):
+        return os.environ['APP_BUILD_ID']
+    paths = glob.glob(os.path.join(APP_DIR, 'templates', '**', '*.html'), recursive=True)
+    paths += glob.glob(os.path.join(APP_DIR, '*.py'))
+    return str(int(max((os.path.getmtime(path) for path in paths), default=0)))
+
+
+class TableVersionRegistry:
+    """Per-tenant table versions kept in the response cache backend"""
+
+    @property
+    def backend(self):
+        from response_cache import response_cache
+        return response_cache.backend
+
+    @property
+    def shared(self):
+        """True when every worker process sees the same counters"""
+        from response_cache import RedisCacheBackend
+        return isinstance(self.backend, RedisCacheBackend)
+
+    def local_epoch(self):
+        """Changes every TABLE_VERSIONS_LOCAL_SECONDS unless the counters are shared"""
+        return '' if self.shared else str(int(time.time() // TABLE_VERSIONS_LOCAL_SECONDS))
+
+    # ----- writes -----
+
+    def bump(self, *tables, tenant=None):
+        """Record a committed write to these tables of the tenant"""
+        from response_cache import response_cache, current_tenant
+        tenant = tenant or current_tenant()
+        # Same counters as the response cache tags (also keeps reads on the primary for a while)
+        response_cache.invalidate(*tables, tenant=tenant)
+        now = time.time()
+        for table in tables:
+            try:
+                self.backend.set(f"tvts:{tenant}:{table}", now, TABLE_VERSIONS_TIMESTAMP_TTL)
+            except Exception as e:
+                print(f"⚠️  Table version timestamp failed ({tenant}/{table}): {e}")
+
+    # ----- reads -----
+
+    def versions(self, tables, tenant=None):
+        from response_cache import response_cache, current_tenant
+        tenant = tenant or current_tenant()
+        return [response_cache.generation(table, tenant) for table in tables]
+
+    def token(self, tables, tenant=None):
+        """Compact version string of these tables (changes on every write to any of them)"""
+        return '.'.join(str(version) for version in self.versions(tables, tenant)) + ':' + self.local_epoch()
+
+    def last_modified(self, tables, tenant=None):
+        """Latest write time of these tables, or None unless every one of them has a recorded write"""
+        from response_cache import current_tenant
+        tenant = tenant or current_tenant()
+        stamps = [self.backend.get(f"tvts:{tenant}:{table}") for table in tables]
+        if not stamps or any(stamp is None for stamp in stamps):
+            return None
+        latest = max(stamps)
+        if not self.shared:
+            latest = max(latest, time.time() // TABLE_VERSIONS_LOCAL_SECONDS * TABLE_VERSIONS_LOCAL_SECONDS)
+        return datetime.fromtimestamp(int(latest), timezone.utc)
+
+    def validators(self, tables):
+        """(etag, last_modified) of the current request for a view reading these tables"""
+        from response_cache import current_tenant, normalized_query_string, permission_scope
+        tables = tuple(dict.fromkeys(tables + IMPLICIT_TABLES))
+        tenant = current_tenant()
+        parts = [
+            tenant,
+            request.endpoint,
+            sorted((request.view_args or {}).items()),
+            normalized_query_string(),
+            session.get('employee_id') or session.get('user_id'),
+            session.get('user_type'),
+            permission_scope(),
+            date.today().isoformat(),
+            build_id(),
+            self.token(tables, tenant),
+        ]
+        etag = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+        return etag, self.last_modified(tables, tenant)
+
+    # ----- decorator -----
+
+    def conditional(self, *tables):
+        """
+        ETag / Last-Modified for a GET view reading `tables`; 304 without running
+        the view while none of them changed. Place it below login/permission checks.
+        """
+        def decorator(view):
+            @wraps(view)
+            def decorated_function(*args, **kwargs):
+                # Anonymous requests, and pages that will show pending flash messages, are always rendered
+                if (not TABLE_VERSIONS_ENABLED or request.method != 'GET'
+                        or not (session.get('employee_id') or session.get('user_id'))
+                        or session.get('_flashes')):
+                    return view(*args, **kwargs)
+
+                try:
+                    etag, last_modified = self.validators(tables)
+                except Exception as e:
+                    print(f"⚠️  Table versions unavailable: {e}")
+                    return view(*args, **kwargs)
+
+                if request.if_none_match.contains(etag) or (
+                        not request.if_none_match and last_modified and request.if_modified_since
+                        and last_modified <= request.if_modified_since):
+                    response = current_app.response_class(status=304)
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+
+                response.set_etag(etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return decorated_function
+        return decorator
+
+
+# Global instance
+table_versions = TableVersionRegistry()
+conditional_view = table_versions.conditional
@@ -0,0 +1,328 @@
+"""
+Warm Tenant Database Pool
+Keeps a few spare tenant databases created and schema-initialized ahead of
+time, so signup only has to claim one and rename it to the company's
+database name (one metadata-only RENAME TABLE) instead of waiting for
+CREATE DATABASE plus the whole schema.
+
+Spares are registered in fleet_saas_main.tenant_db_pool with their shard
+and the schema version they were built at; spares from an older schema
+are dropped and rebuilt. A background provisioner refills the pool after
+every claim and periodically (TENANT_DB_POOL_SIZE spares per active
+shard, 0 disables the pool).
+
+Usage:
+    python tenant_db_pool.py --status
+    python tenant_db_pool.py --refill
+    python tenant_db_pool.py --drain
+"""
+
+import threading
+import secrets
+import os
+
+from tenant_manager import TenantDatabaseManager
+from shard_manager import shard_registry, _column_exists
+
+TENANT_DB_POOL_SIZE = int(os.environ.get('TENANT_DB_POOL_SIZE', 3))
+# Minutes between periodic refills (claims also trigger a refill right away)
+TENANT_DB_POOL_INTERVAL = int(os.environ.get('TENANT_DB_POOL_INTERVAL', 10))
+# Spare names must not match 'fleet\_%', so backups and tenant listings skip them
+SPARE_PREFIX = 'fleetpool_'
+
+CREATE_TENANT_DB_POOL_TABLE = """
+    CREATE TABLE IF NOT EXISTS tenant_db_pool (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        database_name VARCHAR(100) UNIQUE NOT NULL,
+        shard_id INT NOT NULL DEFAULT 1,
+        schema_version VARCHAR(32) NOT NULL,
+        status ENUM('provisioning', 'ready', 'claimed') NOT NULL DEFAULT 'provisioning',
+        claimed_as VARCHAR(100) NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        claimed_at DATETIME NULL,
+        INDEX idx_shard_status (shard_id, status, schema_version)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+class TenantDatabasePool:
+    """Registry of spare tenant databases plus the provisioner that keeps it full"""
+
+    def __init__(self, size=TENANT_DB_POOL_SIZE):
+        self.size = size
+        self._table_ready = False
+        self._refill_thread = None
+        self._lock = threading.Lock()
+        self._schema_version = None
+
+    @property
+    def schema_version(self):
+        if self._schema_version is None:
+            self._schema_version = TenantDatabaseManager.tenant_schema_version()
+        return self._schema_version
+
+    def ensure_table(self, cursor):
+        if not self._table_ready:
+            cursor.execute(CREATE_TENANT_DB_POOL_TABLE)
+            if not _column_exists(cursor, 'tenant_db_pool', 'shard_id'):
+                cursor.execute("ALTER TABLE tenant_db_pool ADD COLUMN shard_id INT NOT NULL DEFAULT 1 AFTER database_name")
+            self._table_ready = True
+
+    # ----- claiming -----
+
+    def claim(self, database_name, shard_id=1):
+        """
+        Turn a ready spare on the shard into `database_name`
+        Returns False (caller creates the database itself) when the pool is
+        disabled or empty, or if the rename fails
+        """
+        if self.size <= 0:
+            return False
+
+        try:
+            with TenantDatabaseManager.main_db() as conn:
+                with conn.cursor() as cursor:
+                    self.ensure_table(cursor)
+                    # Single UPDATE, so two signups can never claim the same spare
+                    cursor.execute("""
+                        UPDATE tenant_db_pool
+                        SET status = 'claimed', claimed_as = %s, claimed_at = NOW()
+                        WHERE shard_id = %s AND status = 'ready' AND schema_version = %s
+                        ORDER BY id
+                        LIMIT 1
+                    """, (database_name, shard_id, self.schema_version))
+                    if cursor.rowcount == 0:
+                        conn.commit()
+                        print(f"⚠️  No spare tenant database ready, creating {database_name} inline")
+                        self.refill_async()
+                        return False
+                    cursor.execute("""
+                        SELECT database_name FROM tenant_db_pool
+                        WHERE status = 'claimed' AND claimed_as = %s
+                        ORDER BY claimed_at DESC
+                        LIMIT 1
+                    """, (database_name,))
+                    spare = cursor.fetchone()['database_name']
+                    conn.commit()
+        except Exception as e:
+            print(f"⚠️  Tenant database pool unavailable: {e}")
+            return False
+
+        try:
+            self._rename_database(spare, database_name, shard_id)
+            print(f"✓ Claimed spare {spare} as {database_name}")
+            return True
+        except Exception as e:
+            print(f"✗ Claiming {spare} as {database_name} failed: {e}")
+            self._discard(spare, shard_id)
+            return False
+        finally:
+            self._forget(spare)
+            self.refill_async()
+
+    def _rename_database(self, spare, database_name, shard_id):
+        """Move every table of the spare into a new database in one atomic RENAME TABLE"""
+        # No default database: spares are created and renamed at server level
+        connection = TenantDatabaseManager.get_server_connection(shard_id)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT table_name AS table_name FROM information_schema.tables
+                    WHERE table_schema = %s
+                """, (spare,))
+                tables = [row['table_name'] for row in cursor.fetchall()]
+                if not tables:
+                    raise RuntimeError(f"Spare {spare} has no tables")
+
+                cursor.execute(f"CREATE DATABASE `{database_name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+                try:
+                    cursor.execute("RENAME TABLE " + ', '.join(
+                        f"`{spare}`.`{table}` TO `{database_name}`.`{table}`" for table in tables))
+                except Exception:
+                    cursor.execute(f"DROP DATABASE IF EXISTS `{database_name}`")
+                    raise
+                cursor.execute(f"DROP DATABASE IF EXISTS `{spare}`")
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _forget(self, spare):
+        try:
+            with TenantDatabaseManager.main_db() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("DELETE FROM tenant_db_pool WHERE database_name = %s", (spare,))
+        except Exception as e:
+            print(f"⚠️  Could not remove {spare} from the pool registry: {e}")
+
+    def _discard(self, spare, shard_id):
+        TenantDatabaseManager.drop_tenant_database(spare, shard_id)
+
+    # ----- provisioning -----
+
+    def provision_one(self, shard_id=1):
+        """Create, initialize and register one spare on a shard; returns its name or None"""
+        spare = f"{SPARE_PREFIX}{secrets.token_hex(6)}"
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                cursor.execute("""
+                    INSERT INTO tenant_db_pool (database_name, shard_id, schema_version, status)
+                    VALUES (%s, %s, %s, 'provisioning')
+                """, (spare, shard_id, self.schema_version))
+        # Spares are not companies, so tell the registry where this one lives
+        shard_registry.remember(spare, shard_id)
+
+        ready = False
+        try:
+            connection = TenantDatabaseManager.get_server_connection(shard_id)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"CREATE DATABASE `{spare}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+                connection.commit()
+            finally:
+                connection.close()
+            ready = TenantDatabaseManager.initialize_tenant_schema(spare)
+        except Exception as e:
+            print(f"✗ Provisioning spare {spare} failed: {e}")
+
+        if not ready:
+            self._discard(spare, shard_id)
+            self._forget(spare)
+            return None
+
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("UPDATE tenant_db_pool SET status = 'ready' WHERE database_name = %s", (spare,))
+        return spare
+
+    def _drop_stale(self, cursor):
+        """Drop spares built for an older schema, and provisioning leftovers older than an hour"""
+        cursor.execute("""
+            SELECT database_name, shard_id FROM tenant_db_pool
+            WHERE (status = 'ready' AND schema_version <> %s)
+               OR (status = 'provisioning' AND created_at < NOW() - INTERVAL 1 HOUR)
+        """, (self.schema_version,))
+        stale = cursor.fetchall()
+        for row in stale:
+            self._discard(row['database_name'], row['shard_id'])
+            self._forget(row['database_name'])
+        if stale:
+            print(f"✓ Dropped {len(stale)} stale spare tenant database(s)")
+
+    def refill(self):
+        """Bring the pool up to `size` ready spares at the current schema version"""
+        if self.size <= 0:
+            return 0
+
+        conn = TenantDatabaseManager.get_main_connection()
+        try:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                # One provisioner at a time across all app processes
+                cursor.execute("SELECT GET_LOCK('tenant_db_pool_refill', 0) AS locked")
+                if not cursor.fetchone()['locked']:
+                    return 0
+                try:
+                    self._drop_stale(cursor)
+                    created = 0
+                    # Only active shards receive new tenants, so only they need spares
+                    for shard_id, shard in shard_registry.shards(refresh=True).items():
+                        if shard['status'] != 'active':
+                            continue
+                        cursor.execute("""
+                            SELECT COUNT(*) AS spares FROM tenant_db_pool
+                            WHERE shard_id = %s AND status IN ('ready', 'provisioning') AND schema_version = %s
+                        """, (shard_id, self.schema_version))
+                        missing = self.size - cursor.fetchone()['spares']
+                        for _ in range(max(0, missing)):
+                            if self.provision_one(shard_id):
+                                created += 1
+                    if created:
+                        print(f"✓ Provisioned {created} spare tenant database(s)")
+                    return created
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK('tenant_db_pool_refill')")
+        finally:
+            conn.close()
+
+    def refill_async(self):
+        """Refill in a background thread (no-op if one is already running)"""
+        with self._lock:
+            if self._refill_thread is not None and self._refill_thread.is_alive():
+                return
+            self._refill_thread = threading.Thread(target=self._safe_refill, daemon=True,
+                                                   name='tenant-db-pool-refill')
+            self._refill_thread.start()
+
+    def _safe_refill(self):
+        try:
+            self.refill()
+        except Exception as e:
+            print(f"✗ Tenant database pool refill failed: {e}")
+
+    def drain(self):
+        """Drop every unclaimed spare (e.g. before a schema migration)"""
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                cursor.execute("SELECT database_name, shard_id FROM tenant_db_pool WHERE status <> 'claimed'")
+                spares = cursor.fetchall()
+        for row in spares:
+            self._discard(row['database_name'], row['shard_id'])
+            self._forget(row['database_name'])
+        return len(spares)
+
+    def status(self):
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                cursor.execute("""
+                    SELECT shard_id, status, schema_version, COUNT(*) AS spares
+                    FROM tenant_db_pool
+                    GROUP BY shard_id, status, schema_version
+                    ORDER BY shard_id
+                """)
+                return cursor.fetchall()
+
+    def schedule(self, scheduler):
+        """Register the periodic refill on an APScheduler instance and fill the pool now"""
+        if self.size <= 0:
+            return
+        scheduler.add_job(
+            self._safe_refill,
+            'interval',
+            minutes=TENANT_DB_POOL_INTERVAL,
+            id='tenant_db_pool_refill',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        self.refill_async()
+        print(f"✓ Tenant database pool: {self.size} spares per shard, refill every {TENANT_DB_POOL_INTERVAL} min")
+
+
+# Global instance
+tenant_db_pool = TenantDatabasePool()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage the pool of spare tenant databases')
+    parser.add_argument('--status', action='store_true', help='Show spares by status and schema version')
+    parser.add_argument('--refill', action='store_true', help='Provision spares up to TENANT_DB_POOL_SIZE')
+    parser.add_argument('--drain', action='store_true', help='Drop every unclaimed spare')
+    args = parser.parse_args()
+
+    if args.drain:
+        print(f"✓ Dropped {tenant_db_pool.drain()} spare(s)")
+    if args.refill:
+        tenant_db_pool.refill()
+    print(f"Current schema version: {tenant_db_pool.schema_version}")
+    for row in tenant_db_pool.status():
+        marker = '' if row['schema_version'] == tenant_db_pool.schema_version else '  (stale)'
+        print(f"   shard {row['shard_id']:<3d} {row['status']:13s} {row['schema_version']}  {row['spares']}{marker}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,12 @@ Handles database isolation with separate database per tenant
 """
 
 import pymysql
+import db_metrics
+from shard_manager import shard_registry
 from contextlib import contextmanager
 from flask import g, session
 import threading
+import hashlib
 
 class TenantDatabaseManager:
     """
@@ -39,28 +42,35 @@ class TenantDatabaseManager:
     @classmethod
     def get_main_connection(cls):
         """Get connection to main database (companies/tenants info)"""
-        return pymysql.connect(**cls.MAIN_DB_CONFIG)
+        return db_metrics.connect(**cls.MAIN_DB_CONFIG)
     
     @classmethod
-    def get_tenant_connection(cls, database_name):
-        """Get connection to specific tenant database"""
-        config = cls.TENANT_DB_BASE_CONFIG.copy()
-        config['database'] = database_name
-        return pymysql.connect(**config)
+    def get_tenant_connection(cls, database_name, shard_id=None):
+        """Get connection to specific tenant database (on the shard that holds it, or on `shard_id`)"""
+        return db_metrics.connect(**shard_registry.connection_config(database_name, shard_id))
     
     @classmethod
-    def create_tenant_database(cls, database_name):
+    def get_server_connection(cls, shard_id=None):
+        """Get a connection to a shard's MySQL server without selecting a database"""
+        return db_metrics.connect(**shard_registry.server_config(shard_id))
+    
+    @classmethod
+    def create_tenant_database(cls, database_name, shard_id=None):
         """
-        Create a new database for a tenant
+        Create a new database for a tenant on its shard
+        Claims a pre-provisioned spare when one is ready (see tenant_db_pool),
+        otherwise creates and initializes the database inline
         Returns True if successful, False otherwise
         """
+        shard_id = shard_id or shard_registry.shard_id_for(database_name)
+        shard_registry.remember(database_name, shard_id)
+        
+        from tenant_db_pool import tenant_db_pool
+        if tenant_db_pool.claim(database_name, shard_id):
+            return True
+        
         try:
-            connection = pymysql.connect(
-                host=cls.TENANT_DB_BASE_CONFIG['host'],
-                user=cls.TENANT_DB_BASE_CONFIG['user'],
-                password=cls.TENANT_DB_BASE_CONFIG['password'],
-                charset=cls.TENANT_DB_BASE_CONFIG['charset']
-            )
+            connection = cls.get_server_connection(shard_id)
             
             with connection.cursor() as cursor:
                 # Create database
@@ -78,47 +88,71 @@ class TenantDatabaseManager:
             return False
     
     @classmethod
-    def initialize_tenant_schema(cls, database_name):
+    def create_tenant_schema(cls, cursor):
         """
-        Initialize tenant database with all required tables
-        This creates the complete schema for a new tenant
+        Execute the complete tenant schema on a cursor
+        Tables are created in an order that respects foreign key dependencies
         """
         import models
         import models_settings
         from models_tenant import TenantSettings
         import models_analytics
         
+        # Create all tables from models.py SQL in correct order
+        # (respecting foreign key dependencies)
+        cursor.execute(models.CREATE_USERS_TABLE)
+        cursor.execute(models.CREATE_EMPLOYEES_TABLE)
+        cursor.execute(models.CREATE_VEHICLES_TABLE)
+        cursor.execute(models.CREATE_VEHICLE_ASSIGNMENTS_TABLE)
+        cursor.execute(models.CREATE_FUEL_RECORDS_TABLE)
+        cursor.execute(models.CREATE_JOB_CARDS_TABLE)
+        cursor.execute(models.CREATE_JOB_CARD_ITEMS_TABLE)
+        cursor.execute(models.CREATE_SERVICE_MAINTENANCE_TABLE)
+        cursor.execute(models.CREATE_SERVICE_REQUISITIONS_TABLE)
+        
+        # Create settings tables from models_settings.py
+        cursor.execute(models_settings.CREATE_SYSTEM_SETTINGS_TABLE)
+        cursor.execute(models_settings.CREATE_EMPLOYEE_PREFERENCES_TABLE)
+        cursor.execute(models_settings.CREATE_NOTIFICATION_SETTINGS_TABLE)
+        
+        # Create analytics tables from models_analytics.py
+        cursor.execute(models_analytics.CREATE_SCHEDULED_REPORTS_TABLE)
+        cursor.execute(models_analytics.CREATE_REPORT_TEMPLATES_TABLE)
+        cursor.execute(models_analytics.CREATE_KPI_SNAPSHOTS_TABLE)
+        cursor.execute(models_analytics.CREATE_REPORT_LOG_TABLE)
+        cursor.execute(models_analytics.CREATE_DASHBOARD_WIDGETS_TABLE)
+        
+        # Create tenant settings table
+        TenantSettings.create_table(cursor)
+    
+    @classmethod
+    def tenant_schema_version(cls):
+        """
+        Fingerprint of the statements create_tenant_schema() runs
+        Changes whenever a CREATE TABLE definition or default setting changes
+        """
+        class RecordingCursor:
+            def __init__(self):
+                self.statements = []
+            
+            def execute(self, query, args=None):
+                self.statements.append(repr((' '.join(query.split()), args)))
+        
+        cursor = RecordingCursor()
+        cls.create_tenant_schema(cursor)
+        return hashlib.md5('\n'.join(cursor.statements).encode('utf-8')).hexdigest()[:16]
+    
+    @classmethod
+    def initialize_tenant_schema(cls, database_name):
+        """
+        Initialize tenant database with all required tables
+        This creates the complete schema for a new tenant
+        """
         connection = cls.get_tenant_connection(database_name)
         
         try:
             with connection.cursor() as cursor:
-                # Create all tables from models.py SQL in correct order
-                # (respecting foreign key dependencies)
-                cursor.execute(models.CREATE_USERS_TABLE)
-                cursor.execute(models.CREATE_EMPLOYEES_TABLE)
-                cursor.execute(models.CREATE_VEHICLES_TABLE)
-                cursor.execute(models.CREATE_VEHICLE_ASSIGNMENTS_TABLE)
-                cursor.execute(models.CREATE_FUEL_RECORDS_TABLE)
-                cursor.execute(models.CREATE_JOB_CARDS_TABLE)
-                cursor.execute(models.CREATE_JOB_CARD_ITEMS_TABLE)
-                cursor.execute(models.CREATE_SERVICE_MAINTENANCE_TABLE)
-                cursor.execute(models.CREATE_SERVICE_REQUISITIONS_TABLE)
-                
-                # Create settings tables from models_settings.py
-                cursor.execute(models_settings.CREATE_SYSTEM_SETTINGS_TABLE)
-                cursor.execute(models_settings.CREATE_EMPLOYEE_PREFERENCES_TABLE)
-                cursor.execute(models_settings.CREATE_NOTIFICATION_SETTINGS_TABLE)
-                
-                # Create analytics tables from models_analytics.py
-                cursor.execute(models_analytics.CREATE_SCHEDULED_REPORTS_TABLE)
-                cursor.execute(models_analytics.CREATE_REPORT_TEMPLATES_TABLE)
-                cursor.execute(models_analytics.CREATE_KPI_SNAPSHOTS_TABLE)
-                cursor.execute(models_analytics.CREATE_REPORT_LOG_TABLE)
-                cursor.execute(models_analytics.CREATE_DASHBOARD_WIDGETS_TABLE)
-                
-                # Create tenant settings table
-                TenantSettings.create_table(cursor)
-                
+                cls.create_tenant_schema(cursor)
                 connection.commit()
             
             return True
@@ -132,18 +166,13 @@ class TenantDatabaseManager:
             connection.close()
     
     @classmethod
-    def drop_tenant_database(cls, database_name):
+    def drop_tenant_database(cls, database_name, shard_id=None):
         """
         Drop a tenant database (use with extreme caution!)
         Only for testing or when company is permanently deleted
         """
         try:
-            connection = pymysql.connect(
-                host=cls.TENANT_DB_BASE_CONFIG['host'],
-                user=cls.TENANT_DB_BASE_CONFIG['user'],
-                password=cls.TENANT_DB_BASE_CONFIG['password'],
-                charset=cls.TENANT_DB_BASE_CONFIG['charset']
-            )
+            connection = cls.get_server_connection(shard_id or shard_registry.shard_id_for(database_name))
             
             with connection.cursor() as cursor:
                 cursor.execute(f"DROP DATABASE IF EXISTS `{database_name}`")
@@ -178,6 +207,8 @@ class TenantDatabaseManager:
         g.tenant_subdomain = company_data['subdomain']
         g.tenant_plan = company_data['plan']
         g.tenant_status = company_data['status']
+        # The company row already says where its database lives
+        shard_registry.remember(company_data['database_name'], company_data.get('shard_id'))
     
     @classmethod
     def clear_tenant_context(cls):
@@ -239,7 +270,7 @@ def init_main_database():
     
     try:
         # Create main database if it doesn't exist
-        connection = pymysql.connect(
+        connection = db_metrics.connect(
             host=TenantDatabaseManager.TENANT_DB_BASE_CONFIG['host'],
             user=TenantDatabaseManager.TENANT_DB_BASE_CONFIG['user'],
             password=TenantDatabaseManager.TENANT_DB_BASE_CONFIG['password'],
@@ -257,6 +288,7 @@ def init_main_database():
             with conn.cursor() as cursor:
                 Company.create_table(cursor)
                 TenantUser.create_table(cursor)
+                shard_registry.ensure_schema(cursor)
                 conn.commit()
         
         print("✅ Main SaaS database initialized successfully")
@@ -7,8 +7,15 @@ from flask import request, g, redirect, url_for, session, abort
 from functools import wraps
 from tenant_manager import TenantDatabaseManager
 from models_tenant import Company
+from datetime import datetime
+import hashlib
+import hmac
+import os
 import re
 
+# Shared secret for the cross-tenant /super-admin views (unset: they are disabled)
+SUPER_ADMIN_TOKEN = os.environ.get('SUPER_ADMIN_TOKEN', '')
+
 class TenantMiddleware:
     """
     Middleware to identify and set tenant context for each request
@@ -27,6 +34,7 @@ class TenantMiddleware:
         'tenant.tenant_switch',
         'static',
         'health_check',
+        'metrics',
         'user_login',
         'user_signup',
         'employee_login',
@@ -39,8 +47,21 @@ class TenantMiddleware:
         'super_admin_login',
         'super_admin_dashboard',
         'super_admin_companies',
+        'super_admin_usage',
+        'super_admin_usage_csv',
     ]
     
+    # Methods still served while a tenant's writes are fenced (see tenant_relocation)
+    READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    
+    # GET routes that still write (delete links); fenced like any other write
+    MUTATING_GET_ENDPOINTS = {
+        'delete_fuel_record',
+        'delete_service',
+        'delete_job_card_item',
+        'delete_job_card',
+    }
+    
     def __init__(self, app):
         self.app = app
         app.before_request(self.identify_tenant)
@@ -107,6 +128,10 @@ class TenantMiddleware:
                 if company['status'] not in ['active', 'trial']:
                     return self.render_suspended_page(company)
                 
+                # Writes are fenced for a few seconds while the database moves to another shard
+                if self.is_write_fenced(company) and self.is_write_request():
+                    return self.render_write_fenced(company)
+                
                 # Set tenant context
                 TenantDatabaseManager.set_tenant_context(company)
                 
@@ -149,6 +174,30 @@ class TenantMiddleware:
         """
         TenantDatabaseManager.clear_tenant_context()
     
+    def is_write_request(self):
+        """True for requests that may write to the tenant database"""
+        return request.method not in self.READ_METHODS or request.endpoint in self.MUTATING_GET_ENDPOINTS
+    
+    @staticmethod
+    def is_write_fenced(company):
+        fence_until = company.get('write_fence_until')
+        return bool(fence_until and fence_until > datetime.now())
+    
+    def render_write_fenced(self, company):
+        """503 with Retry-After while the tenant database is being relocated"""
+        from flask import jsonify, make_response
+        
+        # The fence deadline is only an upper bound; relocations normally lift it sooner
+        remaining = (company['write_fence_until'] - datetime.now()).total_seconds()
+        retry_after = max(1, min(5, int(remaining)))
+        message = f"{company['name']} is being moved to a new database server. Please retry in a few seconds."
+        if request.is_json or request.accept_mimetypes.best == 'application/json':
+            response = make_response(jsonify({'error': message, 'retry_after': retry_after}), 503)
+        else:
+            response = make_response(message, 503)
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    
     def render_suspended_page(self, company):
         """Render page for suspended/expired accounts"""
         from flask import render_template_string
@@ -213,28 +262,56 @@ def require_tenant(f):
     return decorated_function
 
 
+def require_super_admin(f):
+    """
+    Decorator for cross-tenant admin views
+    The first request passes SUPER_ADMIN_TOKEN (?token= or Authorization: Bearer);
+    the session then remembers it until the token changes
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not SUPER_ADMIN_TOKEN:
+            abort(403)
+        fingerprint = hashlib.sha256(SUPER_ADMIN_TOKEN.encode('utf-8')).hexdigest()[:16]
+        
+        token = request.args.get('token') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if token and hmac.compare_digest(token, SUPER_ADMIN_TOKEN):
+            session['super_admin'] = fingerprint
+        
+        if session.get('super_admin') != fingerprint:
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 def check_tenant_limits(limit_type):
     """
     Decorator to check tenant limits before allowing action
-    limit_type: 'users', 'vehicles', etc.
+    limit_type: 'users' or 'vehicles' (None: subscription state only)
+    Uses the cached plan and in-memory counters of plan_limits, so the check
+    does not query the database. Without a tenant (legacy mode) nothing is enforced.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if not hasattr(g, 'tenant_id'):
-                abort(404, "Tenant context not available")
+            if not hasattr(g, 'tenant_db'):
+                return f(*args, **kwargs)
             
-            from models_tenant import Company
+            from plan_limits import plan_limits
             
             # Check limits
-            with TenantDatabaseManager.main_db() as conn:
-                with conn.cursor() as cursor:
-                    limits = Company.check_limits(cursor, g.tenant_id)
-                    
-                    if not limits['valid']:
-                        from flask import flash, redirect, url_for
-                        flash(f"Subscription limit reached: {limits['message']}", 'danger')
-                        return redirect(url_for('employee_dashboard'))
+            try:
+                limits = plan_limits.check(g.tenant_db, limit_type)
+            except Exception as e:
+                print(f"⚠️  Plan limit check failed for {g.tenant_db}: {e}")
+                return f(*args, **kwargs)
+            
+            if not limits['valid']:
+                from flask import flash
+                flash(f"Subscription limit reached: {limits['message']}", 'danger')
+                if 'employee_id' not in session:
+                    return redirect(url_for('employee_login'))
+                return redirect(url_for('employee_dashboard'))
             
             return f(*args, **kwargs)
         return decorated_function
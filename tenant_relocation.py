@@ -0,0 +1,447 @@
+"""
+Tenant Relocation
+Moves a tenant database to another shard while the tenant stays online:
+
+1. Copy every table to the target server, in primary-key chunks
+2. Catch up rows whose updated_at moved since each table was copied,
+   repeating until a pass finds little left to copy
+3. Fence writes (companies.write_fence_until, honored by TenantMiddleware),
+   apply the last changes and deletions, verify row counts
+4. Point companies.shard_id at the target and lift the fence
+
+Only step 3 blocks writes, so the fence lasts seconds, not the length of
+the copy. Tables without an integer primary key and updated_at column are
+copied again in full inside the fence; --dry-run lists them with their sizes.
+Background jobs are not fenced and may reach the old shard until the shard
+cache expires (SHARD_CACHE_SECONDS). The source database is kept unless
+--drop-source is given.
+
+Usage:
+    python tenant_relocation.py acme shard2 --dry-run
+    python tenant_relocation.py acme shard2 [--drop-source]
+"""
+
+from datetime import datetime, timedelta
+import pymysql
+import time
+import sys
+import os
+
+from tenant_manager import TenantDatabaseManager
+from shard_manager import shard_registry, DEFAULT_SHARD_ID
+
+# Rows per SELECT / multi-row REPLACE while copying
+RELOCATION_CHUNK_ROWS = int(os.environ.get('RELOCATION_CHUNK_ROWS', 2000))
+# Catch-up passes stop once one copies fewer rows than this (or after the maximum)
+RELOCATION_CATCHUP_ROWS = int(os.environ.get('RELOCATION_CATCHUP_ROWS', 500))
+RELOCATION_CATCHUP_PASSES = int(os.environ.get('RELOCATION_CATCHUP_PASSES', 5))
+# Re-read rows updated this long before a watermark (transactions commit after updated_at is set)
+RELOCATION_OVERLAP_SECONDS = int(os.environ.get('RELOCATION_OVERLAP_SECONDS', 5))
+# Time for in-flight requests to finish after the fence is raised
+WRITE_FENCE_GRACE_SECONDS = float(os.environ.get('WRITE_FENCE_GRACE_SECONDS', 2))
+# Upper bound for the fence: it lifts itself if the relocation dies while holding it.
+# A long final pass extends it while it is still active; a lapsed fence aborts the move.
+WRITE_FENCE_MAX_SECONDS = int(os.environ.get('WRITE_FENCE_MAX_SECONDS', 120))
+
+DELETE_BATCH = 1000
+INTEGER_TYPES = ('int', 'bigint', 'mediumint', 'smallint')
+
+
+class RelocationError(Exception):
+    """The relocation was aborted; the tenant still lives on its source shard"""
+
+
+class TenantRelocator:
+    """Copies one tenant database between shards and flips its shard mapping"""
+
+    # ----- lookups -----
+
+    @staticmethod
+    def _company(subdomain):
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                shard_registry.ensure_schema(cursor)
+                cursor.execute("SELECT * FROM companies WHERE subdomain = %s", (subdomain,))
+                company = cursor.fetchone()
+        if not company:
+            raise RelocationError(f"No company with subdomain {subdomain}")
+        return company
+
+    @staticmethod
+    def _target_shard(name):
+        for shard in shard_registry.shards(refresh=True).values():
+            if shard['name'] == name:
+                if shard['status'] != 'active':
+                    raise RelocationError(f"Shard {name} is {shard['status']}, not active")
+                return shard
+        raise RelocationError(f"Unknown shard {name}")
+
+    @staticmethod
+    def _tables(conn):
+        """{table: {'pk': integer primary key or None, 'updated_at': bool, 'rows': estimate}}"""
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute("""
+                SELECT c.table_name AS table_name, c.column_name AS column_name,
+                       c.column_key AS column_key, c.data_type AS data_type, t.table_rows AS table_rows
+                FROM information_schema.columns c
+                JOIN information_schema.tables t
+                  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+                WHERE c.table_schema = DATABASE() AND t.table_type = 'BASE TABLE'
+                ORDER BY c.table_name, c.ordinal_position
+            """)
+            columns = {}
+            for row in cursor.fetchall():
+                columns.setdefault(row['table_name'], []).append(row)
+
+        tables = {}
+        for table, cols in columns.items():
+            primary = [c for c in cols if c['column_key'] == 'PRI']
+            pk = primary[0]['column_name'] if (
+                len(primary) == 1 and primary[0]['data_type'] in INTEGER_TYPES
+            ) else None
+            tables[table] = {
+                'pk': pk,
+                'updated_at': any(c['column_name'] == 'updated_at' for c in cols),
+                'rows': cols[0]['table_rows'] or 0,
+            }
+        return tables
+
+    @staticmethod
+    def _now(conn):
+        with conn.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute("SELECT NOW()")
+            return cursor.fetchone()[0]
+
+    # ----- copying -----
+
+    @staticmethod
+    def _replace_rows(target, table, columns, rows):
+        placeholders = ', '.join(['%s'] * len(columns))
+        column_list = ', '.join(f'`{col}`' for col in columns)
+        with target.cursor() as cursor:
+            cursor.executemany(f"REPLACE INTO `{table}` ({column_list}) VALUES ({placeholders})", rows)
+        target.commit()
+
+    def _copy_by_key(self, source, target, table, pk, where=None, params=()):
+        """Copy rows in primary-key order, one short SELECT per chunk"""
+        copied = 0
+        last = None
+        while True:
+            conditions = [where] if where else []
+            args = list(params)
+            if last is not None:
+                conditions.append(f"`{pk}` > %s")
+                args.append(last)
+            sql = f"SELECT * FROM `{table}`"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += f" ORDER BY `{pk}` LIMIT {RELOCATION_CHUNK_ROWS}"
+
+            with source.cursor(pymysql.cursors.Cursor) as cursor:
+                cursor.execute(sql, args)
+                columns = [col[0] for col in cursor.description]
+                rows = cursor.fetchall()
+            if not rows:
+                return copied
+            self._replace_rows(target, table, columns, rows)
+            copied += len(rows)
+            last = rows[-1][columns.index(pk)]
+
+    def _copy_streaming(self, source, target, table):
+        """Copy a table without a usable key through one unbuffered SELECT"""
+        copied = 0
+        cursor = source.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(f"SELECT * FROM `{table}`")
+            columns = [col[0] for col in cursor.description]
+            while True:
+                rows = cursor.fetchmany(RELOCATION_CHUNK_ROWS)
+                if not rows:
+                    return copied
+                self._replace_rows(target, table, columns, rows)
+                copied += len(rows)
+        finally:
+            cursor.close()
+
+    def _copy_table(self, source, target, table, info):
+        if info['pk']:
+            return self._copy_by_key(source, target, table, info['pk'])
+        return self._copy_streaming(source, target, table)
+
+    def _catch_up(self, source, target, table, info, since):
+        """Rows updated since `since` (minus the overlap)"""
+        since = since - timedelta(seconds=RELOCATION_OVERLAP_SECONDS)
+        return self._copy_by_key(source, target, table, info['pk'], "`updated_at` >= %s", (since,))
+
+    @staticmethod
+    def _keys(conn, table, pk):
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(f"SELECT `{pk}` FROM `{table}`")
+            return {row[0] for row in cursor}
+        finally:
+            cursor.close()
+
+    def _apply_deletes(self, source, target, table, pk):
+        """Delete target rows whose primary key no longer exists on the source"""
+        deleted = sorted(self._keys(target, table, pk) - self._keys(source, table, pk))
+        with target.cursor() as cursor:
+            for i in range(0, len(deleted), DELETE_BATCH):
+                batch = deleted[i:i + DELETE_BATCH]
+                cursor.execute(f"DELETE FROM `{table}` WHERE `{pk}` IN ({', '.join(['%s'] * len(batch))})", batch)
+        target.commit()
+        return len(deleted)
+
+    @staticmethod
+    def _count(conn, table):
+        with conn.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+            return cursor.fetchone()[0]
+
+    # ----- connections and schema -----
+
+    @staticmethod
+    def _open(database, shard_id):
+        conn = TenantDatabaseManager.get_tenant_connection(database, shard_id)
+        # Every read sees current data (no snapshot held across catch-up passes)
+        conn.autocommit(True)
+        return conn
+
+    @staticmethod
+    def _create_database(database, target_shard_id):
+        server = TenantDatabaseManager.get_server_connection(target_shard_id)
+        try:
+            with server.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*) AS tables FROM information_schema.tables WHERE table_schema = %s
+                """, (database,))
+                if cursor.fetchone()['tables']:
+                    raise RelocationError(f"{database} already has tables on the target shard")
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}` "
+                               f"CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+            server.commit()
+        finally:
+            server.close()
+
+    @staticmethod
+    def _create_tables(source, database, target_shard_id):
+        """Tables as on the source; returns the target connection, set up for copying"""
+        target = TenantDatabaseManager.get_tenant_connection(database, target_shard_id)
+        with target.cursor() as cursor:
+            # Copy in any table order, keep explicit zero ids
+            cursor.execute("SET SESSION FOREIGN_KEY_CHECKS = 0")
+            cursor.execute("SET SESSION sql_mode = CONCAT(@@sql_mode, ',NO_AUTO_VALUE_ON_ZERO')")
+            with source.cursor(pymysql.cursors.DictCursor) as source_cursor:
+                source_cursor.execute("""
+                    SELECT table_name AS name FROM information_schema.tables
+                    WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'
+                """)
+                for row in source_cursor.fetchall():
+                    source_cursor.execute(f"SHOW CREATE TABLE `{row['name']}`")
+                    cursor.execute(source_cursor.fetchone()['Create Table'])
+        target.commit()
+        return target
+
+    # ----- fence -----
+
+    @staticmethod
+    def _set_fence(company_id, seconds):
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                if seconds:
+                    cursor.execute("""
+                        UPDATE companies SET write_fence_until = NOW() + INTERVAL %s SECOND WHERE id = %s
+                    """, (seconds, company_id))
+                else:
+                    cursor.execute("UPDATE companies SET write_fence_until = NULL WHERE id = %s", (company_id,))
+                conn.commit()
+
+    @staticmethod
+    def _extend_fence(company_id, seconds):
+        """Push the fence out again; raises if it already lapsed (writes may have reached the source)"""
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT write_fence_until > NOW() AS active FROM companies WHERE id = %s FOR UPDATE
+                """, (company_id,))
+                row = cursor.fetchone()
+                if not row or not row['active']:
+                    conn.rollback()
+                    raise RelocationError("The write fence lapsed during the final pass")
+                cursor.execute("""
+                    UPDATE companies SET write_fence_until = NOW() + INTERVAL %s SECOND WHERE id = %s
+                """, (seconds, company_id))
+                conn.commit()
+
+    @staticmethod
+    def _flip(company_id, shard_id):
+        """Point the company at its new shard and lift the fence in one statement, only while it still holds"""
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE companies SET shard_id = %s, write_fence_until = NULL
+                    WHERE id = %s AND write_fence_until > NOW()
+                """, (shard_id, company_id))
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    raise RelocationError("The write fence lapsed before the flip; writes may have reached the source")
+                conn.commit()
+
+    def _keep_fence(self, company_id, fenced_until):
+        """Extend the fence once less than half of it is left; returns the new local deadline"""
+        if fenced_until - time.time() > WRITE_FENCE_MAX_SECONDS / 2:
+            return fenced_until
+        self._extend_fence(company_id, WRITE_FENCE_MAX_SECONDS)
+        return time.time() + WRITE_FENCE_MAX_SECONDS
+
+    # ----- relocation -----
+
+    def plan(self, subdomain, target_name):
+        """What a relocation would do, without changing anything"""
+        company = self._company(subdomain)
+        target = self._target_shard(target_name)
+        source_shard_id = company['shard_id'] or DEFAULT_SHARD_ID
+        source = self._open(company['database_name'], source_shard_id)
+        try:
+            tables = self._tables(source)
+        finally:
+            source.close()
+        return {
+            'database': company['database_name'],
+            'source_shard': source_shard_id,
+            'target_shard': target['id'],
+            'tables': tables,
+            # Copied again inside the fence
+            'full_copy': sorted(t for t, info in tables.items() if not (info['pk'] and info['updated_at'])),
+        }
+
+    def relocate(self, subdomain, target_name, drop_source=False):
+        """Move a tenant's database to the named shard; returns a summary dict"""
+        company = self._company(subdomain)
+        target_shard = self._target_shard(target_name)
+        database = company['database_name']
+        source_shard_id = company['shard_id'] or DEFAULT_SHARD_ID
+        target_shard_id = target_shard['id']
+        if source_shard_id == target_shard_id:
+            raise RelocationError(f"{database} already lives on {target_name}")
+
+        started = time.time()
+        summary = {'database': database, 'source_shard': source_shard_id, 'target_shard': target_shard_id}
+        source = self._open(database, source_shard_id)
+        target = None
+        created = fenced = False
+        try:
+            tables = self._tables(source)
+            self._create_database(database, target_shard_id)
+            created = True
+            target = self._create_tables(source, database, target_shard_id)
+            incremental = {t: info for t, info in tables.items() if info['pk'] and info['updated_at']}
+
+            # 1. Bulk copy, remembering when each table's copy started
+            watermarks = {}
+            copied = 0
+            for table, info in tables.items():
+                watermarks[table] = self._now(source)
+                copied += self._copy_table(source, target, table, info)
+            print(f"✓ Copied {copied} rows in {len(tables)} tables ({time.time() - started:.1f}s)")
+
+            # 2. Catch up while the tenant keeps writing
+            for catch_up_pass in range(1, RELOCATION_CATCHUP_PASSES + 1):
+                changed = 0
+                for table, info in incremental.items():
+                    since, watermarks[table] = watermarks[table], self._now(source)
+                    changed += self._catch_up(source, target, table, info, since)
+                print(f"   Catch-up pass {catch_up_pass}: {changed} rows")
+                if changed < RELOCATION_CATCHUP_ROWS:
+                    break
+
+            # 3. Fence writes, let in-flight requests finish, apply the rest
+            self._set_fence(company['id'], WRITE_FENCE_MAX_SECONDS)
+            fenced = True
+            fenced_at = time.time()
+            fenced_until = fenced_at + WRITE_FENCE_MAX_SECONDS
+            time.sleep(WRITE_FENCE_GRACE_SECONDS)
+
+            deleted = 0
+            for table, info in tables.items():
+                fenced_until = self._keep_fence(company['id'], fenced_until)
+                if table in incremental:
+                    self._catch_up(source, target, table, info, watermarks[table])
+                    deleted += self._apply_deletes(source, target, table, info['pk'])
+                else:
+                    with target.cursor() as cursor:
+                        cursor.execute(f"DELETE FROM `{table}`")
+                    target.commit()
+                    self._copy_table(source, target, table, info)
+
+            fenced_until = self._keep_fence(company['id'], fenced_until)
+            mismatched = [t for t in tables if self._count(source, t) != self._count(target, t)]
+            if mismatched:
+                raise RelocationError(f"Row counts differ after the final pass: {', '.join(mismatched)}")
+
+            # 4. Flip the mapping (fails if the fence lapsed); requests pick it up immediately
+            self._flip(company['id'], target_shard_id)
+            fenced = False
+        except Exception as e:
+            if fenced:
+                self._set_fence(company['id'], None)
+            if target is not None:
+                target.close()
+                target = None
+            if created:
+                # The tenant still lives on the source; the partial copy is useless
+                TenantDatabaseManager.drop_tenant_database(database, target_shard_id)
+            if isinstance(e, RelocationError):
+                raise
+            raise RelocationError(f"Relocating {database} failed: {e}") from e
+        finally:
+            source.close()
+            if target is not None:
+                target.close()
+
+        shard_registry.forget(database)
+        shard_registry.remember(database, target_shard_id)
+        summary.update(rows=copied, deleted=deleted, fence_seconds=round(time.time() - fenced_at, 2))
+        print(f"✓ {database} now lives on {target_name} (writes fenced {summary['fence_seconds']}s)")
+
+        if drop_source:
+            TenantDatabaseManager.drop_tenant_database(database, source_shard_id)
+            print(f"✓ Dropped the old copy of {database} on shard {source_shard_id}")
+        else:
+            print(f"   The old copy of {database} is still on shard {source_shard_id}; "
+                  f"drop it once the tenant is verified")
+        summary['seconds'] = round(time.time() - started, 2)
+        summary['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        return summary
+
+
+# Global instance
+tenant_relocator = TenantRelocator()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Move a tenant database to another shard')
+    parser.add_argument('subdomain', help='Tenant subdomain')
+    parser.add_argument('shard', help='Target shard name')
+    parser.add_argument('--dry-run', action='store_true', help='Show the plan without copying')
+    parser.add_argument('--drop-source', action='store_true', help='Drop the old copy after the switch')
+    args = parser.parse_args()
+
+    try:
+        if args.dry_run:
+            plan = tenant_relocator.plan(args.subdomain, args.shard)
+            print(f"{plan['database']}: shard {plan['source_shard']} -> shard {plan['target_shard']}")
+            for table, info in sorted(plan['tables'].items()):
+                mode = 'full copy in fence' if table in plan['full_copy'] else 'incremental'
+                print(f"   {table:30s} ~{info['rows']:>9} rows  {mode}")
+            return
+        tenant_relocator.relocate(args.subdomain, args.shard, drop_source=args.drop_source)
+    except RelocationError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Tests for the streaming SQL parser and the per-table restore dispatch in backup_manager
+Run with: python -m pytest test_backup_manager.py
+"""
+
+import io
+import threading
+
+import pytest
+
+from backup_manager import iter_sql_statements, restore_database, _TABLE_STATEMENT, _SESSION_STATEMENT
+
+CHUNK_SIZES = (1, 3, 7, 1024)
+
+DUMP = (
+    "/*!40101 SET NAMES utf8mb4 */;\n"
+    "-- comment with a ; semicolon\n"
+    "# hash comment ; too\n"
+    "/* block ; comment */\n"
+    "DROP TABLE IF EXISTS `vehicles`;\n"
+    "CREATE TABLE `vehicles` (`id` int, `note` varchar(50));\n"
+    "INSERT INTO `vehicles` VALUES (1,'semi;colon'),(2,'it''s'),(3,'back\\'slash;'),(4,\"dq;\\\"x\");\n"
+    "INSERT INTO `weird;name` VALUES (5);\n"
+    "/*!40000 ALTER TABLE `vehicles` ENABLE KEYS */;\n"
+    "SELECT 1 - -1;\n"
+    "SELECT '--not a comment';\n"
+    "-- trailing comment only\n"
+)
+
+EXPECTED = [
+    "/*!40101 SET NAMES utf8mb4 */",
+    "-- comment with a ; semicolon\n# hash comment ; too\n/* block ; comment */\nDROP TABLE IF EXISTS `vehicles`",
+    "CREATE TABLE `vehicles` (`id` int, `note` varchar(50))",
+    "INSERT INTO `vehicles` VALUES (1,'semi;colon'),(2,'it''s'),(3,'back\\'slash;'),(4,\"dq;\\\"x\")",
+    "INSERT INTO `weird;name` VALUES (5)",
+    "/*!40000 ALTER TABLE `vehicles` ENABLE KEYS */",
+    "SELECT 1 - -1",
+    "SELECT '--not a comment'",
+]
+
+
+def statements(text, chunk_size):
+    return list(iter_sql_statements(io.StringIO(text), chunk_size=chunk_size))
+
+
+# ----- iter_sql_statements -----
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_splits_dump_at_every_chunk_size(chunk_size):
+    assert statements(DUMP, chunk_size) == EXPECTED
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_last_statement_without_semicolon(chunk_size):
+    assert statements("SET a=1;\nINSERT INTO t VALUES (1)\n", chunk_size) == ["SET a=1", "INSERT INTO t VALUES (1)"]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_escaped_backslash_before_closing_quote(chunk_size):
+    text = "INSERT INTO t VALUES ('a\\\\');INSERT INTO t VALUES ('b');"
+    assert statements(text, chunk_size) == ["INSERT INTO t VALUES ('a\\\\')", "INSERT INTO t VALUES ('b')"]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_double_dash_needs_whitespace(chunk_size):
+    # MySQL only treats "-- " as a comment; "1--1" is arithmetic
+    assert statements("SELECT 1--1;SELECT 2;", chunk_size) == ["SELECT 1--1", "SELECT 2"]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_comment_at_end_of_file(chunk_size):
+    assert statements("SELECT 1;\n-- done", chunk_size) == ["SELECT 1"]
+    assert statements("SELECT 1;\n/* done */", chunk_size) == ["SELECT 1"]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_empty_statements_are_skipped(chunk_size):
+    assert statements(";;\n;SELECT 1;;", chunk_size) == ["SELECT 1"]
+
+
+@pytest.mark.parametrize('text', ["INSERT INTO t VALUES ('open", 'SELECT "open', "SELECT `open"])
+def test_unterminated_quote_raises(text):
+    with pytest.raises(ValueError):
+        statements(text, 4)
+
+
+# ----- table routing -----
+
+@pytest.mark.parametrize('statement, table', [
+    ("INSERT INTO `vehicles` VALUES (1)", 'vehicles'),
+    ("INSERT IGNORE INTO vehicles VALUES (1)", 'vehicles'),
+    ("REPLACE INTO `fuel_records` VALUES (1)", 'fuel_records'),
+    ("DROP TABLE IF EXISTS `job_cards`", 'job_cards'),
+    ("CREATE TABLE IF NOT EXISTS `employees` (`id` int)", 'employees'),
+    ("ALTER TABLE `employees` ADD COLUMN x int", 'employees'),
+    ("/*!40000 ALTER TABLE `vehicles` DISABLE KEYS */", 'vehicles'),
+    ("LOCK TABLES `vehicles` WRITE", 'vehicles'),
+    ("TRUNCATE TABLE `vehicles`", 'vehicles'),
+    ("DELETE FROM `vehicles` WHERE id = 1", 'vehicles'),
+    ("-- Table structure\n/* note */\nCREATE TABLE `service_maintenance` (`id` int)", 'service_maintenance'),
+])
+def test_table_statement_names_its_table(statement, table):
+    match = _TABLE_STATEMENT.match(statement)
+    assert match and match.group(1) == table
+
+
+@pytest.mark.parametrize('statement', [
+    "SET FOREIGN_KEY_CHECKS=0",
+    "/*!40101 SET NAMES utf8mb4 */",
+    "UNLOCK TABLES",
+    "USE `fleet_demo`",
+])
+def test_session_statements(statement):
+    assert not _TABLE_STATEMENT.match(statement)
+    assert _SESSION_STATEMENT.match(statement)
+
+
+@pytest.mark.parametrize('statement', [
+    "CREATE VIEW v AS SELECT * FROM vehicles",
+    "CREATE TRIGGER trg BEFORE INSERT ON vehicles FOR EACH ROW SET NEW.id = 1",
+])
+def test_other_statements_are_neither(statement):
+    assert not _TABLE_STATEMENT.match(statement)
+    assert not _SESSION_STATEMENT.match(statement)
+
+
+# ----- restore dispatch -----
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, statement):
+        with self.conn.log_lock:
+            self.conn.log.append((self.conn.number, statement))
+        self.conn.executed.append(statement)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number, log, log_lock):
+        self.number = number
+        self.log = log
+        self.log_lock = log_lock
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connections():
+    created = []
+    log = []
+    lock = threading.Lock()
+
+    def connect():
+        conn = FakeConnection(len(created), log, lock)
+        created.append(conn)
+        return conn
+
+    connect.created = created
+    connect.log = log
+    return connect
+
+
+def test_restore_routes_each_table_to_one_connection_in_order(tmp_path, connections):
+    dump = tmp_path / 'dump.sql'
+    dump.write_text(
+        "SET FOREIGN_KEY_CHECKS=0;\n"
+        "CREATE TABLE `a` (`id` int);\n"
+        "CREATE TABLE `b` (`id` int);\n"
+        + ''.join(f"INSERT INTO `a` VALUES ({i});\nINSERT INTO `b` VALUES ({i});\n" for i in range(20))
+        + "CREATE VIEW v AS SELECT * FROM a;\n",
+        encoding='utf-8')
+
+    report = restore_database(connections, str(dump), parallelism=2)
+
+    assert report['restored_tables'] == ['a', 'b']
+    assert report['failed'] is None
+    conns = connections.created
+    assert len(conns) == 2
+
+    for table in ('a', 'b'):
+        owners = {conn.number for conn in conns for s in conn.executed if f"`{table}`" in s}
+        assert len(owners) == 1
+        owner = conns[owners.pop()]
+        inserts = [s for s in owner.executed if s.startswith(f"INSERT INTO `{table}`")]
+        assert inserts == [f"INSERT INTO `{table}` VALUES ({i})" for i in range(20)]
+
+    # Session settings reach every connection, before that connection's table statements
+    for conn in conns:
+        assert "SET FOREIGN_KEY_CHECKS=0" in conn.executed
+
+    # The view runs on the first connection after every table load was executed
+    view = [(number, s) for number, s in connections.log if s.startswith('CREATE VIEW')]
+    assert view == [(0, "CREATE VIEW v AS SELECT * FROM a")]
+    last_insert = max(i for i, (_, s) in enumerate(connections.log) if s.startswith('INSERT'))
+    assert connections.log.index(view[0]) > last_insert
+
+
+def test_restore_refuses_truncated_dump(tmp_path, connections):
+    from backup_manager import RestoreError
+
+    dump = tmp_path / 'dump.sql'
+    dump.write_text("CREATE TABLE `a` (`id` int);\nINSERT INTO `a` VALUES ('unterminated", encoding='utf-8')
+
+    with pytest.raises(RestoreError):
+        restore_database(connections, str(dump), parallelism=2)
+    assert connections.created == []
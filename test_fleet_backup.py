@@ -0,0 +1,142 @@
+"""
+Tests for the pure helpers behind fleet backups: tombstone range difference,
+retention tiers and restore chain selection
+Run with: python -m pytest test_fleet_backup.py
+"""
+
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from fleet_backup import _to_ranges, _ranges_difference, _count, select_retained, current_chain
+
+
+# ----- primary-key ranges -----
+
+def test_to_ranges_merges_consecutive_ids():
+    assert _to_ranges([1, 2, 3, 5, 7, 8]) == [[1, 3], [5, 5], [7, 8]]
+    assert _to_ranges([]) == []
+
+
+def test_count():
+    assert _count([[1, 3], [5, 5], [7, 8]]) == 6
+
+
+@pytest.mark.parametrize('previous, current, missing', [
+    ([[1, 10]], [[1, 10]], []),
+    ([[1, 10]], [], list(range(1, 11))),
+    ([], [[1, 10]], []),
+    ([[1, 10]], [[2, 3], [5, 5], [9, 12]], [1, 4, 6, 7, 8]),
+    ([[1, 3], [7, 9]], [[0, 1], [3, 8]], [2, 9]),
+    ([[5, 5]], [[1, 4], [6, 9]], [5]),
+    ([[1, 2], [4, 5], [100, 101]], [[2, 4]], [1, 5, 100, 101]),
+])
+def test_ranges_difference(previous, current, missing):
+    assert _ranges_difference(previous, current) == missing
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_ranges_difference_matches_set_difference(seed):
+    rng = random.Random(seed)
+    universe = range(rng.randint(1, 60))
+    previous = sorted(rng.sample(universe, rng.randint(0, len(universe))))
+    current = sorted(rng.sample(universe, rng.randint(0, len(universe))))
+    assert _ranges_difference(_to_ranges(previous), _to_ranges(current)) == sorted(set(previous) - set(current))
+
+
+# ----- retention -----
+
+def full(created_at, name=None):
+    return {'file': name or f"full_{created_at:%Y%m%d_%H%M}", 'type': 'full',
+            'created_at': created_at.isoformat(timespec='seconds')}
+
+
+def incremental(created_at, base):
+    return {'file': f"inc_{created_at:%Y%m%d_%H%M}", 'type': 'incremental', 'base': base,
+            'created_at': created_at.isoformat(timespec='seconds')}
+
+
+def test_retention_keeps_newest_per_day():
+    day = datetime(2026, 3, 10, 2, 0)
+    backups = [full(day), full(day + timedelta(hours=12)), full(day + timedelta(days=1))]
+    keep = select_retained(backups, {'daily': 7, 'weekly': 0, 'monthly': 0})
+    assert keep == {backups[1]['file'], backups[2]['file']}
+
+
+def test_retention_tiers():
+    # One full backup a day for 120 days, newest 2026-06-30
+    newest = datetime(2026, 6, 30, 2, 0)
+    backups = [full(newest - timedelta(days=n)) for n in range(120)]
+    keep = select_retained(backups, {'daily': 3, 'weekly': 2, 'monthly': 3})
+
+    kept = sorted(datetime.fromisoformat(b['created_at']).date().isoformat()
+                  for b in backups if b['file'] in keep)
+    # daily: 28-30 June; weekly: 30 June (Tuesday) and Sunday 28 June; monthly: June, May, April
+    assert kept == ['2026-04-30', '2026-05-31', '2026-06-28', '2026-06-29', '2026-06-30']
+
+
+def test_retention_kept_counts_per_tier():
+    newest = datetime(2026, 6, 30, 2, 0)
+    backups = [full(newest - timedelta(days=n)) for n in range(120)]
+    for tier, period_of in (('daily', lambda d: d.date()),
+                            ('weekly', lambda d: tuple(d.isocalendar()[:2])),
+                            ('monthly', lambda d: (d.year, d.month))):
+        retention = {'daily': 0, 'weekly': 0, 'monthly': 0}
+        retention[tier] = 3
+        keep = select_retained(backups, retention)
+        kept = [datetime.fromisoformat(b['created_at']) for b in backups if b['file'] in keep]
+        periods = {period_of(d) for d in kept}
+        assert len(kept) == len(periods) == 3
+        # Each kept backup is the newest one of its period
+        for d in kept:
+            assert all(period_of(other) != period_of(d) or other <= d
+                       for other in (datetime.fromisoformat(b['created_at']) for b in backups))
+
+
+def test_retention_ignores_incrementals_and_keeps_newest_full():
+    newest = datetime(2026, 6, 30, 2, 0)
+    backups = [full(newest, 'newest'), incremental(newest + timedelta(hours=1), 'newest')]
+    assert select_retained(backups, {'daily': 0, 'weekly': 0, 'monthly': 0}) == {'newest'}
+    assert select_retained([], {'daily': 7, 'weekly': 4, 'monthly': 12}) == set()
+
+
+# ----- restore chains -----
+
+@pytest.fixture
+def manifest():
+    start = datetime(2026, 6, 1, 2, 0)
+    return [
+        full(start, 'full_1'),
+        incremental(start + timedelta(hours=6), 'full_1'),
+        incremental(start + timedelta(hours=12), 'full_1'),
+        full(start + timedelta(days=1), 'full_2'),
+        incremental(start + timedelta(days=1, hours=6), 'full_2'),
+    ]
+
+
+def test_current_chain_is_latest_full_and_its_increments(manifest):
+    assert [b['file'] for b in current_chain(manifest)] == ['full_2', 'inc_20260602_0800']
+
+
+def test_current_chain_upto_increment(manifest):
+    assert [b['file'] for b in current_chain(manifest, upto='inc_20260601_0800')] == \
+        ['full_1', 'inc_20260601_0800']
+
+
+def test_current_chain_upto_full(manifest):
+    assert [b['file'] for b in current_chain(manifest, upto='full_1')] == ['full_1']
+
+
+def test_current_chain_order_does_not_depend_on_manifest_order(manifest):
+    shuffled = list(reversed(manifest))
+    assert current_chain(shuffled) == current_chain(manifest)
+
+
+def test_current_chain_without_full_backup():
+    assert current_chain([]) == []
+
+
+def test_current_chain_unknown_backup(manifest):
+    with pytest.raises(ValueError):
+        current_chain(manifest, upto='missing')
@@ -0,0 +1,339 @@
+"""
+Tenant Usage Metering
+Per-tenant counters for capacity planning: requests, DB time and queries,
+rows read, export bytes and scheduled-report render time are aggregated
+in-process per hour and added to fleet_saas_main.tenant_usage every
+USAGE_FLUSH_SECONDS. A periodic job records each tenant's database size
+(information_schema) and upload storage into the same hourly rows.
+
+Super admins see the totals at /super-admin/usage and download the hourly
+rows from /super-admin/usage.csv (see require_super_admin).
+
+Usage:
+    usage_meter.record('fleet_acme', report_render_ms=420)
+    python usage_metering.py --flush-storage    # measure storage now
+"""
+
+from flask import g, request, render_template, Response, has_app_context
+from datetime import datetime, timedelta
+import threading
+import atexit
+import csv
+import io
+import os
+
+USAGE_METERING_ENABLED = os.environ.get('USAGE_METERING_ENABLED', 'true').lower() == 'true'
+# How often each process adds its counters to tenant_usage
+USAGE_FLUSH_SECONDS = int(os.environ.get('USAGE_FLUSH_SECONDS', 60))
+# How often database and upload sizes are measured
+USAGE_STORAGE_HOURS = int(os.environ.get('USAGE_STORAGE_HOURS', 6))
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+COUNTERS = ('requests', 'db_queries', 'db_time_ms', 'rows_read', 'export_bytes', 'report_render_ms')
+
+CREATE_TENANT_USAGE_TABLE = """
+    CREATE TABLE IF NOT EXISTS tenant_usage (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        database_name VARCHAR(100) NOT NULL,
+        period_start DATETIME NOT NULL,
+        requests BIGINT NOT NULL DEFAULT 0,
+        db_queries BIGINT NOT NULL DEFAULT 0,
+        db_time_ms BIGINT NOT NULL DEFAULT 0,
+        rows_read BIGINT NOT NULL DEFAULT 0,
+        export_bytes BIGINT NOT NULL DEFAULT 0,
+        report_render_ms BIGINT NOT NULL DEFAULT 0,
+        -- Gauges, measured every USAGE_STORAGE_HOURS (NULL in other hours)
+        db_bytes BIGINT NULL,
+        upload_bytes BIGINT NULL,
+        UNIQUE KEY uniq_tenant_period (database_name, period_start),
+        INDEX idx_period (period_start)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+# Files referenced from a tenant database, relative to static/
+UPLOAD_REFERENCES = """
+    SELECT receipt_path AS path FROM fuel_records WHERE receipt_path IS NOT NULL AND receipt_path <> ''
+    UNION ALL
+    SELECT invoice_path FROM service_maintenance WHERE invoice_path IS NOT NULL AND invoice_path <> ''
+"""
+
+
+def current_period():
+    return datetime.now().replace(minute=0, second=0, microsecond=0)
+
+
+class UsageMeter:
+    """Hourly per-tenant counters, flushed additively so every worker process can write"""
+
+    def __init__(self):
+        # (database_name, period_start) -> {counter: value}
+        self._usage = {}
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def init_app(self, app):
+        """Install the super-admin views and count every request after its response is built"""
+        from tenant_middleware import require_super_admin
+        app.add_url_rule('/super-admin/usage', 'super_admin_usage', require_super_admin(usage_view))
+        app.add_url_rule('/super-admin/usage.csv', 'super_admin_usage_csv', require_super_admin(usage_csv))
+        if not USAGE_METERING_ENABLED:
+            return
+        app.after_request(self.record_request)
+        atexit.register(self.flush)
+
+    def ensure_table(self, cursor):
+        if not self._table_ready:
+            cursor.execute(CREATE_TENANT_USAGE_TABLE)
+            self._table_ready = True
+
+    # ----- collection -----
+
+    @staticmethod
+    def current_tenant():
+        if has_app_context() and g.get('tenant_db'):
+            return g.tenant_db
+        return 'default'
+
+    def record(self, tenant=None, **values):
+        if not USAGE_METERING_ENABLED:
+            return
+        key = (tenant or self.current_tenant(), current_period())
+        with self._lock:
+            usage = self._usage.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, value in values.items():
+                usage[name] += value
+
+    def record_request(self, response):
+        if request.endpoint in (None, 'static', 'metrics') or not g.get('tenant_db'):
+            return response
+
+        values = {'requests': 1}
+        stats = g.get('db_stats')
+        if stats is not None:
+            values.update(db_queries=stats['queries'], db_time_ms=round(stats['db_time'] * 1000),
+                          rows_read=stats['rows'])
+
+        from admission_control import admission_controller
+        if admission_controller.classify(request.endpoint) == 'export':
+            # Exports use send_file (direct passthrough); never buffer the body to measure it
+            values['export_bytes'] = response.content_length or 0
+
+        self.record(g.tenant_db, **values)
+        return response
+
+    # ----- flushing -----
+
+    def flush(self):
+        """Add the collected counters to tenant_usage; kept for the next flush if that fails"""
+        with self._lock:
+            usage, self._usage = self._usage, {}
+        if not usage:
+            return 0
+
+        from tenant_manager import TenantDatabaseManager
+        rows = [(tenant, period) + tuple(values[name] for name in COUNTERS)
+                for (tenant, period), values in usage.items()]
+        updates = ', '.join(f"{name} = {name} + VALUES({name})" for name in COUNTERS)
+        try:
+            with TenantDatabaseManager.main_db() as conn:
+                with conn.cursor() as cursor:
+                    self.ensure_table(cursor)
+                    cursor.executemany(f"""
+                        INSERT INTO tenant_usage (database_name, period_start, {', '.join(COUNTERS)})
+                        VALUES (%s, %s, {', '.join(['%s'] * len(COUNTERS))})
+                        ON DUPLICATE KEY UPDATE {updates}
+                    """, rows)
+                    conn.commit()
+        except Exception as e:
+            print(f"⚠️  Usage flush failed, retrying later: {e}")
+            with self._lock:
+                for key, values in usage.items():
+                    current = self._usage.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                    for name, value in values.items():
+                        current[name] += value
+            return 0
+        return len(rows)
+
+    # ----- storage -----
+
+    @staticmethod
+    def upload_bytes(database_name):
+        """Size of the receipt and invoice files a tenant database references"""
+        from read_replica import replica_router
+        conn = replica_router.connect(database_name)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(UPLOAD_REFERENCES)
+                paths = {row['path'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+        total = 0
+        for path in paths:
+            try:
+                total += os.path.getsize(os.path.join(STATIC_DIR, path))
+            except OSError:
+                pass  # file removed or never written
+        return total
+
+    def measure_storage(self):
+        """Record database and upload sizes of every tenant for the current hour"""
+        from tenant_manager import TenantDatabaseManager
+        from shard_manager import shard_registry, DEFAULT_SHARD_ID
+
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                # One measurement at a time across all app processes
+                cursor.execute("SELECT GET_LOCK('tenant_usage_storage', 0) AS locked")
+                if not cursor.fetchone()['locked']:
+                    return 0
+                try:
+                    cursor.execute("SELECT database_name, shard_id FROM companies")
+                    companies = cursor.fetchall()
+                    measured = {}
+                    for shard_id, shard in shard_registry.shards(refresh=True).items():
+                        tenants = {c['database_name'] for c in companies
+                                   if (c['shard_id'] or DEFAULT_SHARD_ID) == shard_id}
+                        if not tenants or shard['status'] == 'disabled':
+                            continue
+                        server = TenantDatabaseManager.get_server_connection(shard_id)
+                        try:
+                            with server.cursor() as server_cursor:
+                                server_cursor.execute("""
+                                    SELECT table_schema AS name,
+                                           SUM(data_length + index_length) AS bytes
+                                    FROM information_schema.tables
+                                    WHERE table_schema LIKE 'fleet\\_%%'
+                                    GROUP BY table_schema
+                                """, ())
+                                for row in server_cursor.fetchall():
+                                    if row['name'] in tenants:
+                                        measured[row['name']] = [int(row['bytes'] or 0), None]
+                        finally:
+                            server.close()
+
+                    for database_name, sizes in measured.items():
+                        try:
+                            sizes[1] = self.upload_bytes(database_name)
+                        except Exception as e:
+                            print(f"⚠️  Upload size of {database_name} unavailable: {e}")
+
+                    period = current_period()
+                    cursor.executemany("""
+                        INSERT INTO tenant_usage (database_name, period_start, db_bytes, upload_bytes)
+                        VALUES (%s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE db_bytes = VALUES(db_bytes),
+                                                upload_bytes = COALESCE(VALUES(upload_bytes), upload_bytes)
+                    """, [(name, period, sizes[0], sizes[1]) for name, sizes in measured.items()])
+                    conn.commit()
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK('tenant_usage_storage')")
+        return len(measured)
+
+    def _safe_measure_storage(self):
+        try:
+            count = self.measure_storage()
+            if count:
+                print(f"✓ Usage: measured storage of {count} tenants")
+        except Exception as e:
+            print(f"✗ Usage storage measurement failed: {e}")
+
+    def schedule(self, scheduler):
+        """Register the counter flush (every process) and the storage measurement"""
+        if not USAGE_METERING_ENABLED:
+            return
+        scheduler.add_job(self.flush, 'interval', seconds=USAGE_FLUSH_SECONDS, id='tenant_usage_flush',
+                          replace_existing=True, max_instances=1, coalesce=True)
+        scheduler.add_job(self._safe_measure_storage, 'interval', hours=USAGE_STORAGE_HOURS,
+                          id='tenant_usage_storage', replace_existing=True, max_instances=1, coalesce=True)
+        print(f"✓ Usage metering: flush every {USAGE_FLUSH_SECONDS}s, storage every {USAGE_STORAGE_HOURS}h")
+
+    # ----- reporting -----
+
+    def summary(self, days=7):
+        """Totals per tenant over the last `days` days with the latest storage sizes"""
+        from tenant_manager import TenantDatabaseManager
+        since = current_period() - timedelta(days=days)
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                cursor.execute(f"""
+                    SELECT u.database_name, c.name, c.subdomain, c.plan, c.shard_id,
+                           {', '.join(f'SUM(u.{name}) AS {name}' for name in COUNTERS)},
+                           (SELECT s.db_bytes FROM tenant_usage s
+                            WHERE s.database_name = u.database_name AND s.db_bytes IS NOT NULL
+                            ORDER BY s.period_start DESC LIMIT 1) AS db_bytes,
+                           (SELECT s.upload_bytes FROM tenant_usage s
+                            WHERE s.database_name = u.database_name AND s.upload_bytes IS NOT NULL
+                            ORDER BY s.period_start DESC LIMIT 1) AS upload_bytes
+                    FROM tenant_usage u
+                    LEFT JOIN companies c ON c.database_name = u.database_name
+                    WHERE u.period_start >= %s
+                    GROUP BY u.database_name, c.name, c.subdomain, c.plan, c.shard_id
+                    ORDER BY db_time_ms DESC
+                """, (since,))
+                return cursor.fetchall()
+
+    def hourly_rows(self, days=7, database_name=None):
+        from tenant_manager import TenantDatabaseManager
+        since = current_period() - timedelta(days=days)
+        with TenantDatabaseManager.main_db() as conn:
+            with conn.cursor() as cursor:
+                self.ensure_table(cursor)
+                cursor.execute("""
+                    SELECT u.*, c.subdomain, c.plan, c.shard_id
+                    FROM tenant_usage u
+                    LEFT JOIN companies c ON c.database_name = u.database_name
+                    WHERE u.period_start >= %s AND (%s IS NULL OR u.database_name = %s)
+                    ORDER BY u.period_start, u.database_name
+                """, (since, database_name, database_name))
+                return cursor.fetchall()
+
+
+# Global instance
+usage_meter = UsageMeter()
+
+
+# ----- super-admin views -----
+
+def _days():
+    return max(1, min(request.args.get('days', 7, type=int), 366))
+
+
+def usage_view():
+    """Per-tenant usage totals"""
+    return render_template('super_admin_usage.html', rows=usage_meter.summary(_days()), days=_days())
+
+
+def usage_csv():
+    """Hourly usage rows as CSV (?days=, ?tenant=database_name)"""
+    columns = ('period_start', 'database_name', 'subdomain', 'plan', 'shard_id') + COUNTERS + ('db_bytes', 'upload_bytes')
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    for row in usage_meter.hourly_rows(_days(), request.args.get('tenant') or None):
+        writer.writerow([row[column] for column in columns])
+    filename = f"tenant_usage_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+    return Response(output.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tenant usage metering')
+    parser.add_argument('--flush-storage', action='store_true', help='Measure database and upload sizes now')
+    parser.add_argument('--days', type=int, default=7, help='Summary window')
+    args = parser.parse_args()
+
+    if args.flush_storage:
+        print(f"✓ Measured {usage_meter.measure_storage()} tenants")
+    for row in usage_meter.summary(args.days):
+        print(f"   {row['database_name']:30s} {row['requests']:>9} req  {row['db_time_ms'] / 1000:>9.1f}s db  "
+              f"{row['rows_read']:>11} rows  {(row['db_bytes'] or 0) / 1048576:>8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
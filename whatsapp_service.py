@@ -3,6 +3,7 @@ WhatsApp Notification Service using Twilio
 """
 from twilio.rest import Client
 from app import get_db_connection
+from db_metrics import track_outbound
 
 def get_setting(key, default=None):
     """Get system setting value"""
@@ -50,11 +51,12 @@ def send_whatsapp_message(to_number, message):
         
         # Send message via Twilio
         client = Client(account_sid, auth_token)
-        message = client.messages.create(
-            from_=from_number,
-            body=message,
-            to=to_number
-        )
+        with track_outbound('twilio'):
+            message = client.messages.create(
+                from_=from_number,
+                body=message,
+                to=to_number
+            )
         
         print(f"WhatsApp message sent successfully. SID: {message.sid}")
         return True